@@ -4,8 +4,16 @@ nlcmd - Natural Language Command Line Tool
 
 __version__ = "0.1.0"
 
-from nlcmd.llm import CommandGenerator
-from nlcmd.config import WORKSPACE
-
 __all__ = ["CommandGenerator", "WORKSPACE"]
 
+
+def __getattr__(name):
+    # Imported on first use: the agent stack takes about a second to import and the thin client
+    # (NLCMD_SERVER) never needs it
+    if name == "CommandGenerator":
+        from nlcmd.llm import CommandGenerator
+        return CommandGenerator
+    if name == "WORKSPACE":
+        from nlcmd.config import WORKSPACE
+        return WORKSPACE
+    raise AttributeError(f"module 'nlcmd' has no attribute {name!r}")
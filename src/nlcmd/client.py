@@ -0,0 +1,122 @@
+import asyncio
+import json
+from typing import Any, Callable, Dict, Optional
+
+from rich.panel import Panel
+
+from nlcmd import config
+from nlcmd.ui import console, prompts
+
+try:
+    from websockets.asyncio.client import connect
+except ImportError:
+    connect = None
+
+
+class ServerError(Exception):
+    """Raised when the nlcmd server rejects the connection or a query."""
+    pass
+
+
+class Client:
+    """
+    A session on an `nlcmd serve` process. Only imports the console and the WebSocket client, so it starts
+    in a fraction of the time the full agent stack takes.
+    """
+
+    def __init__(self, websocket, session: str, workspace: str):
+        self.websocket = websocket
+        self.session = session
+        self.workspace = workspace
+
+    @classmethod
+    async def connect(cls, url: str, workspace: Optional[str] = None, token: Optional[str] = None) -> "Client":
+        if connect is None:
+            raise ImportError("websockets is not installed. Please run 'uv sync --extra serve' to use NLCMD_SERVER.")
+        websocket = await connect(url)
+        await websocket.send(json.dumps({"type": "hello", "workspace": workspace, "token": token}))
+        message = json.loads(await websocket.recv())
+        if message.get("type") != "ready":
+            await websocket.close()
+            raise ServerError(message.get("message", "Connection refused"))
+        return cls(websocket, message["session"], message["workspace"])
+
+    async def run(
+        self,
+        text: str,
+        dry_run: bool = False,
+        write: Callable[[str], Any] = None,
+        confirm: Callable[[str], Any] = None,
+        ask: Callable[[str], Any] = None,
+    ) -> str:
+        """
+        Runs one query and returns the final answer. Output is passed to `write` as it arrives; confirmations
+        and inputs are answered by `confirm` and `ask`, which may be coroutines.
+        """
+        write = write or (lambda data: None)
+        await self.websocket.send(json.dumps({"type": "query", "text": text, "dry_run": dry_run}))
+        async for raw in self.websocket:
+            message: Dict[str, Any] = json.loads(raw)
+            kind = message.get("type")
+            if kind == "output":
+                write(message["data"])
+            elif kind in ("confirm", "input"):
+                handler = confirm if kind == "confirm" else ask
+                value = handler(message.get("question") or message.get("prompt", "")) if handler else (False if kind == "confirm" else "")
+                if asyncio.iscoroutine(value):
+                    value = await value
+                await self.websocket.send(json.dumps({"type": "answer", "id": message["id"], "value": value}))
+            elif kind == "done":
+                return message.get("response") or ""
+            elif kind == "error":
+                raise ServerError(message.get("message", "Unknown error"))
+        raise ServerError("Connection closed by the server")
+
+    async def reset(self):
+        await self.websocket.send(json.dumps({"type": "reset"}))
+
+    async def close(self):
+        await self.websocket.close()
+
+
+def _write(data: str):
+    console.file.write(data)
+    console.file.flush()
+
+
+async def _query(client: Client, query: str, dry_run: bool):
+    # The server renders the answer into the session output, so it has been written already
+    try:
+        await client.run(query, dry_run=dry_run, write=_write, confirm=prompts.confirm, ask=prompts.input)
+    except ServerError as e:
+        console.print(f"[bold red]{e}[/bold red]")
+
+
+def run_client(url: str, query: Optional[str] = None, dry_run: bool = False):
+    """Sends a single query, or runs the REPL, against the server at `url` (NLCMD_SERVER)."""
+
+    async def main():
+        client = await Client.connect(url, str(config.WORKSPACE), config.SERVE_TOKEN or None)
+        console.print(f"[dim]Workspace: {client.workspace} (server {url})[/dim]")
+        try:
+            if query:
+                await _query(client, query, dry_run)
+                return
+            console.print(Panel("[bold green]Welcome to Natural Language Command Executor![/bold green]\nType 'exit' or 'quit' to leave.", title="NLCMD"))
+            while True:
+                user_input = await prompts.read_line("[bold blue]nlcmd > [/bold blue]")
+                if user_input.lower() in ["exit", "quit"]:
+                    break
+                if not user_input.strip():
+                    continue
+                await _query(client, user_input, dry_run)
+        finally:
+            await client.close()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        console.print("\nExiting...")
+    except (OSError, ServerError, ImportError) as e:
+        console.print(f"[bold red]Cannot use nlcmd server {url}:[/bold red] {e}")
+        raise SystemExit(1)
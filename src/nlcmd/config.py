@@ -8,7 +8,49 @@ load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "glm-4-5-flash")
+# Model routing: short single-step requests go to FAST_MODEL, everything else (and escalations) to STRONG_MODEL.
+# Routing is off while FAST_MODEL is unset.
+FAST_MODEL = os.getenv("FAST_MODEL", "")
+STRONG_MODEL = os.getenv("STRONG_MODEL", OPENAI_MODEL)
+# Model requests: retries on 429/5xx/connection errors, per-attempt deadline, circuit breaker and an optional
+# secondary endpoint that slow or failing requests are hedged to
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", "3"))
+LLM_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF", "0.5"))
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))
+LLM_STREAM_IDLE_TIMEOUT = float(os.getenv("LLM_STREAM_IDLE_TIMEOUT", "30"))
+LLM_STREAM_TIMEOUT = float(os.getenv("LLM_STREAM_TIMEOUT", "300"))
+LLM_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", "8"))
+LLM_CIRCUIT_FAILURES = int(os.getenv("LLM_CIRCUIT_FAILURES", "5"))
+LLM_CIRCUIT_COOLDOWN = float(os.getenv("LLM_CIRCUIT_COOLDOWN", "30"))
+FALLBACK_BASE_URL = os.getenv("FALLBACK_BASE_URL", "")
+FALLBACK_API_KEY = os.getenv("FALLBACK_API_KEY", "")
+FALLBACK_MODEL = os.getenv("FALLBACK_MODEL", "")
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "BAAI/bge-small-zh-v1.5")
+MEMORY_INDEX_BACKEND = os.getenv("MEMORY_INDEX_BACKEND", "memory").lower()
+MEMORY_INDEX_PRECISION = os.getenv("MEMORY_INDEX_PRECISION", "int8").lower()
+MEMORY_RECALL_HALF_LIFE_DAYS = float(os.getenv("MEMORY_RECALL_HALF_LIFE_DAYS", "30"))
+MEMORY_WATCH = os.getenv("MEMORY_WATCH", "false").lower() == "true"
+SKILLS_TOP_K = int(os.getenv("SKILLS_TOP_K", "5"))
+SKILL_CHUNK_CHARS = int(os.getenv("SKILL_CHUNK_CHARS", "6000"))
+COMMAND_TIMEOUT = float(os.getenv("COMMAND_TIMEOUT", "120"))
+COMMAND_TIMEOUT_MAX = float(os.getenv("COMMAND_TIMEOUT_MAX", "600"))
+SANDBOX_BACKEND = os.getenv("SANDBOX_BACKEND", "subprocess").lower()
+PYTHON_WORKERS = int(os.getenv("PYTHON_WORKERS", "2"))
+PYTHON_WORKER_PRELOAD = [m.strip() for m in os.getenv("PYTHON_WORKER_PRELOAD", "json,re,math,datetime,collections,itertools,pathlib,statistics").split(",") if m.strip()]
+COMMAND_OUTPUT_CHARS = int(os.getenv("COMMAND_OUTPUT_CHARS", "8000"))
+JOURNAL_ENABLED = os.getenv("JOURNAL_ENABLED", "true").lower() == "true"
+JOURNAL_MAX_MB = float(os.getenv("JOURNAL_MAX_MB", "10"))
+JOURNAL_BACKUPS = int(os.getenv("JOURNAL_BACKUPS", "5"))
+SPECULATIVE_EXECUTION = os.getenv("SPECULATIVE_EXECUTION", "true").lower() == "true"
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "true").lower() == "true"
+TRACE_MAX_MB = float(os.getenv("TRACE_MAX_MB", "20"))
+RECORD_TRANSCRIPTS = os.getenv("RECORD_TRANSCRIPTS", "false").lower() == "true"
+PLAN_MAX_PARALLEL = int(os.getenv("PLAN_MAX_PARALLEL", str(os.cpu_count() or 4)))
+SERVE_HOST = os.getenv("SERVE_HOST", "127.0.0.1")
+SERVE_PORT = int(os.getenv("SERVE_PORT", "8765"))
+SERVE_TOKEN = os.getenv("SERVE_TOKEN", "")
+# ws://host:port of a running `nlcmd serve`; when set, nlcmd runs as a thin client of it
+NLCMD_SERVER = os.getenv("NLCMD_SERVER", "")
 SHOW_REASONING = os.getenv("SHOW_REASONING", "false").lower() == "true"
 SHOW_TOOLCALLING = os.getenv("SHOW_TOOLCALLING", "false").lower() == "true"
 
@@ -4,6 +4,7 @@ from typing import Optional
 from rich.prompt import Prompt, Confirm
 from rich.panel import Panel
 
+from nlcmd import config
 from nlcmd.ui import console
 from nlcmd.cron.scheduler import TaskManager, start_scheduler
 from nlcmd.cron.tasks import TASK_FUNCS
@@ -66,8 +67,10 @@ def cron_list():
 
 
 @cron_app.command("start")
-def cron_start():
-    asyncio.run(start_scheduler())
+def cron_start(
+    watch: bool = typer.Option(config.MEMORY_WATCH, "--watch", "-w", help="Watch memory files and reindex them on change"),
+):
+    asyncio.run(start_scheduler(watch=watch))
 
 
 def cron_interactive():
@@ -144,7 +147,7 @@ def cron_interactive():
         elif choice == "4":
             console.print("[yellow]Starting scheduler... Press Ctrl+C to stop.[/yellow]")
             try:
-                asyncio.run(start_scheduler())
+                asyncio.run(start_scheduler(watch=config.MEMORY_WATCH))
             except KeyboardInterrupt:
                 pass
             break
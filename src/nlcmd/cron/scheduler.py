@@ -154,13 +154,23 @@ def parse_trigger(schedule_str: str):
     raise ValueError(f"Unsupported schedule format: {schedule_str}")
 
 
-async def start_scheduler():
+async def start_scheduler(watch: bool = False):
     manager = TaskManager()
     tasks = manager.load_tasks()
     
-    if not tasks:
+    if not tasks and not watch:
         console.print("[yellow]No tasks to schedule.[/yellow]")
 
+    watcher = None
+    if watch:
+        from nlcmd.memory.watcher import MemoryWatcher
+        try:
+            watcher = MemoryWatcher(str(config.WORKSPACE))
+            watcher.start()
+        except Exception as e:
+            console.print(f"[red]Failed to start memory watcher: {e}[/red]")
+            watcher = None
+
     for task in tasks:
         if task.enabled:
             try:
@@ -180,9 +190,13 @@ async def start_scheduler():
     try:
         while scheduler.running:
             await asyncio.sleep(1)
+            if watcher is not None:
+                watcher.print_messages()
     except asyncio.CancelledError:
         pass
     finally:
+        if watcher is not None:
+            watcher.stop()
         if scheduler.running:
             scheduler.shutdown()
             console.print("\n[dim]Scheduler stopped.[/dim]")
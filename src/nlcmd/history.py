@@ -0,0 +1,75 @@
+import json
+from typing import Optional
+
+import typer
+from rich.table import Table
+
+from nlcmd import config
+from nlcmd.ui import console
+from nlcmd.journal import get_journal
+
+history_app = typer.Typer(help="Show executed commands from the workspace journal")
+
+
+def _status(entry) -> str:
+    if entry["status"] == "ok":
+        return "[green]ok[/green]"
+    if entry["status"] == "failed":
+        return f"[red]exit {entry['exit_code']}[/red]"
+    return f"[red]{entry['status']}[/red]"
+
+
+@history_app.command()
+def history(
+    slow: bool = typer.Option(False, "--slow", "-s", help="Slowest commands first"),
+    failed: bool = typer.Option(False, "--failed", "-f", help="Only failed, timed out or errored commands"),
+    top: bool = typer.Option(False, "--top", "-t", help="Most frequently repeated commands"),
+    grep: Optional[str] = typer.Option(None, "--grep", "-g", help="Only commands containing this text"),
+    limit: int = typer.Option(20, "--limit", "-n", help="Number of rows"),
+    as_json: bool = typer.Option(False, "--json", help="Print JSON lines instead of a table"),
+):
+    journal = get_journal(str(config.WORKSPACE))
+
+    if top:
+        rows = journal.top(limit)
+        if as_json:
+            for row in rows:
+                print(json.dumps(row, ensure_ascii=False))
+            return
+        table = Table(title="Most repeated commands")
+        for column in ("Runs", "Avg", "Total", "Failures", "Outputs", "Command"):
+            table.add_column(column, justify="right" if column != "Command" else "left", overflow="fold" if column == "Command" else None)
+        for row in rows:
+            table.add_row(
+                str(row["runs"]), f"{row['avg_duration']:.2f}s", f"{row['total_duration']:.2f}s",
+                str(row["failures"]), str(row["distinct_outputs"]), row["command"],
+            )
+        console.print(table)
+        return
+
+    rows = journal.query(slow=slow, failed=failed, contains=grep, limit=limit)
+    if as_json:
+        for row in rows:
+            print(json.dumps(row, ensure_ascii=False))
+        return
+    if not rows:
+        console.print("[dim]No commands recorded yet.[/dim]")
+        return
+
+    table = Table(title="Slowest commands" if slow else "Command history")
+    table.add_column("Time")
+    table.add_column("Status")
+    table.add_column("Duration", justify="right")
+    table.add_column("Output", justify="right")
+    table.add_column("Command", overflow="fold")
+    table.add_column("Query", overflow="fold", style="dim")
+    for row in rows:
+        table.add_row(
+            (row["ts"] or "")[:19].replace("T", " "),
+            _status(row),
+            f"{row['duration']:.2f}s",
+            f"{row['stdout_bytes'] + row['stderr_bytes']}B",
+            row["command"],
+            row["query"] or "",
+        )
+    console.print(table)
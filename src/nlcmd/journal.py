@@ -0,0 +1,223 @@
+import atexit
+import hashlib
+import json
+import queue
+import sqlite3
+import threading
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from nlcmd import config
+
+# Relative to the workspace, next to the spilled command output
+JOURNAL_DIR = Path(".nlcmd") / "journal"
+JOURNAL_FILE = "journal.jsonl"
+INDEX_FILE = "index.db"
+
+# The user request being served; set by CommandGenerator.run_task and inherited by tool calls
+current_query: ContextVar[Optional[str]] = ContextVar("current_query", default=None)
+
+INDEX_COLUMNS = (
+    "ts", "query", "command", "cwd", "executor", "status", "exit_code", "duration",
+    "stdout_bytes", "stderr_bytes", "stdout_sha256", "stderr_sha256", "command_sha256",
+)
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def journal_entry(result, query: Optional[str] = None) -> Dict[str, Any]:
+    """Flatten a CommandResult into a journal record. Output is stored as sizes and hashes, not text."""
+    return {
+        "ts": (result.started_at.isoformat(timespec="milliseconds") if result.started_at else None),
+        "query": query,
+        "command": result.command,
+        "cwd": result.cwd,
+        "executor": result.executor,
+        "status": result.status,
+        "exit_code": result.exit_code,
+        "duration": round(result.duration, 4),
+        "stdout_bytes": result.stdout_bytes,
+        "stderr_bytes": result.stderr_bytes,
+        "stdout_truncated": result.stdout_truncated,
+        "stderr_truncated": result.stderr_truncated,
+        "stdout_sha256": _sha256(result.stdout),
+        "stderr_sha256": _sha256(result.stderr),
+        # Same command in the same directory; the key for spotting repeats and for caching
+        "command_sha256": _sha256(f"{result.cwd}\0{result.command}"),
+    }
+
+
+class Journal:
+    """
+    Append-only JSONL log of executed commands with size-based rotation (journal.jsonl, journal.1.jsonl, ...).
+    Records are written by a background thread so execution never waits on disk, and mirrored into a
+    sqlite index for `nlcmd history` queries.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int = None, backups: int = None):
+        self.directory = Path(directory)
+        self.max_bytes = int(config.JOURNAL_MAX_MB * 1024 * 1024) if max_bytes is None else max_bytes
+        self.backups = config.JOURNAL_BACKUPS if backups is None else backups
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> Path:
+        return self.directory / JOURNAL_FILE
+
+    @property
+    def index_path(self) -> Path:
+        return self.directory / INDEX_FILE
+
+    def _connect(self) -> sqlite3.Connection:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.index_path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "id INTEGER PRIMARY KEY, ts TEXT, query TEXT, command TEXT, cwd TEXT, executor TEXT, status TEXT, "
+            "exit_code INTEGER, duration REAL, stdout_bytes INTEGER, stderr_bytes INTEGER, "
+            "stdout_sha256 TEXT, stderr_sha256 TEXT, command_sha256 TEXT)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_ts ON entries (ts)")
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_duration ON entries (duration)")
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_status ON entries (status)")
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_command ON entries (command_sha256)")
+        return conn
+
+    def record(self, result, query: Optional[str] = None):
+        """Queue a CommandResult for writing. Never blocks on I/O."""
+        entry = journal_entry(result, query if query is not None else current_query.get())
+        with self._lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, daemon=True, name="nlcmd-journal")
+                self._writer.start()
+        self._queue.put(entry)
+
+    def _write_loop(self):
+        conn = self._connect()
+        try:
+            while True:
+                entry = self._queue.get()
+                try:
+                    if entry is None:
+                        return
+                    self._append(conn, entry)
+                except Exception:
+                    # The journal is best effort; never take the REPL down over it
+                    pass
+                finally:
+                    self._queue.task_done()
+        finally:
+            conn.close()
+
+    def _append(self, conn: sqlite3.Connection, entry: Dict[str, Any]):
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        if self.path.exists() and self.path.stat().st_size + len(line) > self.max_bytes:
+            self._rotate(conn)
+        with open(self.path, "ab") as f:
+            f.write(line)
+        with conn:
+            conn.execute(
+                f"INSERT INTO entries ({', '.join(INDEX_COLUMNS)}) VALUES ({', '.join('?' * len(INDEX_COLUMNS))})",
+                [entry[column] for column in INDEX_COLUMNS],
+            )
+
+    def _backup(self, n: int) -> Path:
+        return self.directory / f"journal.{n}.jsonl"
+
+    def _rotate(self, conn: sqlite3.Connection):
+        self._backup(self.backups).unlink(missing_ok=True)
+        for n in range(self.backups - 1, 0, -1):
+            if self._backup(n).exists():
+                self._backup(n).replace(self._backup(n + 1))
+        if self.backups > 0:
+            self.path.replace(self._backup(1))
+        else:
+            self.path.unlink()
+
+        # Keep the index in step with what is still on disk
+        oldest = next((self._backup(n) for n in range(self.backups, 0, -1) if self._backup(n).exists()), None)
+        with conn:
+            if oldest is None:
+                conn.execute("DELETE FROM entries")
+            else:
+                with open(oldest, encoding="utf-8") as f:
+                    first_ts = json.loads(f.readline())["ts"]
+                conn.execute("DELETE FROM entries WHERE ts < ?", (first_ts,))
+
+    def flush(self):
+        """Wait until every queued record is on disk."""
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.join()
+
+    def close(self):
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None and writer.is_alive():
+            self._queue.put(None)
+            writer.join()
+
+    def query(self, slow: bool = False, failed: bool = False, contains: str = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """Recent entries, or the slowest first with `slow`; `failed` keeps non-zero exits, timeouts and errors."""
+        if not self.index_path.exists():
+            return []
+        where, params = [], []
+        if failed:
+            where.append("status != 'ok'")
+        if contains:
+            where.append("command LIKE ?")
+            params.append(f"%{contains}%")
+        sql = f"SELECT {', '.join(INDEX_COLUMNS)} FROM entries"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY duration DESC" if slow else " ORDER BY ts DESC, id DESC"
+        sql += " LIMIT ?"
+        conn = self._connect()
+        try:
+            rows = conn.execute(sql, (*params, limit)).fetchall()
+        finally:
+            conn.close()
+        return [dict(zip(INDEX_COLUMNS, row)) for row in rows]
+
+    def top(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Most frequently repeated commands (same command in the same directory)."""
+        if not self.index_path.exists():
+            return []
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT command, cwd, COUNT(*) AS runs, AVG(duration), SUM(duration), "
+                "SUM(status != 'ok'), COUNT(DISTINCT stdout_sha256), MAX(ts) "
+                "FROM entries GROUP BY command_sha256 ORDER BY runs DESC, SUM(duration) DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        finally:
+            conn.close()
+        keys = ("command", "cwd", "runs", "avg_duration", "total_duration", "failures", "distinct_outputs", "last_ts")
+        return [dict(zip(keys, row)) for row in rows]
+
+
+_journals: Dict[str, Journal] = {}
+_journals_lock = threading.Lock()
+
+
+def get_journal(work_dir: str) -> Journal:
+    """The journal of a workspace, shared by every command run in it."""
+    with _journals_lock:
+        journal = _journals.get(work_dir)
+        if journal is None:
+            journal = _journals[work_dir] = Journal(Path(work_dir) / JOURNAL_DIR)
+        return journal
+
+
+@atexit.register
+def close_journals():
+    with _journals_lock:
+        journals = list(_journals.values())
+    for journal in journals:
+        journal.close()
@@ -1,24 +1,44 @@
 from typing import Tuple, Optional, Any, Callable, List, Dict, Literal
 from datetime import datetime
+import asyncio
+import contextlib
+import functools
+import time
 import anyio
 from pydantic import BaseModel
 from pydantic_ai import Agent, CallToolsNode, ModelRequestNode, RunContext, ToolReturnPart
+from pydantic_ai.messages import (
+    FunctionToolCallEvent,
+    FunctionToolResultEvent,
+    PartDeltaEvent,
+    PartStartEvent,
+    RetryPromptPart,
+    TextPart,
+    TextPartDelta,
+)
+from pydantic_ai.models import Model
 from pydantic_ai.models.openai import OpenAIChatModel
 from pydantic_ai.providers.litellm import LiteLLMProvider
+from openai import AsyncOpenAI
+from pydantic_ai.toolsets import WrapperToolset
+from pydantic_ai.usage import RunUsage
 import platform
 from pathlib import Path
 from pydantic_ai_skills import SkillsToolset
 from rich.panel import Panel
 
 from nlcmd import config
-from nlcmd.utils import WorkspaceError, run_shell_command_with_confirmation_async
-from nlcmd.ui import console
-from nlcmd.memory import MemoryIndexer
+from nlcmd.utils import WorkspaceError, resolve_workspace, run_shell_command_with_confirmation_async
+from nlcmd.plan import PlanStep, run_plan_with_confirmation_async
+from nlcmd.ui import ResponseStream, console, prompts
+from nlcmd.memory import MemoryIndexer, get_indexer
+from nlcmd.skills import workspace_skills_toolset
+from nlcmd import tracing
+from nlcmd.journal import current_query
+from nlcmd.replay import TRANSCRIPT_FILE, record_turn
+from nlcmd.resilience import ResilientModel
+from nlcmd.router import RouterModel, RouteState, RouteStats, classify, current_route, escalate, route_entry
 
-import logfire
-
-logfire.configure()
-logfire.instrument_pydantic_ai()
 
 MAX_CONTENT_DISPLAY = 500
 
@@ -27,33 +47,61 @@ def truncate_content(content: str, max_len: int = MAX_CONTENT_DISPLAY) -> str:
         return content
     return content[:max_len] + "..."
 
+# Tools that write files, run processes or prompt the user run one at a time, in the order the model
+# called them. All other tools (recall_memory, list_memories, skill loading) are concurrency-safe and
+# pydantic-ai runs them in parallel within a step.
+SIDE_EFFECT_SKILL_TOOLS = {"run_skill_script"}
+
 class AgentState(BaseModel):
     os_name: str
     shell_name: str
     dry_run: bool = False
     workspace: str = ""
     memory_indexer: Any = None
+    side_effects: Any = None
+
+def _side_effects(deps: AgentState):
+    return deps.side_effects if deps.side_effects is not None else contextlib.nullcontext()
+
+def ordered(func):
+    """Serialize a side-effecting tool with the other side-effecting tools of the run."""
+    @functools.wraps(func)
+    async def wrapper(ctx: RunContext[AgentState], *args, **kwargs):
+        async with _side_effects(ctx.deps):
+            return await func(ctx, *args, **kwargs)
+    return wrapper
+
+class OrderedSkillsToolset(WrapperToolset):
+    async def call_tool(self, name, tool_args, ctx, tool):
+        if name in SIDE_EFFECT_SKILL_TOOLS:
+            async with _side_effects(ctx.deps):
+                return await super().call_tool(name, tool_args, ctx, tool)
+        return await super().call_tool(name, tool_args, ctx, tool)
+
+# The instructions are sent in this order: static rules, skills catalog, then the context section.
+# Providers cache the longest unchanged prompt prefix, so everything that varies between requests
+# (date, workspace, OS) is kept out of the first two parts. The catalog only varies per request once
+# there are more than SKILLS_TOP_K skills, and is then far shorter than the full list.
 
 def build_system_prompt(deps: AgentState) -> str:
-    now = datetime.now()
+    """Static rules. Depends only on the shell, which is fixed for the life of the process."""
     base = (
         "You are a helpful assistant for task execution.\n"
-        f"The user is running on {deps.os_name} using {deps.shell_name}.\n"
-        f"The user's workspace directory is: {deps.workspace}\n"
-        f"Current date and time: {now.strftime('%Y-%m-%d %H:%M:%S')} ({now.strftime('%A')})\n"
-        "All file operations should be relative to this workspace unless an absolute path is specified.\n"
-        "You have access to tools to execute shell commands ('run_shell_command'), propose options ('propose_options'), write files ('write_file'), add memories ('add_memory'), recall memories ('recall_memory'), edit memories ('edit_memory'), and manage skills.\n"
+        "The user's OS, shell, workspace directory and today's date are given in the Context section at the end.\n"
+        "All file operations should be relative to the workspace unless an absolute path is specified.\n"
+        "You have access to tools to execute shell commands ('run_shell_command'), run multi-command plans ('run_plan'), propose options ('propose_options'), write files ('write_file'), add memories ('add_memory'), recall memories ('recall_memory'), edit memories ('edit_memory'), and manage skills.\n"
         "Workflow:\n"
         "1. Analyze the user's request.\n"
         "2. If the request references people, preferences, or past context -> Call `recall_memory` FIRST to check if relevant information exists.\n"
         "3. If the request is clear and simple -> Call `run_shell_command` directly.\n"
-        "4. If the request is ambiguous -> Call `propose_options` with possible commands.\n"
-        "5. If the request is still vague after checking memory -> Ask the user for clarification (text response).\n"
-        "6. If a skill is relevant -> Use `load_skill` and follow the skill instructions.\n"
-        "7. To add a memory:\n"
+        "4. If the request needs several commands (e.g. the same operation over many files or directories) -> Call `run_plan` once with all steps; declare `depends_on` only where a step needs another's result so the rest run in parallel.\n"
+        "5. If the request is ambiguous -> Call `propose_options` with possible commands.\n"
+        "6. If the request is still vague after checking memory -> Ask the user for clarification (text response).\n"
+        "7. If a skill is relevant -> Use `load_skill` and follow the skill instructions.\n"
+        "8. To add a memory:\n"
         "   a. Call `list_memories` to check existing categories.\n"
         "   b. Call `add_memory` to append to an existing category(preferrably) OR create a new one.\n"
-        "8. To recall a memory -> Call `recall_memory` with a relevant query.\n"
+        "9. To recall a memory -> Call `recall_memory` with a relevant query.\n"
         "IMPORTANT: When calling a tool, do NOT output any conversational text. Just call the tool.\n"
         "\n## Memory-First Policy:\n"
         "- When the user mentions specific people (like '恩师', '老师', '朋友') that haven't been mentioned before, preferences, or personal context, ALWAYS call `recall_memory` first.\n"
@@ -77,14 +125,33 @@ def build_system_prompt(deps: AgentState) -> str:
     
     return base
 
+def build_context_prompt(deps: AgentState) -> str:
+    """Per-request context, kept small and at the end. The date has day granularity so it rarely breaks the cache."""
+    today = datetime.now()
+    return (
+        "## Context:\n"
+        f"- OS: {deps.os_name}, shell: {deps.shell_name}\n"
+        f"- Workspace directory: {deps.workspace}\n"
+        f"- Today's date: {today.strftime('%Y-%m-%d')} ({today.strftime('%A')}); run a command such as `date` if the exact time matters.\n"
+    )
+
+def cache_hit_rate(usage: RunUsage) -> Optional[float]:
+    """Share of input tokens served from the provider's prompt cache, or None if nothing was sent."""
+    if not usage.input_tokens:
+        return None
+    return usage.cache_read_tokens / usage.input_tokens
+
+def format_usage(usage: RunUsage) -> str:
+    rate = cache_hit_rate(usage)
+    cached = f", {usage.cache_read_tokens} cached ({rate:.0%})" if rate is not None else ""
+    return f"{usage.requests} request(s), {usage.input_tokens} input tokens{cached}, {usage.output_tokens} output tokens"
+
 def create_agent(model, workspace) -> Tuple[Agent[AgentState], SkillsToolset]:
-    skills_dir = Path(__file__).parent.parent.parent / 'skills'
-    user_skills_dir = Path(workspace) / 'skills'
-    skills_toolset = SkillsToolset(directories=[skills_dir, user_skills_dir])
+    skills_toolset = workspace_skills_toolset(workspace)
     
     agent = Agent(
         model, 
-        toolsets=[skills_toolset],
+        toolsets=[OrderedSkillsToolset(skills_toolset)],
         deps_type=AgentState
     )
     
@@ -96,23 +163,55 @@ def create_agent(model, workspace) -> Tuple[Agent[AgentState], SkillsToolset]:
     async def add_skills(ctx: RunContext[AgentState]) -> str | None:
         return await skills_toolset.get_instructions(ctx)
 
+    @agent.instructions
+    async def add_context(ctx: RunContext[AgentState]) -> str:
+        return build_context_prompt(ctx.deps)
+
     @agent.tool
-    async def run_shell_command(ctx: RunContext[AgentState], command: str) -> str:
+    @ordered
+    async def run_shell_command(ctx: RunContext[AgentState], command: str, timeout: Optional[float] = None) -> str:
         """
         Execute a shell command directly. Use this when the user's intent is clear and a single command can solve it.
         This tool will ask for user confirmation before execution.
+        Commands are killed after `timeout` seconds (default COMMAND_TIMEOUT); pass a larger value for long builds or
+        downloads. Never run commands that wait for input or run forever (e.g. `ping` without `-c`, `top`).
         Raises WorkspaceError if workspace directory cannot be created or accessed.
         """
         try:
-            return await run_shell_command_with_confirmation_async(
+            result = await run_shell_command_with_confirmation_async(
                 command,
                 dry_run=ctx.deps.dry_run,
-                cwd=ctx.deps.workspace
+                cwd=ctx.deps.workspace,
+                timeout=timeout
             )
+            if result.status in ("failed", "timed_out", "error"):
+                escalate(f"command {result.status}")
+            return result.render()
         except WorkspaceError:
             raise
 
     @agent.tool
+    @ordered
+    async def run_plan(ctx: RunContext[AgentState], steps: List[PlanStep], max_parallel: Optional[int] = None) -> str:
+        """
+        Execute several shell commands as one plan. The user confirms the whole plan once; steps without
+        dependencies between them run in parallel (up to `max_parallel`, default PLAN_MAX_PARALLEL).
+        A step starts only after every step in its `depends_on` succeeded; steps depending on a failed step are skipped.
+        Returns each step's status and output.
+        Raises WorkspaceError if workspace directory cannot be created or accessed.
+        """
+        try:
+            return await run_plan_with_confirmation_async(
+                steps,
+                dry_run=ctx.deps.dry_run,
+                cwd=ctx.deps.workspace,
+                max_parallel=max_parallel
+            )
+        except WorkspaceError:
+            raise
+
+    @agent.tool
+    @ordered
     async def write_file(ctx: RunContext[AgentState], filepath: str, content: str) -> str:
         """
         Write content to a file directly WITHOUT asking for user confirmation.
@@ -124,11 +223,11 @@ def create_agent(model, workspace) -> Tuple[Agent[AgentState], SkillsToolset]:
         The filepath is relative to the workspace.
         """
         try:
-            workspace_path = await anyio.Path(ctx.deps.workspace).resolve()
-            full_path = (workspace_path / filepath).resolve()
+            workspace = resolve_workspace(ctx.deps.workspace)
+            full_path = await anyio.Path(workspace.path / filepath).resolve()
             
-            if not str(full_path).startswith(str(workspace_path)):
-                return f"Error: Access denied. Cannot write to {filepath} outside of workspace {workspace_path}."
+            if not workspace.contains(full_path):
+                return f"Error: Access denied. Cannot write to {filepath} outside of workspace {workspace.path}."
             
             if ctx.deps.dry_run:
                 return f"[Dry Run] Would write to {filepath}:\n{truncate_content(content, 100)}"
@@ -152,7 +251,7 @@ def create_agent(model, workspace) -> Tuple[Agent[AgentState], SkillsToolset]:
             A list of strings formatted as "filename: [description extracted from metadata]"
         """
         try:
-            workspace_path = await anyio.Path(ctx.deps.workspace).resolve()
+            workspace_path = anyio.Path(resolve_workspace(ctx.deps.workspace).path)
             memory_dir = workspace_path / "memory" / memory_type
             
             if not await memory_dir.exists():
@@ -179,6 +278,7 @@ def create_agent(model, workspace) -> Tuple[Agent[AgentState], SkillsToolset]:
             return f"Error listing memories: {str(e)}"
 
     @agent.tool
+    @ordered
     async def add_memory(ctx: RunContext[AgentState], content: str, memory_type: Literal["important", "temp"], category_name: str, description: str = "") -> str:
         """
         Add a new memory entry to a memory file.
@@ -196,7 +296,7 @@ def create_agent(model, workspace) -> Tuple[Agent[AgentState], SkillsToolset]:
             description: Description of this memory category (required only when creating a NEW file).
         """
         try:
-            workspace_path = await anyio.Path(ctx.deps.workspace).resolve()
+            workspace_path = anyio.Path(resolve_workspace(ctx.deps.workspace).path)
             memory_dir = workspace_path / "memory" / memory_type
             await memory_dir.mkdir(parents=True, exist_ok=True)
             
@@ -243,6 +343,7 @@ def create_agent(model, workspace) -> Tuple[Agent[AgentState], SkillsToolset]:
     async def recall_memory(ctx: RunContext[AgentState], query: str, limit: int = 5) -> str:
         """
         Recall memories related to a specific query using semantic search.
+        Results are ranked by relevance, recency and memory type, with duplicate entries removed.
         Use this when you need to remember past interactions, user preferences, or project context.
         
         Args:
@@ -256,7 +357,7 @@ def create_agent(model, workspace) -> Tuple[Agent[AgentState], SkillsToolset]:
             return "Memory search is not available (txtai dependency missing or initialization failed)."
             
         try:
-            results = await ctx.deps.memory_indexer.search_async(query, limit)
+            results = await ctx.deps.memory_indexer.recall_async(query, limit)
             if not results:
                 return f"No memories found for query: '{query}'"
             
@@ -264,12 +365,9 @@ def create_agent(model, workspace) -> Tuple[Agent[AgentState], SkillsToolset]:
             for i, res in enumerate(results):
                 score = res.get('score', 0.0)
                 text = res.get('text', '').strip()
-                meta = res.get('metadata', {})
-                category = meta.get('category', 'unknown')
-                date_str = meta.get('date', '')
-                time_str = meta.get('time', '')
-                datetime_info = f" {date_str} {time_str}".strip()
-                datetime_part = f" [{datetime_info}]" if datetime_info else ""
+                category = res.get('category', 'unknown')
+                timestamp = res.get('timestamp', '')
+                datetime_part = f" [{timestamp}]" if timestamp else ""
                 formatted_results.append(f"Result {i+1} (Score: {score:.2f}) [{category}]{datetime_part}:\n{text}\n---")
                 
             return "\n".join(formatted_results)
@@ -277,6 +375,7 @@ def create_agent(model, workspace) -> Tuple[Agent[AgentState], SkillsToolset]:
             return f"Error recalling memory: {str(e)}"
 
     @agent.tool
+    @ordered
     async def edit_memory(
         ctx: RunContext[AgentState], 
         category_name: str, 
@@ -303,7 +402,7 @@ def create_agent(model, workspace) -> Tuple[Agent[AgentState], SkillsToolset]:
             Success message or error description.
         """
         try:
-            workspace_path = await anyio.Path(ctx.deps.workspace).resolve()
+            workspace_path = anyio.Path(resolve_workspace(ctx.deps.workspace).path)
             safe_name = "".join(c for c in category_name if c.isalnum() or c in ('_', '-')).strip()
             if not safe_name:
                 return "Error: Invalid category_name"
@@ -358,6 +457,7 @@ def create_agent(model, workspace) -> Tuple[Agent[AgentState], SkillsToolset]:
             return f"Error editing memory: {str(e)}"
 
     @agent.tool
+    @ordered
     async def propose_options(ctx: RunContext[AgentState], options: List[Dict[str, str]]) -> str:
         """
         Propose multiple command options to the user when the request is ambiguous.
@@ -365,13 +465,14 @@ def create_agent(model, workspace) -> Tuple[Agent[AgentState], SkillsToolset]:
         Example: [{"command": "ls -l", "description": "List detailed files"}, {"command": "ls -a", "description": "List all files"}]
         Raises WorkspaceError if workspace directory cannot be created or accessed.
         """
-        console.print(Panel("Please choose an option:", title="Ambiguous Request", border_style="yellow"))
-        for i, opt in enumerate(options):
-            console.print(f"{i+1}. [bold cyan]{opt['command']}[/bold cyan] - {opt['description']}")
+        escalate("ambiguous request")
+        async with prompts.turn():
+            console.print(Panel("Please choose an option:", title="Ambiguous Request", border_style="yellow"))
+            for i, opt in enumerate(options):
+                console.print(f"{i+1}. [bold cyan]{opt['command']}[/bold cyan] - {opt['description']}")
+            
+            choice = await prompts.input("[bold yellow]Enter number (or 'c' to cancel): [/bold yellow]")
         
-        choice = await anyio.to_thread.run_sync(
-            lambda: console.input("[bold yellow]Enter number (or 'c' to cancel): [/bold yellow]")
-        )
         if choice.lower() == 'c':
             return "User cancelled selection."
         
@@ -379,11 +480,12 @@ def create_agent(model, workspace) -> Tuple[Agent[AgentState], SkillsToolset]:
             idx = int(choice) - 1
             if 0 <= idx < len(options):
                 selected_cmd = options[idx]['command']
-                return await run_shell_command_with_confirmation_async(
+                result = await run_shell_command_with_confirmation_async(
                     selected_cmd,
                     dry_run=ctx.deps.dry_run,
                     cwd=ctx.deps.workspace
                 )
+                return result.render()
             else:
                 return "Invalid selection."
         except ValueError:
@@ -393,29 +495,84 @@ def create_agent(model, workspace) -> Tuple[Agent[AgentState], SkillsToolset]:
 
     return agent, skills_toolset
 
-class CommandGenerator:
-    def __init__(self, workspace: str = None):
-        if not config.OPENAI_API_KEY:
-            raise ValueError("OPENAI_API_KEY is not set. Please set it in .env file.")
-        self.model = OpenAIChatModel(
-            config.OPENAI_MODEL,
-            provider=LiteLLMProvider(
-                api_key=config.OPENAI_API_KEY,
-                api_base=config.OPENAI_BASE_URL or None,
-            ),
+async def stream_node(node, ctx, stream: ResponseStream):
+    """Drive a graph node through its event stream, forwarding text deltas and tool progress."""
+    if Agent.is_model_request_node(node):
+        with tracing.span("model stream") as span:
+            start = time.perf_counter()
+            first = None
+            async with node.stream(ctx) as events:
+                async for event in events:
+                    if first is None:
+                        first = time.perf_counter() - start
+                        span.set_attribute("ttft", round(first, 4))
+                    if isinstance(event, PartStartEvent) and isinstance(event.part, TextPart):
+                        stream.text(event.part.content)
+                    elif isinstance(event, PartDeltaEvent) and isinstance(event.delta, TextPartDelta):
+                        stream.text(event.delta.content_delta)
+    elif Agent.is_call_tools_node(node):
+        async with node.stream(ctx) as events:
+            async for event in events:
+                if isinstance(event, FunctionToolCallEvent):
+                    stream.tool_call(event.part.tool_call_id, event.part.tool_name, event.part.args_as_json_str())
+                elif isinstance(event, FunctionToolResultEvent):
+                    stream.tool_result(event.result.tool_call_id, event.result.tool_name, isinstance(event.result, ToolReturnPart))
+
+def _provider(api_key: str, base_url: str) -> LiteLLMProvider:
+    # ResilientModel owns retries; the OpenAI SDK's own retries would multiply them
+    return LiteLLMProvider(openai_client=AsyncOpenAI(
+        base_url=base_url or None,
+        api_key=api_key or "litellm-placeholder",
+        max_retries=0 if config.LLM_RETRIES > 0 else 2,
+    ))
+
+def build_model(model_name: str) -> ResilientModel:
+    """The chat model for `model_name`, hedged to the FALLBACK_* endpoint when one is configured."""
+    primary = OpenAIChatModel(model_name, provider=_provider(config.OPENAI_API_KEY, config.OPENAI_BASE_URL))
+    secondary = None
+    if config.FALLBACK_BASE_URL or config.FALLBACK_MODEL:
+        secondary = OpenAIChatModel(
+            config.FALLBACK_MODEL or model_name,
+            provider=_provider(config.FALLBACK_API_KEY or config.OPENAI_API_KEY, config.FALLBACK_BASE_URL or config.OPENAI_BASE_URL),
         )
+    return ResilientModel(primary, secondary)
+
+def build_agent_model() -> Model:
+    """The configured strong model, routed to FAST_MODEL for simple requests when one is set."""
+    if not config.OPENAI_API_KEY:
+        raise ValueError("OPENAI_API_KEY is not set. Please set it in .env file.")
+    model = build_model(config.STRONG_MODEL)
+    if config.FAST_MODEL and config.FAST_MODEL != config.STRONG_MODEL:
+        model = RouterModel(model, build_model(config.FAST_MODEL))
+    return model
+
+class CommandGenerator:
+    def __init__(self, workspace: str = None, model: Model = None, agent: Agent = None, memory_indexer: MemoryIndexer = None):
+        """
+        `model` replaces the configured endpoints, e.g. with a ReplayModel for offline load tests.
+        `agent` and `memory_indexer` let sessions of the same workspace share them (see nlcmd.server).
+        """
+        self.model = model or build_agent_model()
+        self.routing = isinstance(self.model, RouterModel)
         self.os_name = platform.system()
         self.shell_name = config.DEFAULT_SHELL
         self.workspace = workspace or str(config.WORKSPACE)
+        self.route_stats = RouteStats(self.workspace)
+        self.memory_indexer = memory_indexer
 
-        self.agent, self.skills_toolset = create_agent(self.model, self.workspace)
+        if agent is None:
+            self.agent, self.skills_toolset = create_agent(self.model, self.workspace)
+        else:
+            self.agent, self.skills_toolset = agent, None
         self.message_history = []
+        # Token usage summed over the session, for reporting the prompt cache hit rate
+        self.usage = RunUsage()
 
-    async def run_task(self, text: str, dry_run: bool = False, reasoning_callback: Optional[Callable[[str], None]] = None) -> Any:
-        memory_indexer = None
+    async def run_task(self, text: str, dry_run: bool = False, reasoning_callback: Optional[Callable[[str], None]] = None, stream: Optional[ResponseStream] = None) -> Any:
+        memory_indexer = self.memory_indexer
         try:
-            index_path = Path(self.workspace) / "memory" / "index"
-            memory_indexer = MemoryIndexer(index_path)
+            if memory_indexer is None:
+                memory_indexer = get_indexer(Path(self.workspace) / "memory" / "index")
         except Exception as e:
             if config.SHOW_REASONING and reasoning_callback:
                 reasoning_callback(f"\n[yellow]Warning: Memory indexer initialization failed: {e}[/yellow]\n")
@@ -425,16 +582,34 @@ class CommandGenerator:
             shell_name=self.shell_name, 
             dry_run=dry_run,
             workspace=self.workspace,
-            memory_indexer=memory_indexer
+            memory_indexer=memory_indexer,
+            side_effects=asyncio.Lock()
         )
 
+        query_token = current_query.set(text)
+        workspace_token = tracing.trace_workspace.set(str(self.workspace))
+        route = classify(text) if self.routing else RouteState("strong", "routing disabled")
+        route_token = current_route.set(route)
+        started = time.perf_counter()
         try:
             if config.SHOW_REASONING and reasoning_callback:
                 reasoning_callback("Generating system prompt...\n")
             full_response = ""
-            with logfire.span("agent_execution", prompt_version="v2"):
-                async with self.agent.iter(text, deps=deps, message_history=self.message_history[-4:]) as run:
+            if self.routing and config.SHOW_REASONING and reasoning_callback:
+                reasoning_callback(f"Route: {route.route} ({route.reason})\n")
+            history = self.message_history[-4:]
+            with tracing.span(
+                "agent_execution",
+                prompt_version="v3",
+                route=route.route,
+                history_messages=len(history),
+                history_chars=sum(len(str(part.content)) for message in history for part in message.parts if hasattr(part, "content")),
+            ) as span:
+                async with self.agent.iter(text, deps=deps, message_history=history) as run:
                     async for node in run:
+                        if isinstance(node, ModelRequestNode) and any(isinstance(part, RetryPromptPart) for part in node.request.parts):
+                            # The model sent invalid tool arguments or asked for an unknown tool
+                            route.escalate("tool call retry")
                         if config.SHOW_REASONING and reasoning_callback:
                             if isinstance(node, ModelRequestNode):
                                 reasoning_callback("\n[bold cyan]🚀 Sending Request to LLM:[/bold cyan]\n")
@@ -455,8 +630,22 @@ class CommandGenerator:
                                     elif hasattr(part, 'tool_name') and config.SHOW_TOOLCALLING:
                                         args_str = str(part.args) if part.args else ""
                                         reasoning_callback(f"[Tool Call]: {part.tool_name}({truncate_content(args_str, 200)})\n")
+                        if stream is not None:
+                            await stream_node(node, run.ctx, stream)
                         self.message_history = run.all_messages()
                     
+                    usage = run.usage()
+                    self.usage.incr(usage)
+                    self.route_stats.record(route_entry(route, run.new_messages(), usage, time.perf_counter() - started))
+                    if config.RECORD_TRANSCRIPTS:
+                        record_turn(Path(self.workspace) / TRANSCRIPT_FILE, text, run.new_messages())
+                    span.set_attribute("escalated", route.escalated or "")
+                    span.set_attribute("input_tokens", usage.input_tokens)
+                    span.set_attribute("cache_read_tokens", usage.cache_read_tokens)
+                    span.set_attribute("output_tokens", usage.output_tokens)
+                    if config.SHOW_REASONING and reasoning_callback:
+                        reasoning_callback(f"\n[Usage] {format_usage(usage)}\n")
+
                     if self.message_history:
                         last_msg = self.message_history[-1]
                         if hasattr(last_msg, 'parts'):
@@ -464,9 +653,17 @@ class CommandGenerator:
                                 if hasattr(part, 'content') and isinstance(part.content, str):
                                     full_response += part.content
 
+            if stream is not None:
+                stream.finish(full_response)
             return str(full_response) if full_response else ""
 
         except WorkspaceError:
             raise
         except Exception as e:
             return f"Error: {str(e)}"
+        finally:
+            if stream is not None:
+                stream.close()
+            current_route.reset(route_token)
+            current_query.reset(query_token)
+            tracing.trace_workspace.reset(workspace_token)
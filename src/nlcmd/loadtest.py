@@ -0,0 +1,118 @@
+import asyncio
+import json
+import shutil
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List
+
+import typer
+from rich.table import Table
+
+from nlcmd.replay import ReplayModel, ReplayTurn, load_transcript, simulated_wait
+from nlcmd.tracing import percentile
+from nlcmd.ui import ResponseStream, console
+
+loadtest_app = typer.Typer(help="Replay recorded transcripts offline to measure nlcmd's own per-turn overhead")
+
+
+async def run_session(model: ReplayModel, turns: List[ReplayTurn], rounds: int, workspace: str) -> List[Dict[str, float]]:
+    """One REPL-like session: the transcript's prompts, `rounds` times over, through CommandGenerator.run_task."""
+    from nlcmd.llm import CommandGenerator
+
+    generator = CommandGenerator(workspace=workspace, model=model)
+    samples = []
+    for _ in range(rounds):
+        for turn in turns:
+            waited = [0.0]
+            token = simulated_wait.set(waited)
+            start = time.perf_counter()
+            try:
+                # Dry run: commands are shown, not executed, so only nlcmd's own work is timed
+                await generator.run_task(turn.prompt, dry_run=True, stream=ResponseStream())
+            finally:
+                simulated_wait.reset(token)
+            wall = time.perf_counter() - start
+            samples.append({"wall": wall, "model": waited[0], "overhead": max(0.0, wall - waited[0])})
+    return samples
+
+
+async def run_load(turns: List[ReplayTurn], sessions: int = 1, rounds: int = 10, latency: float = 0.0,
+                   chars_per_second: float = 0.0, workspace: str = None, heap: bool = True) -> Dict[str, Any]:
+    """
+    Runs `sessions` concurrent sessions over the transcript and reports turn latency, nlcmd overhead
+    (wall time minus simulated model time) and Python heap growth after a warm-up round. Tracing the
+    heap slows Python down noticeably; pass heap=False for timings only.
+    """
+    model = ReplayModel(turns, latency, chars_per_second)
+    scratch = workspace is None
+    workspace = workspace or tempfile.mkdtemp(prefix="nlcmd-loadtest-")
+    quiet = console.quiet
+    console.quiet = True
+    if heap:
+        tracemalloc.start()
+    try:
+        # Warm-up round: imports, skills catalog, prompt building caches
+        await run_session(model, turns, 1, workspace)
+        baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        results = await asyncio.gather(*(run_session(model, turns, rounds, workspace) for _ in range(sessions)))
+        elapsed = time.perf_counter() - start
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        if heap:
+            tracemalloc.stop()
+        console.quiet = quiet
+        if scratch:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    samples = [sample for session in results for sample in session]
+    wall = [sample["wall"] for sample in samples]
+    overhead = [sample["overhead"] for sample in samples]
+    result = {
+        "sessions": sessions,
+        "turns": len(samples),
+        "elapsed": elapsed,
+        "throughput": len(samples) / elapsed if elapsed else 0.0,
+        "turn_p50": percentile(wall, 0.5),
+        "turn_p95": percentile(wall, 0.95),
+        "overhead_p50": percentile(overhead, 0.5),
+        "overhead_p95": percentile(overhead, 0.95),
+        "overhead_max": max(overhead),
+    }
+    if heap:
+        result["heap_growth_kb_per_turn"] = (current - baseline) / 1024 / len(samples)
+        result["heap_peak_mb"] = peak / 1024 / 1024
+    return result
+
+
+@loadtest_app.command()
+def loadtest(
+    transcripts: List[Path] = typer.Argument(..., help="Recorded (RECORD_TRANSCRIPTS) or scripted transcript files"),
+    sessions: int = typer.Option(1, "--sessions", "-c", help="Concurrent sessions"),
+    rounds: int = typer.Option(10, "--rounds", "-r", help="Times each session replays the transcript"),
+    latency: float = typer.Option(0.0, "--latency", help="Simulated seconds before each model response"),
+    chars_per_second: float = typer.Option(0.0, "--cps", help="Simulated streaming speed; 0 sends text at once"),
+    heap: bool = typer.Option(True, "--heap/--no-heap", help="Measure heap growth (slows turns down)"),
+    as_json: bool = typer.Option(False, "--json", help="Print the result as JSON"),
+):
+    turns = [turn for path in transcripts for turn in load_transcript(path)]
+    if not turns:
+        console.print("[red]No turns in the transcripts.[/red]")
+        raise typer.Exit(1)
+    result = asyncio.run(run_load(turns, sessions, rounds, latency, chars_per_second, heap=heap))
+    if as_json:
+        print(json.dumps(result))
+        return
+
+    table = Table(title=f"{result['turns']} turns, {sessions} session(s), {result['elapsed']:.2f}s")
+    table.add_column("Metric")
+    table.add_column("Value", justify="right")
+    table.add_row("Throughput", f"{result['throughput']:.1f} turns/s")
+    table.add_row("Turn p50 / p95", f"{result['turn_p50'] * 1000:.1f} / {result['turn_p95'] * 1000:.1f} ms")
+    table.add_row("Overhead p50 / p95 / max", f"{result['overhead_p50'] * 1000:.1f} / {result['overhead_p95'] * 1000:.1f} / {result['overhead_max'] * 1000:.1f} ms")
+    if heap:
+        table.add_row("Heap growth", f"{result['heap_growth_kb_per_turn']:.1f} KB/turn")
+        table.add_row("Heap peak", f"{result['heap_peak_mb']:.1f} MB")
+    console.print(table)
@@ -1,6 +1,6 @@
 import sys
 import asyncio
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
 try:
     import typer
@@ -9,25 +9,30 @@ except ImportError as e:
     print(f"Error: Missing dependency {e.name}. Please run 'uv sync' or 'pip install .'")
     sys.exit(1)
 
-try:
+if TYPE_CHECKING:
     from nlcmd.llm import CommandGenerator
-    from nlcmd.utils import WorkspaceError
+
+try:
     from nlcmd import config
-    from nlcmd.ui import console
+    from nlcmd.ui import LiveResponseStream, console, prompts
 except ImportError as e:
     print(f"Error: Missing internal modules. {e}")
     sys.exit(1)
 
-async def process_query(generator: CommandGenerator, query: str, dry_run: bool):
+async def process_query(generator: "CommandGenerator", query: str, dry_run: bool):
+    from nlcmd.utils import WorkspaceError
+
     def show_reasoning(text: str):
         if config.SHOW_REASONING:
             console.print(f"[dim]{text.rstrip()}[/dim]")
     
+    stream = LiveResponseStream()
     try:
         response = await generator.run_task(
             query, 
             dry_run=dry_run, 
-            reasoning_callback=show_reasoning
+            reasoning_callback=show_reasoning,
+            stream=stream
         )
     except WorkspaceError as e:
         console.print(Panel(f"[bold red]{str(e)}[/bold red]", title="Workspace Error", border_style="red"))
@@ -36,17 +41,30 @@ async def process_query(generator: CommandGenerator, query: str, dry_run: bool):
         console.print(f"Error executing command: {e}", markup=False)
         return
 
-    if isinstance(response, str) and response.strip():
+    if isinstance(response, str) and response.strip() and not stream.finished:
         console.print(Panel(response, title="AI Response", border_style="green"))
 
 def cli(
     query: Optional[str] = typer.Argument(None, help="The natural language query to execute"),
     interactive: bool = typer.Option(False, "--interactive", "-i", help="Run in interactive mode"),
-    dry_run: bool = typer.Option(False, "--dry-run", "-d", help="Show command without executing")
+    dry_run: bool = typer.Option(False, "--dry-run", "-d", help="Show command without executing"),
+    watch: bool = typer.Option(config.MEMORY_WATCH, "--watch", "-w", help="Watch memory files and reindex them on change (interactive mode)")
 ):
     """
     A Linux console tool that translates natural language to shell commands.
     """
+    if config.NLCMD_SERVER:
+        from nlcmd.client import run_client
+        run_client(config.NLCMD_SERVER, query, dry_run)
+        return
+
+    # Imported here so the thin client above starts without loading the agent stack
+    try:
+        from nlcmd.llm import CommandGenerator, format_usage
+    except ImportError as e:
+        print(f"Error: Missing internal modules. {e}")
+        sys.exit(1)
+
     if not config.OPENAI_API_KEY:
         console.print(Panel("[bold red]OPENAI_API_KEY is not set![/bold red]\nPlease set it in .env file or environment variable.", title="Configuration Error"))
         sys.exit(1)
@@ -62,9 +80,20 @@ def cli(
         asyncio.run(process_query(generator, query, dry_run))
     elif interactive or not query:
         console.print(Panel("[bold green]Welcome to Natural Language Command Executor![/bold green]\nType 'exit' or 'quit' to leave.", title="NLCMD"))
+        watcher = None
+        if watch:
+            from nlcmd.memory.watcher import MemoryWatcher
+            try:
+                watcher = MemoryWatcher(generator.workspace)
+                watcher.start()
+            except Exception as e:
+                console.print(f"[yellow]Memory watcher disabled: {e}[/yellow]")
+                watcher = None
         while True:
             try:
-                user_input = console.input("[bold blue]nlcmd > [/bold blue]")
+                if watcher is not None:
+                    watcher.print_messages()
+                user_input = prompts.read_line_blocking("[bold blue]nlcmd > [/bold blue]")
                 if user_input.lower() in ["exit", "quit"]:
                     break
                 if not user_input.strip():
@@ -75,6 +104,13 @@ def cli(
                 break
             except Exception as e:
                 console.print(f"Error: {e}", markup=False)
+        if watcher is not None:
+            watcher.stop()
+        if generator.usage.requests:
+            console.print(f"[dim]Session usage: {format_usage(generator.usage)}[/dim]")
+        if generator.routing:
+            for line in generator.route_stats.summary():
+                console.print(f"[dim]Route {line}[/dim]")
 
 def main():
     if len(sys.argv) > 1 and sys.argv[1] == "cron":
@@ -84,6 +120,26 @@ def main():
         else:
             sys.argv = [sys.argv[0]] + sys.argv[2:]
             cron_app()
+    elif len(sys.argv) > 1 and sys.argv[1] == "memory":
+        from nlcmd.memory.cli import memory_app
+        sys.argv = [sys.argv[0]] + sys.argv[2:]
+        memory_app()
+    elif len(sys.argv) > 1 and sys.argv[1] == "history":
+        from nlcmd.history import history_app
+        sys.argv = [sys.argv[0]] + sys.argv[2:]
+        history_app()
+    elif len(sys.argv) > 1 and sys.argv[1] == "stats":
+        from nlcmd.stats import stats_app
+        sys.argv = [sys.argv[0]] + sys.argv[2:]
+        stats_app()
+    elif len(sys.argv) > 1 and sys.argv[1] == "loadtest":
+        from nlcmd.loadtest import loadtest_app
+        sys.argv = [sys.argv[0]] + sys.argv[2:]
+        loadtest_app()
+    elif len(sys.argv) > 1 and sys.argv[1] == "serve":
+        from nlcmd.server import serve_app
+        sys.argv = [sys.argv[0]] + sys.argv[2:]
+        serve_app()
     else:
         typer.run(cli)
 
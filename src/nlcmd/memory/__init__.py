@@ -1,4 +1,5 @@
 from nlcmd.memory.store import MemoryStore
-from nlcmd.memory.indexer import MemoryIndexer
+from nlcmd.memory.indexer import MemoryIndexer, get_indexer
+from nlcmd.memory.watcher import MemoryWatcher
 
-__all__ = ["MemoryStore", "MemoryIndexer"]
+__all__ = ["MemoryStore", "MemoryIndexer", "get_indexer", "MemoryWatcher"]
@@ -0,0 +1,187 @@
+import hashlib
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from nlcmd import config
+from nlcmd.memory.indexer import MemoryIndexer
+from nlcmd.memory.snapshot import SNAPSHOT_FILE, FileSnapshot, scan_changes
+from nlcmd.memory.store import entry_documents
+
+BUNDLE_FORMAT = "nlcmd-memory-bundle"
+BUNDLE_VERSION = 1
+MEMORY_TYPES = ("important", "temp")
+
+# Files that identify the embedding model; weights are fingerprinted by size to avoid hashing hundreds of MB
+MODEL_FINGERPRINT_FILES = ("config.json", "modules.json", "tokenizer.json", "1_Pooling/config.json")
+MODEL_WEIGHT_FILES = ("model.safetensors", "pytorch_model.bin")
+
+EXPORT_BATCH_SIZE = 256
+
+
+class BundleError(Exception):
+    """Exception raised when a memory bundle cannot be read or imported."""
+    pass
+
+
+def model_fingerprint(model_name: str = None) -> str:
+    model_name = model_name or config.EMBEDDING_MODEL
+    model_dir = config.MODELS_DIR / model_name.split("/")[-1]
+    hasher = hashlib.sha256(model_name.encode())
+
+    if model_dir.exists():
+        for name in MODEL_FINGERPRINT_FILES:
+            path = model_dir / name
+            if path.exists():
+                hasher.update(name.encode())
+                hasher.update(path.read_bytes())
+        for name in MODEL_WEIGHT_FILES:
+            path = model_dir / name
+            if path.exists():
+                hasher.update(f"{name}:{path.stat().st_size}".encode())
+
+    return hasher.hexdigest()
+
+
+def _json_array(obj: Any) -> np.ndarray:
+    return np.frombuffer(json.dumps(obj, ensure_ascii=False).encode("utf-8"), dtype=np.uint8)
+
+
+def _from_json_array(array: np.ndarray) -> Any:
+    return json.loads(array.tobytes().decode("utf-8"))
+
+
+def _memory_files(memory_root: Path) -> Dict[str, str]:
+    files = {}
+    for memory_type in MEMORY_TYPES:
+        type_dir = memory_root / memory_type
+        if not type_dir.exists():
+            continue
+        for file_path in sorted(type_dir.glob("*.md")):
+            files[f"{memory_type}/{file_path.name}"] = file_path.read_text(encoding="utf-8")
+    return files
+
+
+def export_bundle(workspace: str, output: Path, indexer: Optional[MemoryIndexer] = None) -> Dict[str, Any]:
+    """
+    Write the workspace memory (markdown files, index entries and float16 vectors) to a single .npz bundle.
+    Returns the bundle manifest.
+    """
+    memory_root = Path(workspace).resolve() / "memory"
+    indexer = indexer or MemoryIndexer(memory_root / "index")
+
+    documents = indexer.all_documents() if (memory_root / "index").exists() else []
+    texts = [data["text"] for _, data, _ in documents]
+
+    batches = [
+        np.asarray(indexer.embeddings.batchtransform(texts[i:i + EXPORT_BATCH_SIZE], category="data"), dtype=np.float16)
+        for i in range(0, len(texts), EXPORT_BATCH_SIZE)
+    ]
+    vectors = np.concatenate(batches) if batches else np.zeros((0, 0), dtype=np.float16)
+
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "version": BUNDLE_VERSION,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "model": config.EMBEDDING_MODEL,
+        "fingerprint": model_fingerprint(),
+        "count": len(documents),
+        "dimensions": int(vectors.shape[1]) if len(vectors) else 0,
+    }
+
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "wb") as f:
+        np.savez(
+            f,
+            manifest=_json_array(manifest),
+            entries=_json_array([[uid, data] for uid, data, _ in documents]),
+            vectors=vectors,
+            files=_json_array(_memory_files(memory_root)),
+        )
+    return manifest
+
+
+def read_bundle(path: Path) -> Dict[str, Any]:
+    try:
+        with np.load(path, allow_pickle=False) as bundle:
+            manifest = _from_json_array(bundle["manifest"])
+            if manifest.get("format") != BUNDLE_FORMAT:
+                raise BundleError(f"{path} is not an nlcmd memory bundle")
+            if manifest.get("version", 0) > BUNDLE_VERSION:
+                raise BundleError(f"Unsupported bundle version {manifest['version']} (max {BUNDLE_VERSION})")
+            return {
+                "manifest": manifest,
+                "entries": _from_json_array(bundle["entries"]),
+                "vectors": bundle["vectors"],
+                "files": _from_json_array(bundle["files"]),
+            }
+    except BundleError:
+        raise
+    except Exception as e:
+        raise BundleError(f"Cannot read bundle {path}: {e}") from e
+
+
+def import_bundle(workspace: str, path: Path, force: bool = False, indexer: Optional[MemoryIndexer] = None) -> Dict[str, Any]:
+    """
+    Restore a memory bundle into the workspace. Vectors are reused as-is when the bundle was built with the
+    same embedding model, otherwise entries are re-embedded. Replaces the memory index.
+    Local files that differ from the bundle are kept (unless `force`) and indexed from their local content
+    instead of the bundle's entries.
+    Returns a summary with written/skipped files and whether embedding was skipped.
+    """
+    bundle = read_bundle(path)
+    memory_root = Path(workspace).resolve() / "memory"
+    index_path = memory_root / "index"
+
+    if index_path.exists() and not force:
+        raise BundleError(f"Memory index already exists at {index_path}. Use --force to replace it.")
+
+    written: List[str] = []
+    skipped: List[str] = []
+    for relpath, content in bundle["files"].items():
+        memory_type, _, name = relpath.partition("/")
+        if memory_type not in MEMORY_TYPES or not name or Path(name).name != name:
+            raise BundleError(f"Invalid memory file path in bundle: {relpath}")
+        file_path = memory_root / memory_type / name
+        if file_path.exists() and file_path.read_text(encoding="utf-8") != content and not force:
+            skipped.append(relpath)
+            continue
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_text(content, encoding="utf-8")
+        written.append(relpath)
+
+    indexer = indexer or MemoryIndexer(index_path)
+    kept_files = {tuple(relpath.split("/", 1)) for relpath in skipped}
+    kept = [i for i, (_, data) in enumerate(bundle["entries"]) if (data.get("type"), data.get("filename")) not in kept_files]
+    documents = [(bundle["entries"][i][0], bundle["entries"][i][1], None) for i in kept]
+    reused = bundle["manifest"].get("fingerprint") == model_fingerprint()
+    if documents:
+        if reused:
+            indexer.index_vectors(documents, bundle["vectors"][kept])
+        else:
+            indexer.index_documents(documents)
+    for memory_type, name in sorted(kept_files):
+        content = (memory_root / memory_type / name).read_text(encoding="utf-8")
+        indexer.replace_file(name, memory_type, entry_documents(name, content, memory_type))
+
+    # Mark imported files as indexed so run_reindexing does not embed them again
+    important_dir = memory_root / "important"
+    if important_dir.exists():
+        snapshot = FileSnapshot(memory_root / SNAPSHOT_FILE)
+        previous = snapshot.load()
+        current, _, _ = scan_changes(important_dir, {})
+        imported = {str(important_dir / relpath.partition("/")[2]) for relpath in written + skipped if relpath.startswith("important/")}
+        previous.update({p: state for p, state in current.items() if p in imported})
+        snapshot.save(previous)
+
+    return {
+        "manifest": bundle["manifest"],
+        "entries": len(documents),
+        "written": written,
+        "skipped": skipped,
+        "reused_vectors": reused,
+    }
@@ -0,0 +1,40 @@
+from pathlib import Path
+
+import typer
+from rich.panel import Panel
+
+from nlcmd import config
+from nlcmd.ui import console
+from nlcmd.memory.bundle import BundleError, export_bundle, import_bundle
+
+memory_app = typer.Typer(help="Manage semantic memory")
+
+
+@memory_app.command("export")
+def memory_export(
+    output: Path = typer.Argument(..., help="Bundle file to write (e.g. memory.npz)"),
+):
+    with console.status("Exporting memory..."):
+        manifest = export_bundle(str(config.WORKSPACE), output)
+    console.print(
+        f"[green]Exported {manifest['count']} entries ({manifest['dimensions']} dims, model {manifest['model']}) "
+        f"to {output}[/green]"
+    )
+
+
+@memory_app.command("import")
+def memory_import(
+    bundle: Path = typer.Argument(..., help="Bundle file created by 'nlcmd memory export'"),
+    force: bool = typer.Option(False, "--force", "-f", help="Replace an existing index and overwrite differing memory files"),
+):
+    try:
+        with console.status("Importing memory..."):
+            summary = import_bundle(str(config.WORKSPACE), bundle, force=force)
+    except BundleError as e:
+        console.print(Panel(f"[bold red]{e}[/bold red]", title="Import Error", border_style="red"))
+        raise typer.Exit(1)
+
+    mode = "reused bundled vectors" if summary["reused_vectors"] else "re-embedded (model differs)"
+    console.print(f"[green]Imported {summary['entries']} entries, {len(summary['written'])} file(s); {mode}.[/green]")
+    for relpath in summary["skipped"]:
+        console.print(f"[yellow]Kept local {relpath} (differs from the bundle, indexed as is; use --force to overwrite)[/yellow]")
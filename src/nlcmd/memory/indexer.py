@@ -1,10 +1,15 @@
 import asyncio
 import hashlib
+import json
+import threading
 import time
 import warnings
-from typing import List, Dict, Any, Tuple
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Tuple
 from pathlib import Path
 
+import numpy as np
+
 import os
 os.environ["HF_HUB_DISABLE_SYMLINKS_WARNING"] = "1"
 warnings.filterwarnings("ignore", message=".*embeddings.position_ids.*")
@@ -14,86 +19,206 @@ try:
 except ImportError:
     Embeddings = None
 
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
 from nlcmd import config
+from nlcmd.memory.ranking import rerank
+from nlcmd.tracing import span
+
+INDEX_BACKENDS = ("memory", "mmap")
+
+# Number of ANN candidates fetched per requested result before re-ranking
+RECALL_CANDIDATE_FACTOR = 3
+
+# Faiss storage for the mmap backend. SQ8/SQfp16 keep vectors at 1/4 or 1/2 of float32 size.
+MMAP_PRECISIONS = {
+    "int8": {"quantize": 8},
+    "float16": {"components": "IDMap,SQfp16"},
+}
+
+
+def ensure_model() -> str:
+    """Local path of EMBEDDING_MODEL, downloaded to MODELS_DIR on first use (or the hub name if that fails)."""
+    model_name = config.EMBEDDING_MODEL
+    model_folder_name = model_name.split("/")[-1]
+    local_model_path = config.MODELS_DIR / model_folder_name
+
+    if not local_model_path.exists():
+        print(f"Downloading model {model_name} to {local_model_path}...")
+        config.MODELS_DIR.mkdir(parents=True, exist_ok=True)
+
+        original_offline = os.environ.get("HF_HUB_OFFLINE")
+        os.environ.pop("HF_HUB_OFFLINE", None)
+
+        try:
+            from huggingface_hub import snapshot_download
+            snapshot_download(
+                repo_id=model_name,
+                local_dir=local_model_path,
+                local_dir_use_symlinks=False
+            )
+            print(f"Model downloaded successfully to {local_model_path}")
+        except ImportError:
+            print("huggingface_hub not installed. Using remote model path.")
+            return model_name
+        except Exception as e:
+            print(f"Failed to download model: {e}. Using remote model path.")
+            return model_name
+        finally:
+            if original_offline:
+                os.environ["HF_HUB_OFFLINE"] = original_offline
+
+    return str(local_model_path)
+
+
+@contextmanager
+def _exclusive(lock_path: Path):
+    """Hold an exclusive advisory lock on `lock_path` (no-op where flock is unavailable)."""
+    if fcntl is None:
+        yield
+        return
+    with open(lock_path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
 
 
 class MemoryIndexer:
-    def __init__(self, index_path: Path):
+    def __init__(self, index_path: Path, backend: str = None):
         self.index_path = Path(index_path)
+        self.backend = (backend or config.MEMORY_INDEX_BACKEND).lower()
+        if self.backend not in INDEX_BACKENDS:
+            raise ValueError(f"Unsupported memory index backend: {self.backend}")
         self._embeddings = None
-        self._index_lock = asyncio.Lock()
+        self._mmapped = False
+        # Concurrent recall_memory calls search from worker threads; load the model only once
+        self._load_lock = threading.Lock()
+        # Writes from the agent, the watcher and cron jobs go through one lock per process
+        # (plus a file lock across processes), each starting from what is saved on disk
+        self._write_lock = threading.Lock()
+        self._saved_version = None
 
     def _ensure_model(self) -> str:
-        model_name = config.EMBEDDING_MODEL
-        model_folder_name = model_name.split("/")[-1]
-        local_model_path = config.MODELS_DIR / model_folder_name
+        return ensure_model()
 
-        if not local_model_path.exists():
-            print(f"Downloading model {model_name} to {local_model_path}...")
-            config.MODELS_DIR.mkdir(parents=True, exist_ok=True)
-            
-            original_offline = os.environ.get("HF_HUB_OFFLINE")
-            os.environ.pop("HF_HUB_OFFLINE", None)
-            
-            try:
-                from huggingface_hub import snapshot_download
-                snapshot_download(
-                    repo_id=model_name,
-                    local_dir=local_model_path,
-                    local_dir_use_symlinks=False
-                )
-                print(f"Model downloaded successfully to {local_model_path}")
-            except ImportError:
-                print("huggingface_hub not installed. Using remote model path.")
-                return model_name
-            except Exception as e:
-                print(f"Failed to download model: {e}. Using remote model path.")
-                return model_name
-            finally:
-                if original_offline:
-                    os.environ["HF_HUB_OFFLINE"] = original_offline
-        
-        return str(local_model_path)
+    def _backend_config(self, mmap: bool = True) -> Dict[str, Any]:
+        """
+        Returns the txtai ANN settings for the selected backend.
+        The mmap backend stores quantized vectors in a faiss file that is memory-mapped on load,
+        so concurrent nlcmd processes share the OS page cache instead of each holding a copy.
+        """
+        if self.backend != "mmap":
+            return {}
+        faiss_params = dict(MMAP_PRECISIONS.get(config.MEMORY_INDEX_PRECISION, MMAP_PRECISIONS["int8"]))
+        faiss_params["mmap"] = mmap
+        return {"backend": "faiss", "faiss": faiss_params}
+
+    def _load(self, embeddings, mmap: bool = True):
+        overrides = self._backend_config(mmap)
+        if overrides:
+            embeddings.load(str(self.index_path), config=overrides)
+        else:
+            embeddings.load(str(self.index_path))
+        self._mmapped = bool(overrides) and mmap
+        self._saved_version = self._disk_version()
+
+    def _disk_version(self) -> Optional[Tuple]:
+        """Names, mtimes and sizes of the saved index files; changes whenever any process saves the index."""
+        try:
+            files = sorted(self.index_path.iterdir()) if self.index_path.is_dir() else [self.index_path]
+            return tuple((f.name, f.stat().st_mtime_ns, f.stat().st_size) for f in files)
+        except OSError:
+            return None
+
+    def _save(self, embeddings):
+        embeddings.save(str(self.index_path))
+        self._saved_version = self._disk_version()
+
+    def _write(self, write, max_retries: int = 1):
+        if not self.index_path.parent.exists():
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._write_lock, _exclusive(self.index_path.with_name(self.index_path.name + ".lock")):
+            self._with_retries(write, max_retries)
 
     @property
     def embeddings(self):
         if self._embeddings is None:
-            if Embeddings is None:
-                raise ImportError("txtai is not installed. Please run 'uv sync' to install dependencies.")
-            
-            model_path = self._ensure_model()
-            
-            os.environ["HF_HUB_OFFLINE"] = "1"
-            
-            config_params = {
-                "path": model_path,
-                "content": True,
-                "hybrid": True,
-                "sqlite": {"wal": True}
-            }
-            
-            import logging
-            logging.getLogger("transformers").setLevel(logging.ERROR)
-            
-            self._embeddings = Embeddings(config_params)
-            
-            if self.index_path.exists():
-                self._embeddings.load(str(self.index_path))
-                
+            with self._load_lock:
+                if self._embeddings is None:
+                    self._embeddings = self._create_embeddings()
         return self._embeddings
 
+    def _create_embeddings(self):
+        embeddings = self._new_embeddings()
+        if self.index_path.exists():
+            self._load(embeddings)
+        return embeddings
+
+    def _new_embeddings(self):
+        if Embeddings is None:
+            raise ImportError("txtai is not installed. Please run 'uv sync' to install dependencies.")
+        
+        model_path = self._ensure_model()
+        
+        os.environ["HF_HUB_OFFLINE"] = "1"
+        
+        config_params = {
+            "path": model_path,
+            "content": True,
+            "hybrid": True,
+            "sqlite": {"wal": True},
+            **self._backend_config(mmap=False)
+        }
+        
+        import logging
+        logging.getLogger("transformers").setLevel(logging.ERROR)
+        
+        return Embeddings(config_params)
+
+    def _reload(self, mmap: bool = True):
+        """
+        Load the saved index into a new instance and swap it in. Searches running in other threads
+        keep the instance they started with instead of seeing it half-loaded.
+        """
+        embeddings = self._new_embeddings()
+        self._load(embeddings, mmap)
+        self._embeddings = embeddings
+        return embeddings
+
+    def _writable_embeddings(self):
+        # A memory-mapped faiss index is read-only, and another process may have saved entries since it was
+        # loaded; reload it into RAM so the save that follows keeps them
+        embeddings = self.embeddings
+        if self._mmapped or (self.index_path.exists() and self._disk_version() != self._saved_version):
+            return self._reload(mmap=False)
+        return embeddings
+
     def index_memory(self, content: str, metadata: Dict[str, Any], max_retries: int = 5):
         uid = hashlib.md5(f"{content}{metadata.get('timestamp', '')}".encode()).hexdigest()
         data = {"text": content, **metadata}
         document = (uid, data, None)
         
-        if not self.index_path.parent.exists():
-            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        def write():
+            embeddings = self._writable_embeddings()
+            embeddings.upsert([document])
+            self._save(embeddings)
         
+        self._write(write, max_retries)
+
+    def _with_retries(self, write, max_retries: int):
         for attempt in range(max_retries):
             try:
-                self.embeddings.upsert([document])
-                self.embeddings.save(str(self.index_path))
+                write()
                 return
             except Exception as e:
                 if "database is locked" in str(e).lower() and attempt < max_retries - 1:
@@ -101,19 +226,109 @@ class MemoryIndexer:
                 else:
                     raise
 
+    def replace_file(self, filename: str, memory_type: str, documents: List[Tuple[str, Dict[str, Any], Any]], max_retries: int = 5):
+        """
+        Replace every indexed entry of one memory file with `documents`.
+        An empty list removes the file from the index. Other files are left untouched.
+        """
+        def write():
+            embeddings = self._writable_embeddings()
+            count = embeddings.count()
+            if count:
+                safe_name = filename.replace("'", "''")
+                safe_type = memory_type.replace("'", "''")
+                stale = embeddings.search(
+                    f"SELECT id FROM txtai WHERE [filename] = '{safe_name}' AND [type] = '{safe_type}' LIMIT {count}"
+                )
+                if stale:
+                    embeddings.delete([r["id"] for r in stale])
+            if documents:
+                embeddings.upsert(documents)
+            if count or documents:
+                self._save(embeddings)
+        
+        self._write(write, max_retries)
+
     def index_documents(self, documents: List[Tuple[str, str, Dict[str, Any]]]):
-        if not self.index_path.parent.exists():
-            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        def write():
+            embeddings = self._writable_embeddings()
+            embeddings.index(documents)
+            self._save(embeddings)
         
-        self.embeddings.index(documents)
-        self.embeddings.save(str(self.index_path))
+        self._write(write)
 
-    def search(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
-        import json
+    def index_vectors(self, documents: List[Tuple[str, Dict[str, Any], Any]], vectors: np.ndarray):
+        """
+        Build the index from precomputed vectors, one row per document in order, without running the
+        embedding model. Only valid for vectors produced by the same model (see bundle.model_fingerprint).
+        """
+        if len(documents) != len(vectors):
+            raise ValueError(f"Got {len(vectors)} vectors for {len(documents)} documents")
+        
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1.0, norms)
+        position = 0
+        
+        # txtai vectorizes streamed documents batch by batch in order, so hand out rows sequentially
+        def vectorize(data, category=None):
+            nonlocal position
+            batch = vectors[position:position + len(data)]
+            position += len(data)
+            return batch
+        
+        def write():
+            embeddings = self._writable_embeddings()
+            model = embeddings.model
+            model.vectorize = vectorize
+            try:
+                embeddings.index(documents)
+            finally:
+                del model.vectorize
+            
+            if position != len(vectors):
+                raise ValueError(f"Index consumed {position} of {len(vectors)} vectors")
+            self._save(embeddings)
         
+        self._write(write)
+
+    def all_documents(self) -> List[Tuple[str, Dict[str, Any], Any]]:
+        """Return every indexed entry as an (id, data, None) document."""
+        embeddings = self.embeddings
+        count = embeddings.count()
+        if not count:
+            return []
+        
+        documents = []
+        for r in embeddings.search(f"SELECT id, text, data FROM txtai LIMIT {count}"):
+            data = {}
+            if r.get("data"):
+                try:
+                    data = json.loads(r["data"])
+                except Exception:
+                    pass
+            data["text"] = r["text"]
+            documents.append((r["id"], data, None))
+        return documents
+
+    def _refresh(self):
+        """Reload the index if another process saved it since this one loaded or saved it."""
+        embeddings = self.embeddings
+        if self.index_path.exists() and self._disk_version() != self._saved_version:
+            with self._write_lock:
+                if self._disk_version() != self._saved_version:
+                    self._reload()
+                embeddings = self._embeddings
+        return embeddings
+
+    def search(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        return self._search(self._refresh(), query, limit)
+
+    @staticmethod
+    def _search(embeddings, query: str, limit: int) -> List[Dict[str, Any]]:
         safe_query = query.replace("'", "''")
         sql = f"SELECT id, text, score, data FROM txtai WHERE similar('{safe_query}') LIMIT {limit}"
-        results = self.embeddings.search(sql)
+        results = embeddings.search(sql)
         
         parsed_results = []
         for r in results:
@@ -136,13 +351,83 @@ class MemoryIndexer:
             
         return parsed_results
     
+    @staticmethod
+    def _stored_vectors(embeddings, uids: List[str]) -> Optional[np.ndarray]:
+        """
+        The vectors stored in the faiss index for `uids`, in order, so near-duplicates can be found without
+        running the model again. None if the index cannot hand them back (e.g. an IVF index without a direct map).
+        """
+        if faiss is None:
+            return None
+        try:
+            indexids = {uid: indexid for indexid, uid in embeddings.database.ids(list(dict.fromkeys(uids)))}
+            rows = np.array([indexids[uid] for uid in uids], dtype=np.int64)
+            index = embeddings.ann.backend
+            if hasattr(index, "id_map"):
+                # IDMap keeps txtai's ids next to the storage index; look up their positions (kept in id order)
+                stored = faiss.vector_to_array(index.id_map)
+                positions = np.searchsorted(stored, rows)
+                if np.any(positions >= len(stored)) or np.any(stored[np.minimum(positions, len(stored) - 1)] != rows):
+                    return None
+                index, rows = faiss.downcast_index(index.index), positions
+            return np.asarray(index.reconstruct_batch(rows), dtype=np.float32)
+        except Exception:
+            return None
+    
+    def recall(self, query: str, limit: int = 5, category_boosts: Dict[str, float] = None) -> List[Dict[str, Any]]:
+        """Search with over-fetching, then re-rank candidates by recency and type/category and drop duplicates."""
+        # One instance for both steps: a reload in between would renumber the stored vectors
+        embeddings = self._refresh()
+        candidates = self._search(embeddings, query, limit * RECALL_CANDIDATE_FACTOR)
+        if not candidates:
+            return []
+        
+        vectors = self._stored_vectors(embeddings, [c["id"] for c in candidates])
+        if vectors is None:
+            try:
+                vectors = embeddings.batchtransform([c["text"] for c in candidates])
+            except Exception:
+                vectors = None
+        
+        return rerank(
+            candidates,
+            limit,
+            vectors=vectors,
+            half_life_days=config.MEMORY_RECALL_HALF_LIFE_DAYS,
+            category_boosts=category_boosts,
+        )
+
     async def search_async(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
-        return await asyncio.to_thread(self.search, query, limit)
+        with span("memory search", limit=limit):
+            return await asyncio.to_thread(self.search, query, limit)
+    
+    async def recall_async(self, query: str, limit: int = 5, category_boosts: Dict[str, float] = None) -> List[Dict[str, Any]]:
+        with span("memory recall", limit=limit):
+            return await asyncio.to_thread(self.recall, query, limit, category_boosts)
     
     async def index_memory_async(self, content: str, metadata: Dict[str, Any], max_retries: int = 3):
-        async with self._index_lock:
+        with span("memory index"):
             await asyncio.to_thread(self.index_memory, content, metadata, max_retries)
     
     async def index_documents_async(self, documents: List[Tuple[str, str, Dict[str, Any]]]):
-        async with self._index_lock:
-            await asyncio.to_thread(self.index_documents, documents)
+        await asyncio.to_thread(self.index_documents, documents)
+    
+    async def replace_file_async(self, filename: str, memory_type: str, documents: List[Tuple[str, Dict[str, Any], Any]]):
+        await asyncio.to_thread(self.replace_file, filename, memory_type, documents)
+
+
+_indexers: Dict[str, MemoryIndexer] = {}
+_indexers_lock = threading.Lock()
+
+
+def get_indexer(index_path: Path) -> MemoryIndexer:
+    """
+    The indexer of a memory index, shared by everything in the process that reads or writes it
+    (agent turns, the memory watcher, cron jobs), so the embedding model and index are loaded once.
+    """
+    key = str(Path(index_path).resolve())
+    with _indexers_lock:
+        indexer = _indexers.get(key)
+        if indexer is None:
+            indexer = _indexers[key] = MemoryIndexer(Path(index_path))
+        return indexer
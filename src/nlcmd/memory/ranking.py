@@ -0,0 +1,106 @@
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+DEFAULT_TYPE_BOOSTS = {
+    "important": 1.2,
+    "temp": 1.0,
+}
+
+# Share of the similarity score an entry keeps no matter how old it is
+RECENCY_FLOOR = 0.5
+
+
+def _age_days(results: List[Dict[str, Any]], now: datetime) -> np.ndarray:
+    ages = np.full(len(results), np.nan)
+    for i, res in enumerate(results):
+        try:
+            ts = datetime.strptime(str(res.get("timestamp", "")), TIMESTAMP_FORMAT)
+        except ValueError:
+            continue
+        ages[i] = max((now - ts).total_seconds() / 86400.0, 0.0)
+    return ages
+
+
+def _normalize_text(text: str) -> str:
+    lines = text.strip().splitlines()
+    if lines and lines[0].startswith("### ["):
+        lines = lines[1:]
+    return " ".join(" ".join(lines).split()).lower()
+
+
+def _dedup(order: np.ndarray, results: List[Dict[str, Any]], vectors: Optional[np.ndarray], threshold: float) -> List[int]:
+    if vectors is not None and len(vectors) == len(results):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1.0, norms)
+        similarity = vectors @ vectors.T
+    else:
+        similarity = None
+
+    kept: List[int] = []
+    seen_ids = set()
+    seen_texts = set()
+    for idx in order:
+        uid = results[idx].get("id")
+        text = _normalize_text(results[idx].get("text", ""))
+        if text in seen_texts or (uid is not None and uid in seen_ids):
+            continue
+        if similarity is not None and kept and similarity[idx, kept].max() >= threshold:
+            continue
+        seen_ids.add(uid)
+        seen_texts.add(text)
+        kept.append(int(idx))
+    return kept
+
+
+def rerank(
+    results: List[Dict[str, Any]],
+    limit: int,
+    vectors: Optional[np.ndarray] = None,
+    now: Optional[datetime] = None,
+    half_life_days: float = 30.0,
+    type_boosts: Optional[Dict[str, float]] = None,
+    category_boosts: Optional[Dict[str, float]] = None,
+    dedup_threshold: float = 0.95,
+) -> List[Dict[str, Any]]:
+    """
+    Re-rank ANN candidates by similarity, recency and type/category boosts, dropping near-duplicates.
+
+    Entries decay towards RECENCY_FLOOR of their similarity with the given half-life; entries
+    without a parseable timestamp, or any entry if `half_life_days` is not positive, are not decayed.
+    Entries with the same uid or normalized text are deduplicated; `vectors` are optional candidate
+    embeddings in the same order as `results` that also drop near-duplicates.
+    """
+    if not results:
+        return []
+
+    now = now or datetime.now()
+    type_boosts = DEFAULT_TYPE_BOOSTS if type_boosts is None else type_boosts
+    category_boosts = category_boosts or {}
+
+    similarity = np.array([float(res.get("score") or 0.0) for res in results])
+    if half_life_days > 0:
+        ages = _age_days(results, now)
+        decay = np.where(np.isnan(ages), 1.0, RECENCY_FLOOR + (1.0 - RECENCY_FLOOR) * np.power(0.5, np.nan_to_num(ages) / half_life_days))
+    else:
+        decay = np.ones(len(results))
+    boosts = np.array([
+        type_boosts.get(res.get("type"), 1.0) * category_boosts.get(res.get("category"), 1.0)
+        for res in results
+    ])
+    final = similarity * boosts * decay
+
+    order = np.argsort(-final, kind="stable")
+    kept = _dedup(order, results, vectors, dedup_threshold)[:limit]
+
+    ranked = []
+    for idx in kept:
+        item = dict(results[idx])
+        item["similarity"] = float(similarity[idx])
+        item["score"] = float(final[idx])
+        ranked.append(item)
+    return ranked
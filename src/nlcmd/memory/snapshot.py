@@ -0,0 +1,90 @@
+import hashlib
+import os
+import sqlite3
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+SNAPSHOT_FILE = "snapshot.db"
+
+
+class FileState(NamedTuple):
+    inode: int
+    mtime_ns: int
+    size: int
+    hash: Optional[str]
+
+
+def hash_file(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+class FileSnapshot:
+    """
+    Change-detection state for memory files, kept in a small sqlite database.
+    A file is considered unchanged while its (inode, st_mtime_ns, size) key matches;
+    only files whose key moved are hashed.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+
+    def _connect(self) -> sqlite3.Connection:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "path TEXT PRIMARY KEY, inode INTEGER, mtime_ns INTEGER, size INTEGER, hash TEXT)"
+        )
+        return conn
+
+    def load(self) -> Dict[str, FileState]:
+        if not self.db_path.exists():
+            return {}
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT path, inode, mtime_ns, size, hash FROM files").fetchall()
+        finally:
+            conn.close()
+        return {row[0]: FileState(*row[1:]) for row in rows}
+
+    def save(self, states: Dict[str, FileState]):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM files")
+                conn.executemany(
+                    "INSERT INTO files (path, inode, mtime_ns, size, hash) VALUES (?, ?, ?, ?, ?)",
+                    [(path, *state) for path, state in states.items()],
+                )
+        finally:
+            conn.close()
+
+
+def scan_changes(directory: Path, previous: Dict[str, FileState], suffix: str = ".md") -> Tuple[Dict[str, FileState], List[str], List[str]]:
+    """
+    Compare the files ending in `suffix` in `directory` against a previous snapshot.
+    Returns (current states, changed paths, removed paths). Blocking; run it in a thread.
+    """
+    current: Dict[str, FileState] = {}
+    changed: List[str] = []
+
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.name.endswith(suffix) or not entry.is_file():
+                continue
+            stat = entry.stat()
+            state = FileState(stat.st_ino, stat.st_mtime_ns, stat.st_size, None)
+            old = previous.get(entry.path)
+
+            if old is not None and old[:3] == state[:3] and old.hash:
+                current[entry.path] = old
+                continue
+
+            state = state._replace(hash=hash_file(entry.path))
+            current[entry.path] = state
+            if old is None or old.hash != state.hash:
+                changed.append(entry.path)
+
+    removed = [path for path in previous if path not in current]
+    return current, sorted(changed), removed
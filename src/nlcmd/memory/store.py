@@ -1,9 +1,37 @@
 from __future__ import annotations
+import re
 from pathlib import Path
 from typing import List, TYPE_CHECKING
 if TYPE_CHECKING:
     from nlcmd.memory.indexer import MemoryIndexer
 
+ENTRY_HEADER_RE = re.compile(r"^### \[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\]")
+
+
+def entry_documents(file_name: str, content: str, memory_type: str) -> List[tuple]:
+    """Split a memory markdown file into index documents, one per `### [date time]` entry."""
+    documents = []
+    category = Path(file_name).stem
+    entries = content.split("\n### [")
+    
+    for i, entry in enumerate(entries[1:]):
+        full_entry = "### [" + entry
+        # important/ and temp/ may hold files of the same name
+        uid = f"{memory_type}/{file_name}#{i}"
+        metadata = {
+            "filename": file_name,
+            "type": memory_type,
+            "category": category
+        }
+        match = ENTRY_HEADER_RE.match(full_entry)
+        if match:
+            metadata["timestamp"] = match.group(1)
+        data = {"text": full_entry, **metadata}
+        documents.append((uid, data, None))
+    
+    return documents
+
+
 class MemoryStore:
     def __init__(self, workspace: str):
         self.workspace = Path(workspace).resolve()
@@ -57,20 +85,7 @@ class MemoryStore:
             for file_path in type_dir.glob("*.md"):
                 try:
                     content = file_path.read_text(encoding="utf-8")
-                    entries = content.split("\n### [")
-                    category = file_path.stem
-                    
-                    for i, entry in enumerate(entries[1:]):
-                        full_entry = "### [" + entry
-                        uid = f"{category}_{i}"
-                        metadata = {
-                            "filename": file_path.name,
-                            "type": memory_type,
-                            "category": category
-                        }
-                        data = {"text": full_entry, **metadata}
-                        documents.append((uid, data, None))
-                        
+                    documents.extend(entry_documents(file_path.name, content, memory_type))
                 except Exception as e:
                     print(f"Error reading {file_path}: {e}")
         
@@ -0,0 +1,134 @@
+import threading
+from pathlib import Path
+from typing import List, Optional, Set
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+from nlcmd.ui import console
+from nlcmd.memory.indexer import MemoryIndexer, get_indexer
+from nlcmd.memory.store import entry_documents
+
+MEMORY_TYPES = ("important", "temp")
+
+# Only content changes; opened/closed_no_write events come from readers, including our own reindexing
+WRITE_EVENTS = {"created", "modified", "moved", "deleted", "closed"}
+
+
+class _MemoryEventHandler(FileSystemEventHandler):
+    def __init__(self, watcher: "MemoryWatcher"):
+        super().__init__()
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if event.is_directory or event.event_type not in WRITE_EVENTS:
+            return
+        self.watcher.notify(event.src_path)
+        # Editors often save by writing a temp file and renaming it over the original
+        dest_path = getattr(event, "dest_path", "")
+        if dest_path:
+            self.watcher.notify(dest_path)
+
+
+class MemoryWatcher:
+    """
+    Keeps the memory index live by watching `memory/{important,temp}/*.md` (inotify on Linux).
+    Bursts of events are debounced, then only the touched files are reindexed.
+    Reindexing runs on a timer thread; its status lines are queued for the caller to print between prompts
+    (see `take_messages`) so they don't interleave with the prompt or a live panel.
+    """
+
+    def __init__(self, workspace: str, indexer: Optional[MemoryIndexer] = None, debounce: float = 0.3):
+        self.memory_root = Path(workspace).resolve() / "memory"
+        # The process-wide indexer: a private one would load a second model and save a stale copy of the index
+        self.indexer = indexer or get_indexer(self.memory_root / "index")
+        self.debounce = debounce
+        self._pending: Set[Path] = set()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._observer = None
+        self._messages: List[str] = []
+
+    def _memory_type(self, path: Path) -> Optional[str]:
+        try:
+            parts = path.relative_to(self.memory_root).parts
+        except ValueError:
+            return None
+        if len(parts) != 2 or parts[0] not in MEMORY_TYPES or path.suffix != ".md":
+            return None
+        return parts[0]
+
+    def notify(self, path: str):
+        path = Path(path)
+        if self._memory_type(path) is None:
+            return
+        with self._lock:
+            self._pending.add(path)
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.debounce, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            paths = sorted(self._pending)
+            self._pending.clear()
+            self._timer = None
+        if not paths:
+            return
+        with self._flush_lock:
+            for path in paths:
+                try:
+                    count = self.reindex_file(path)
+                    message = f"[dim]Reindexed {count} entries from {path.name}[/dim]"
+                except Exception as e:
+                    message = f"[red]Error reindexing {path}: {e}[/red]"
+                with self._lock:
+                    self._messages.append(message)
+
+    def take_messages(self) -> List[str]:
+        """Status lines queued by reindexing since the last call."""
+        with self._lock:
+            messages, self._messages = self._messages, []
+        return messages
+
+    def print_messages(self):
+        for message in self.take_messages():
+            console.print(message)
+
+    def reindex_file(self, path: Path) -> int:
+        memory_type = self._memory_type(path)
+        documents = []
+        if path.exists():
+            content = path.read_text(encoding="utf-8")
+            documents = entry_documents(path.name, content, memory_type)
+        self.indexer.replace_file(path.name, memory_type, documents)
+        return len(documents)
+
+    def start(self):
+        if Observer is None:
+            raise ImportError("watchdog is not installed. Please run 'uv sync --extra watch' to enable the memory watcher.")
+        self.memory_root.mkdir(parents=True, exist_ok=True)
+        self._observer = Observer()
+        self._observer.schedule(_MemoryEventHandler(self), str(self.memory_root), recursive=True)
+        self._observer.daemon = True
+        self._observer.start()
+        console.print(f"[dim]Watching memory directory: {self.memory_root}[/dim]")
+
+    def stop(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        self.flush()
+        self.print_messages()
@@ -0,0 +1,238 @@
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, Field
+from rich.live import Live
+from rich.panel import Panel
+from rich.table import Table
+from rich.text import Text
+
+from nlcmd import config
+from nlcmd.tracing import span
+from nlcmd.ui import console, prompts
+from nlcmd.utils import (
+    RlimitExecutor,
+    _ensure_workspace_dir,
+    get_executor,
+    prepare_shell_command,
+    resolve_timeout,
+    run_command,
+)
+
+# Characters of each step's stdout/stderr returned to the model; longer output is spilled to a file
+STEP_OUTPUT_CHARS = 2000
+
+STATUS_STYLES = {
+    "pending": "dim",
+    "running": "cyan",
+    "ok": "green",
+    "failed": "red",
+    "timed out": "red",
+    "skipped": "yellow",
+}
+
+
+class PlanStep(BaseModel):
+    id: str = Field(description="Short unique step name, e.g. 'compress-logs-1'")
+    command: str = Field(description="Shell command for this step")
+    depends_on: List[str] = Field(default_factory=list, description="Ids of steps that must succeed before this one starts")
+
+
+class StepOutput:
+    """
+    Prints a step's output line by line as it arrives, prefixed with the step id, through the console
+    (above the live status table; to the client when serving a session). Parallel steps interleave by line.
+    """
+
+    def __init__(self, step_id: str):
+        self.step_id = step_id
+        self._partial = {"stdout": "", "stderr": ""}
+
+    def _print(self, name: str, line: str):
+        style = "red" if name == "stderr" else "dim"
+        console.print(Text.assemble((f"{self.step_id} | ", style), line), highlight=False)
+
+    def write(self, name: str, text: str):
+        *lines, self._partial[name] = (self._partial[name] + text).split("\n")
+        for line in lines:
+            self._print(name, line)
+
+    def flush(self):
+        for name, rest in self._partial.items():
+            if rest:
+                self._print(name, rest)
+            self._partial[name] = ""
+
+
+class StepState:
+    def __init__(self, step: PlanStep):
+        self.step = step
+        self.status = "pending"
+        self.detail = ""
+        self.started: Optional[float] = None
+        self.elapsed: Optional[float] = None
+        self.result = None
+        self.done = asyncio.Event()
+
+
+def validate_plan(steps: List[PlanStep]):
+    """Raises ValueError for duplicate ids, unknown dependencies or cycles."""
+    ids = [step.id for step in steps]
+    duplicates = sorted({i for i in ids if ids.count(i) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate step ids: {', '.join(duplicates)}")
+    known = set(ids)
+    for step in steps:
+        unknown = [dep for dep in step.depends_on if dep not in known]
+        if unknown:
+            raise ValueError(f"Step '{step.id}' depends on unknown steps: {', '.join(unknown)}")
+
+    # Kahn's algorithm: whatever cannot be ordered is on a cycle
+    remaining = {step.id: set(step.depends_on) for step in steps}
+    while True:
+        ready = [sid for sid, deps in remaining.items() if not deps]
+        if not ready:
+            break
+        for sid in ready:
+            del remaining[sid]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    if remaining:
+        raise ValueError(f"Dependency cycle between steps: {', '.join(sorted(remaining))}")
+
+
+def _clip(text: str, limit: int = STEP_OUTPUT_CHARS) -> str:
+    if len(text) <= limit:
+        return text
+    return text[:limit] + f"... [{len(text) - limit} more characters]"
+
+
+def _status_table(states: List[StepState]) -> Table:
+    table = Table(title="Plan", expand=False)
+    table.add_column("Step")
+    table.add_column("Status")
+    table.add_column("Time", justify="right")
+    table.add_column("Command", overflow="fold")
+    now = time.monotonic()
+    for state in states:
+        elapsed = state.elapsed if state.elapsed is not None else (now - state.started if state.started else None)
+        style = STATUS_STYLES[state.status]
+        status = f"[{style}]{state.status}[/{style}]" + (f" [dim]{state.detail}[/dim]" if state.detail else "")
+        table.add_row(state.step.id, status, f"{elapsed:.1f}s" if elapsed is not None else "", state.step.command)
+    return table
+
+
+def _summary(states: List[StepState]) -> str:
+    counts: Dict[str, int] = {}
+    for state in states:
+        counts[state.status] = counts.get(state.status, 0) + 1
+    lines = ["Plan finished: " + ", ".join(f"{n} {status}" for status, n in counts.items())]
+    for state in states:
+        header = f"[{state.step.id}] {state.status}"
+        if state.detail:
+            header += f" ({state.detail})"
+        lines.append(header)
+        if state.result is not None:
+            lines.append(state.result.render(STEP_OUTPUT_CHARS))
+    return "\n".join(lines)
+
+
+async def execute_plan_async(steps: List[PlanStep], cwd: str = None, max_parallel: int = None, timeout: float = None) -> str:
+    """
+    Run a validated plan: each step starts once all of its dependencies succeeded, at most `max_parallel`
+    at a time. Steps whose dependencies failed are skipped; independent branches keep running.
+    """
+    work_dir = _ensure_workspace_dir(cwd)
+    timeout = resolve_timeout(timeout)
+    max_parallel = max(1, max_parallel or config.PLAN_MAX_PARALLEL)
+    executor = get_executor(work_dir)
+    if executor.name == "session":
+        # One shell session runs one command at a time; plan steps get their own processes with the same limits
+        executor = RlimitExecutor(executor.sandbox)
+
+    states = {step.id: StepState(step) for step in steps}
+    ordered_states = list(states.values())
+    slots = asyncio.Semaphore(max_parallel)
+
+    async def run_step(state: StepState):
+        try:
+            for dep in state.step.depends_on:
+                await states[dep].done.wait()
+            failed = [dep for dep in state.step.depends_on if states[dep].status != "ok"]
+            if failed:
+                state.status, state.detail = "skipped", f"dependency {', '.join(failed)} did not succeed"
+                return
+
+            async with slots:
+                state.status, state.started = "running", time.monotonic()
+                _, exec_cmd, cleanup = prepare_shell_command(state.step.command)
+                output = StepOutput(state.step.id)
+                try:
+                    result = await run_command(
+                        exec_cmd, work_dir, timeout, cleanup_path=cleanup, executor=executor,
+                        output_chars=STEP_OUTPUT_CHARS, on_output=output.write,
+                    )
+                except Exception as e:
+                    state.status, state.detail = "failed", str(e)
+                    return
+                finally:
+                    output.flush()
+                    state.elapsed = time.monotonic() - state.started
+
+            state.result = result
+            if result.status == "timed_out":
+                state.status, state.detail = "timed out", f"after {timeout:g}s"
+            elif result.status == "failed":
+                state.status, state.detail = "failed", f"exit code {result.exit_code}"
+            else:
+                state.status = "ok"
+        finally:
+            state.done.set()
+
+    with Live(get_renderable=lambda: _status_table(ordered_states), console=console, refresh_per_second=8, transient=True):
+        try:
+            await asyncio.gather(*(run_step(state) for state in ordered_states))
+        except asyncio.CancelledError:
+            console.print("[yellow]Plan cancelled.[/yellow]")
+            raise
+    console.print(_status_table(ordered_states))
+    return _summary(ordered_states)
+
+
+async def run_plan_with_confirmation_async(steps: List[PlanStep], dry_run: bool = False, cwd: str = None, max_parallel: int = None, timeout: float = None) -> str:
+    """
+    Show a plan, ask the user to confirm it once, then execute it.
+    Raises:
+        WorkspaceError: If workspace directory cannot be created or accessed
+    """
+    work_dir = _ensure_workspace_dir(cwd)
+    if not steps:
+        return "Error: Empty plan"
+    try:
+        validate_plan(steps)
+    except ValueError as e:
+        return f"Error: Invalid plan: {e}"
+
+    async with prompts.turn():
+        table = Table(show_header=True, expand=False)
+        table.add_column("Step")
+        table.add_column("Command", overflow="fold")
+        table.add_column("After")
+        for step in steps:
+            table.add_row(step.id, step.command, ", ".join(step.depends_on))
+        parallel = max(1, max_parallel or config.PLAN_MAX_PARALLEL)
+        console.print(Panel(table, title=f"Generated Plan ({len(steps)} steps, up to {parallel} in parallel)", border_style="blue"))
+        console.print(f"[dim]Working directory: {work_dir}[/dim]")
+
+        if dry_run:
+            console.print("[yellow]Dry run mode enabled. Plan not executed.[/yellow]")
+            return "Dry run: Plan not executed"
+
+        with span("confirmation wait", steps=len(steps)):
+            confirmed = await prompts.confirm("Do you want to execute this plan?")
+
+    if not confirmed:
+        console.print("[yellow]Execution cancelled.[/yellow]")
+        return "Execution cancelled by user"
+    return await execute_plan_async(steps, cwd=work_dir, max_parallel=max_parallel, timeout=timeout)
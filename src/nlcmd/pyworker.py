@@ -0,0 +1,210 @@
+import atexit
+import json
+import os
+import platform
+import queue
+import subprocess
+import sys
+import threading
+from typing import Dict, NamedTuple, Optional, Sequence, Tuple
+
+from nlcmd import config
+from nlcmd.session import KILL_GRACE_PERIOD, STREAM_CHUNK_SIZE, kill_process_tree
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Runs in the worker interpreter: import the preload modules, then block until a snippet arrives.
+# Each worker runs exactly one snippet, so snippets never share interpreter state.
+WORKER_SOURCE = r"""
+import atexit, json, os, sys, traceback
+for _name in sys.argv[1:]:
+    try:
+        __import__(_name)
+    except Exception:
+        pass
+_request = json.loads(sys.stdin.buffer.readline())
+_code = sys.stdin.buffer.read().decode("utf-8")
+sys.stdin = open(os.devnull)
+# Resource limits start with the snippet; the CPU budget excludes the preload imports
+if _request["limits"]:
+    import resource
+    _usage = resource.getrusage(resource.RUSAGE_SELF)
+    for _which, _value in _request["limits"]:
+        if _which == resource.RLIMIT_CPU:
+            _value += int(_usage.ru_utime + _usage.ru_stime) + 1
+        resource.setrlimit(_which, (_value, _value))
+os.chdir(_request["cwd"])
+sys.argv = ["-c", *_request["args"]]
+_rc = 0
+try:
+    exec(compile(_code, "<string>", "exec"), {"__name__": "__main__", "__builtins__": __builtins__})
+except SystemExit as _e:
+    if _e.code is None:
+        _rc = 0
+    elif isinstance(_e.code, int):
+        _rc = _e.code
+    else:
+        print(_e.code, file=sys.stderr)
+        _rc = 1
+except BaseException as _e:
+    traceback.print_exception(type(_e), _e, _e.__traceback__.tb_next)
+    _rc = 1
+atexit._run_exitfuncs()
+sys.stdout.flush()
+sys.stderr.flush()
+# Skip interpreter finalization of the preloaded modules; it costs more than the snippet itself
+os._exit(_rc)
+"""
+
+Limits = Tuple[Tuple[int, int], ...]
+
+
+class WorkerResult(NamedTuple):
+    stdout: bytes
+    stderr: bytes
+    returncode: Optional[int]
+    timed_out: bool = False
+    # Bytes read past the output limit and discarded; the worker is killed once it hits the limit
+    stdout_dropped: int = 0
+    stderr_dropped: int = 0
+
+
+class _Capture:
+    """Reads a worker pipe on its own thread, keeping at most `limit` bytes; calls `on_limit` once past it."""
+
+    def __init__(self, pipe, limit: Optional[int], on_limit):
+        self.chunks = []
+        self.kept = self.dropped = 0
+        self._thread = threading.Thread(target=self._read, args=(pipe, limit, on_limit), daemon=True, name="nlcmd-worker-reader")
+        self._thread.start()
+
+    def _read(self, pipe, limit: Optional[int], on_limit):
+        while chunk := pipe.read1(STREAM_CHUNK_SIZE):
+            room = len(chunk) if limit is None else max(limit - self.kept, 0)
+            if room:
+                self.chunks.append(chunk[:room])
+                self.kept += min(room, len(chunk))
+            if len(chunk) > room:
+                self.dropped += len(chunk) - room
+                on_limit()
+
+    def result(self) -> bytes:
+        # A daemonized grandchild may still hold the pipe open; don't wait on it forever
+        self._thread.join(KILL_GRACE_PERIOD)
+        return b"".join(self.chunks)
+
+
+class PythonWorkerPool:
+    """
+    Keeps `size` Python interpreters started ahead of time with common modules imported, so a
+    `python -c` snippet only pays for sending its source. A worker is used once and replaced right away.
+    `limits` (resource, value) are applied in the worker right before it runs the snippet.
+    """
+
+    def __init__(self, size: int = None, preload: Sequence[str] = None, limits: Limits = ()):
+        self.size = config.PYTHON_WORKERS if size is None else size
+        self.preload = list(config.PYTHON_WORKER_PRELOAD if preload is None else preload)
+        self.limits = limits
+        self._idle: "queue.Queue[subprocess.Popen]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _spawn(self) -> subprocess.Popen:
+        kwargs = {}
+        if platform.system() == "Windows":
+            kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            kwargs["start_new_session"] = True
+        return subprocess.Popen(
+            [sys.executable, "-u", "-c", WORKER_SOURCE, *self.preload],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env={**os.environ, "PYTHONIOENCODING": "utf-8"},
+            **kwargs,
+        )
+
+    def fill(self):
+        with self._lock:
+            while not self._closed and self._idle.qsize() < self.size:
+                self._idle.put(self._spawn())
+
+    def acquire(self) -> subprocess.Popen:
+        """Take a warm worker (or start a cold one if none is ready) and start its replacement."""
+        worker = None
+        while worker is None:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                worker = self._spawn()
+            if worker.poll() is not None:
+                worker = None
+        self.fill()
+        return worker
+
+    def communicate(self, worker: subprocess.Popen, code: str, cwd: str, args: Sequence[str] = (), timeout: float = None,
+                    limit: int = None) -> WorkerResult:
+        """
+        Send a snippet to an acquired worker and wait for it. Blocking; call it from a worker thread.
+        Each stream keeps at most `limit` bytes; a worker that writes more is killed.
+        """
+        limits = self.limits if resource is not None else ()
+        request = {"cwd": cwd, "args": list(args), "limits": [list(item) for item in limits]}
+        payload = json.dumps(request).encode("utf-8") + b"\n" + code.encode("utf-8")
+        stdout = _Capture(worker.stdout, limit, lambda: kill_process_tree(worker))
+        stderr = _Capture(worker.stderr, limit, lambda: kill_process_tree(worker))
+        try:
+            worker.stdin.write(payload)
+            worker.stdin.close()
+        except OSError:
+            # The worker died before reading the snippet; its exit status says why
+            pass
+        timed_out = False
+        try:
+            worker.wait(timeout)
+        except subprocess.TimeoutExpired:
+            timed_out = True
+            kill_process_tree(worker)
+        return WorkerResult(
+            stdout.result(),
+            stderr.result(),
+            None if timed_out else worker.returncode,
+            timed_out,
+            stdout.dropped,
+            stderr.dropped,
+        )
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            while True:
+                try:
+                    worker = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                kill_process_tree(worker)
+
+
+_pools: Dict[Limits, PythonWorkerPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(limits: Limits = ()) -> PythonWorkerPool:
+    """The shared worker pool for a set of resource limits, created and warmed on first use."""
+    with _pools_lock:
+        pool = _pools.get(limits)
+        if pool is None:
+            pool = _pools[limits] = PythonWorkerPool(limits=limits)
+    return pool
+
+
+@atexit.register
+def close_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
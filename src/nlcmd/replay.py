@@ -0,0 +1,144 @@
+import asyncio
+import json
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelMessagesTypeAdapter,
+    ModelRequest,
+    ModelResponse,
+    TextPart,
+    ToolCallPart,
+    UserPromptPart,
+)
+from pydantic_ai.models.function import AgentInfo, DeltaToolCall, FunctionModel
+
+# Relative to the workspace, next to the command journal
+TRANSCRIPT_FILE = Path(".nlcmd") / "transcripts.jsonl"
+# Streamed text is sent in pieces of this many characters
+STREAM_CHUNK_CHARS = 16
+
+
+class ReplayTurn(NamedTuple):
+    prompt: str
+    responses: List[ModelResponse]
+
+
+def _response(entry: Dict[str, Any]) -> ModelResponse:
+    # Scripted form: {"text": "..."} or {"tool_calls": [{"name": "...", "args": {...}}]}, or both
+    parts = [
+        ToolCallPart(tool_name=call["name"], args=call.get("args") or {}, tool_call_id=call.get("id") or f"call_{i}")
+        for i, call in enumerate(entry.get("tool_calls") or [])
+    ]
+    if entry.get("text"):
+        parts.insert(0, TextPart(content=entry["text"]))
+    return ModelResponse(parts=parts, model_name="replay")
+
+
+def parse_turn(entry: Dict[str, Any]) -> ReplayTurn:
+    """A recorded turn ({"prompt", "messages"} as written by record_turn) or a scripted one ({"prompt", "responses"})."""
+    if "messages" in entry:
+        messages = ModelMessagesTypeAdapter.validate_python(entry["messages"])
+        responses = [message for message in messages if isinstance(message, ModelResponse)]
+    else:
+        responses = [_response(response) for response in entry["responses"]]
+    return ReplayTurn(entry["prompt"], responses)
+
+
+def load_transcript(path: Path) -> List[ReplayTurn]:
+    """Turns from a JSON array or a JSON-lines file with one turn per line."""
+    text = Path(path).read_text(encoding="utf-8").strip()
+    if text.startswith("["):
+        entries = json.loads(text)
+    else:
+        entries = [json.loads(line) for line in text.splitlines() if line.strip()]
+    return [parse_turn(entry) for entry in entries]
+
+
+def record_turn(path: Path, prompt: str, messages: List[ModelMessage]):
+    """Append a turn's messages to a transcript that load_transcript can replay."""
+    entry = {
+        "ts": datetime.now().isoformat(timespec="seconds"),
+        "prompt": prompt,
+        "messages": ModelMessagesTypeAdapter.dump_python(messages, mode="json"),
+    }
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    except OSError:
+        pass
+
+
+# Seconds of simulated model latency spent by the current task; set by the load test around each turn
+simulated_wait: ContextVar[Optional[List[float]]] = ContextVar("simulated_wait", default=None)
+
+
+def _position(messages: List[ModelMessage]):
+    """The prompt of the current run and how many model responses it has had so far."""
+    for i in range(len(messages) - 1, -1, -1):
+        message = messages[i]
+        if isinstance(message, ModelRequest):
+            prompts = [part.content for part in message.parts if isinstance(part, UserPromptPart)]
+            if prompts:
+                prompt = prompts[-1] if isinstance(prompts[-1], str) else str(prompts[-1])
+                return prompt, sum(isinstance(m, ModelResponse) for m in messages[i + 1:])
+    return "", 0
+
+
+class ReplayModel(FunctionModel):
+    """
+    Offline stand-in for the chat model: answers each request with the next recorded response of the
+    turn whose prompt matches, after a configurable delay. The agent, its tools and the rest of nlcmd run
+    for real, so their overhead can be measured without an endpoint.
+    """
+
+    def __init__(self, turns: Sequence[ReplayTurn], latency: float = 0.0, chars_per_second: float = 0.0):
+        self.turns = {turn.prompt: turn for turn in turns}
+        self.latency = latency
+        self.chars_per_second = chars_per_second
+        super().__init__(self._respond, stream_function=self._stream, model_name="replay")
+
+    def _next(self, messages: List[ModelMessage]) -> ModelResponse:
+        prompt, index = _position(messages)
+        turn = self.turns.get(prompt)
+        if turn is None:
+            return ModelResponse(parts=[TextPart(content=f"No recorded turn for: {prompt}")], model_name="replay")
+        if index >= len(turn.responses):
+            return ModelResponse(parts=[TextPart(content="(end of recorded turn)")], model_name="replay")
+        return turn.responses[index]
+
+    async def _wait(self, seconds: float):
+        if seconds <= 0:
+            return
+        waited = simulated_wait.get()
+        if waited is not None:
+            waited[0] += seconds
+        await asyncio.sleep(seconds)
+
+    def _text_delay(self, text: str) -> float:
+        return len(text) / self.chars_per_second if self.chars_per_second > 0 else 0.0
+
+    async def _respond(self, messages: List[ModelMessage], info: AgentInfo) -> ModelResponse:
+        response = self._next(messages)
+        text = "".join(part.content for part in response.parts if isinstance(part, TextPart))
+        await self._wait(self.latency + self._text_delay(text))
+        return ModelResponse(parts=response.parts, model_name="replay")
+
+    async def _stream(self, messages: List[ModelMessage], info: AgentInfo):
+        response = self._next(messages)
+        await self._wait(self.latency)
+        calls = {}
+        for part in response.parts:
+            if isinstance(part, TextPart):
+                for start in range(0, len(part.content), STREAM_CHUNK_CHARS):
+                    piece = part.content[start:start + STREAM_CHUNK_CHARS]
+                    await self._wait(self._text_delay(piece))
+                    yield piece
+            elif isinstance(part, ToolCallPart):
+                calls[len(calls)] = DeltaToolCall(name=part.tool_name, json_args=part.args_as_json_str(), tool_call_id=part.tool_call_id)
+        if calls:
+            yield calls
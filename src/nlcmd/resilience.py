@@ -0,0 +1,267 @@
+import asyncio
+import random
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Awaitable, Callable, List, Optional
+
+from pydantic_ai.exceptions import ModelAPIError, ModelHTTPError
+from pydantic_ai.messages import ModelMessage, ModelResponse
+from pydantic_ai.models import Model, ModelRequestParameters, StreamedResponse
+from pydantic_ai.models.wrapper import WrapperModel
+from pydantic_ai.settings import ModelSettings
+
+from nlcmd import config
+
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+# Latency samples kept for the hedge delay, and how many are needed before the p95 replaces LLM_HEDGE_DELAY
+LATENCY_WINDOW = 200
+LATENCY_MIN_SAMPLES = 20
+
+
+class CircuitOpenError(ModelAPIError):
+    """Raised without calling the endpoint while its circuit breaker is open."""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Rate limits, server errors, connection failures and deadlines; other 4xx responses will not get better."""
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, ModelHTTPError):
+        return error.status_code in RETRYABLE_STATUS
+    return isinstance(error, (ModelAPIError, TimeoutError))
+
+
+class CircuitBreaker:
+    """
+    Opens after `failures` consecutive failures and rejects calls for `cooldown` seconds.
+    Then a single trial call is let through (half-open): success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failures: int = None, cooldown: float = None):
+        self.failures = config.LLM_CIRCUIT_FAILURES if failures is None else failures
+        self.cooldown = config.LLM_CIRCUIT_COOLDOWN if cooldown is None else cooldown
+        self.consecutive = 0
+        self.opened_at: Optional[float] = None
+        self._trial_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed" or self.failures <= 0:
+            return True
+        now = time.monotonic()
+        # A trial that never reported back (e.g. a hedge that was not needed) does not block the next one forever
+        if state == "half-open" and (self._trial_at is None or now - self._trial_at >= self.cooldown):
+            self._trial_at = now
+            return True
+        return False
+
+    def success(self):
+        self.consecutive = 0
+        self.opened_at = None
+        self._trial_at = None
+
+    def failure(self):
+        self.consecutive += 1
+        self._trial_at = None
+        if self.failures > 0 and (self.consecutive >= self.failures or self.opened_at is not None):
+            self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    def __init__(self, default: float):
+        self.default = default
+        self.samples: deque = deque(maxlen=LATENCY_WINDOW)
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+
+    def p95(self) -> float:
+        if len(self.samples) < LATENCY_MIN_SAMPLES:
+            return self.default
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+class GuardedStream:
+    """
+    Stands in for an open StreamedResponse: iterating it fails with TimeoutError when the next event takes
+    longer than `idle_timeout`, or the stream runs past `ends_at` (event loop time). Everything else is the
+    wrapped stream's.
+    """
+
+    def __init__(self, stream: StreamedResponse, idle_timeout: float, ends_at: Optional[float], on_timeout: Callable[[], None]):
+        self._stream = stream
+        self._idle_timeout = idle_timeout
+        self._ends_at = ends_at
+        self._on_timeout = on_timeout
+        self._events = None
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    def __aiter__(self):
+        # Like StreamedResponse, iterating again continues the same event stream
+        if self._events is None:
+            self._events = self._guarded(aiter(self._stream))
+        return self._events
+
+    async def _guarded(self, events):
+        loop = asyncio.get_running_loop()
+        while True:
+            limits = [self._idle_timeout] if self._idle_timeout > 0 else []
+            if self._ends_at is not None:
+                limits.append(self._ends_at - loop.time())
+            try:
+                async with asyncio.timeout(min(limits) if limits else None):
+                    event = await anext(events)
+            except StopAsyncIteration:
+                return
+            except TimeoutError:
+                self._on_timeout()
+                raise
+            yield event
+
+
+class ResilientModel(WrapperModel):
+    """
+    Wraps a model with per-request deadlines, jittered exponential retries on transient errors and a circuit
+    breaker. With a `secondary` model, a request still running after the observed p95 latency is hedged:
+    the same request goes to the secondary and the first successful answer wins. Streams cannot be
+    duplicated, so a stream that has not started by then is abandoned for the secondary instead. Once
+    started, a stream fails if it goes quiet for `idle_timeout` or runs past `stream_deadline` overall.
+    """
+
+    def __init__(self, wrapped: Model, secondary: Model = None, retries: int = None, deadline: float = None,
+                 backoff: float = None, hedge_delay: float = None, idle_timeout: float = None,
+                 stream_deadline: float = None):
+        super().__init__(wrapped)
+        self.secondary = secondary
+        self.retries = config.LLM_RETRIES if retries is None else retries
+        self.deadline = config.LLM_REQUEST_TIMEOUT if deadline is None else deadline
+        self.backoff = config.LLM_RETRY_BACKOFF if backoff is None else backoff
+        self.idle_timeout = config.LLM_STREAM_IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+        self.stream_deadline = config.LLM_STREAM_TIMEOUT if stream_deadline is None else stream_deadline
+        self.latency = LatencyTracker(config.LLM_HEDGE_DELAY if hedge_delay is None else hedge_delay)
+        self.breakers = {id(wrapped): CircuitBreaker()}
+        if secondary is not None:
+            self.breakers[id(secondary)] = CircuitBreaker()
+
+    def _timeout(self):
+        return asyncio.timeout(self.deadline if self.deadline > 0 else None)
+
+    def _delay(self, attempt: int) -> float:
+        # Full jitter: spreads out clients that failed together so they don't retry together
+        return random.uniform(0, min(self.backoff * 2 ** attempt, 30.0))
+
+    def _candidates(self) -> List[Model]:
+        models = [self.wrapped] + ([self.secondary] if self.secondary is not None else [])
+        return [model for model in models if self.breakers[id(model)].allow()]
+
+    async def _with_retries(self, attempt_once: Callable[[List[Model]], Awaitable]):
+        for attempt in range(self.retries + 1):
+            models = self._candidates()
+            if not models:
+                raise CircuitOpenError(self.wrapped.model_name, "Model endpoint unavailable (circuit open), not retrying")
+            try:
+                return await attempt_once(models)
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.retries:
+                    raise
+            await asyncio.sleep(self._delay(attempt))
+
+    async def _call(self, model: Model, messages, model_settings, model_request_parameters) -> ModelResponse:
+        breaker = self.breakers[id(model)]
+        start = time.monotonic()
+        try:
+            async with self._timeout():
+                response = await model.request(messages, model_settings, model_request_parameters)
+        except Exception as e:
+            if is_retryable(e):
+                breaker.failure()
+            raise
+        breaker.success()
+        self.latency.add(time.monotonic() - start)
+        return response
+
+    async def _hedged(self, models: List[Model], messages, model_settings, model_request_parameters) -> ModelResponse:
+        def start(model: Model) -> asyncio.Task:
+            return asyncio.create_task(self._call(model, messages, model_settings, model_request_parameters))
+
+        started = 1
+        pending = {start(models[0])}
+        error = None
+        try:
+            while pending:
+                # Until every model has been tried, wait no longer than the p95 before hedging
+                timeout = self.latency.p95() if started < len(models) else None
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = error or task.exception()
+                if started < len(models) and (not done or is_retryable(error)):
+                    # Slow past the p95, or failed transiently: send the same request to the secondary
+                    pending.add(start(models[started]))
+                    started += 1
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def request(
+        self,
+        messages: List[ModelMessage],
+        model_settings: Optional[ModelSettings],
+        model_request_parameters: ModelRequestParameters,
+    ) -> ModelResponse:
+        return await self._with_retries(lambda models: self._hedged(models, messages, model_settings, model_request_parameters))
+
+    @asynccontextmanager
+    async def request_stream(
+        self,
+        messages: List[ModelMessage],
+        model_settings: Optional[ModelSettings],
+        model_request_parameters: ModelRequestParameters,
+        run_context=None,
+    ) -> AsyncIterator[StreamedResponse]:
+        async def open_stream(models: List[Model]):
+            error = None
+            for i, model in enumerate(models):
+                breaker = self.breakers[id(model)]
+                # Opening waits for the first response chunk; with a model left to fall back to, only for the p95
+                is_hedge = i < len(models) - 1
+                limit = self.latency.p95() if is_hedge else self.deadline
+                stack = AsyncExitStack()
+                start = time.monotonic()
+                started = asyncio.get_running_loop().time()
+                try:
+                    async with asyncio.timeout(limit if limit and limit > 0 else None):
+                        stream = await stack.enter_async_context(
+                            model.request_stream(messages, model_settings, model_request_parameters, run_context)
+                        )
+                except Exception as e:
+                    await stack.aclose()
+                    if not is_retryable(e):
+                        raise
+                    if not is_hedge or not isinstance(e, TimeoutError):
+                        # Missing the hedge delay is slow, not broken
+                        breaker.failure()
+                    error = e
+                    continue
+                breaker.success()
+                self.latency.add(time.monotonic() - start)
+                ends_at = started + self.stream_deadline if self.stream_deadline > 0 else None
+                return stack, GuardedStream(stream, self.idle_timeout, ends_at, breaker.failure)
+            raise error
+
+        stack, stream = await self._with_retries(open_stream)
+        async with stack:
+            yield stream
@@ -0,0 +1,171 @@
+import json
+import re
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Literal, Optional
+
+from pydantic_ai.messages import ModelMessage, ModelResponse
+from pydantic_ai.models import Model, ModelRequestParameters, StreamedResponse
+from pydantic_ai.models.wrapper import WrapperModel
+from pydantic_ai.settings import ModelSettings
+from pydantic_ai.usage import RunUsage
+
+Route = Literal["fast", "strong"]
+
+# Relative to the workspace, next to the command journal
+ROUTES_FILE = Path(".nlcmd") / "routes.jsonl"
+
+# Requests longer than this are rarely a single command
+FAST_MAX_CHARS = 80
+
+# Multi-step wording, open questions, documents, skills and memory: worth the stronger model
+STRONG_HINTS = re.compile(
+    r"(然后|接着|之后|并且|再把|每个|所有|批量|分析|总结|解释|为什么|怎么|如何|比较|计划|脚本|记住|记得|记忆"
+    r"|\bthen\b|\bafter\b|\bfor each\b|\bevery\b|\ball\b|\bwhy\b|\bhow\b|\bexplain|\bsummar|\banaly|\bcompare"
+    r"|\bplan\b|\bscript\b|\bremember\b|\bskill|\.docx?\b|\.pdf\b|\.pptx?\b|\.xlsx?\b)",
+    re.IGNORECASE,
+)
+
+
+class RouteState:
+    """The route of one agent run. Tools escalate it; later model requests of the run then go to the strong model."""
+
+    def __init__(self, route: Route, reason: str):
+        self.initial: Route = route
+        self.route: Route = route
+        self.reason = reason
+        self.escalated: Optional[str] = None
+
+    def escalate(self, reason: str):
+        if self.route == "fast":
+            self.route = "strong"
+            self.escalated = reason
+
+
+# The route of the run being served; set by CommandGenerator.run_task and inherited by tool calls
+current_route: ContextVar[Optional[RouteState]] = ContextVar("current_route", default=None)
+
+
+def classify(text: str) -> RouteState:
+    """Cheap heuristic: short, single-line requests without multi-step or analysis wording take the fast route."""
+    text = text.strip()
+    if "\n" in text:
+        return RouteState("strong", "multi-line request")
+    if len(text) > FAST_MAX_CHARS:
+        return RouteState("strong", f"longer than {FAST_MAX_CHARS} characters")
+    match = STRONG_HINTS.search(text)
+    if match:
+        return RouteState("strong", f"mentions '{match.group(0)}'")
+    return RouteState("fast", "short single-step request")
+
+
+def escalate(reason: str):
+    """Switch the current run to the strong model, e.g. after a failed command or an ambiguous request."""
+    state = current_route.get()
+    if state is not None:
+        state.escalate(reason)
+
+
+class RouterModel(WrapperModel):
+    """Sends each request to the fast or the strong (wrapped) model according to the current RouteState."""
+
+    def __init__(self, strong: Model, fast: Model):
+        super().__init__(strong)
+        self.fast = fast
+
+    def current(self) -> Model:
+        state = current_route.get()
+        return self.fast if state is not None and state.route == "fast" else self.wrapped
+
+    async def request(
+        self,
+        messages: List[ModelMessage],
+        model_settings: Optional[ModelSettings],
+        model_request_parameters: ModelRequestParameters,
+    ) -> ModelResponse:
+        return await self.current().request(messages, model_settings, model_request_parameters)
+
+    @asynccontextmanager
+    async def request_stream(
+        self,
+        messages: List[ModelMessage],
+        model_settings: Optional[ModelSettings],
+        model_request_parameters: ModelRequestParameters,
+        run_context=None,
+    ) -> AsyncIterator[StreamedResponse]:
+        async with self.current().request_stream(messages, model_settings, model_request_parameters, run_context) as stream:
+            yield stream
+
+    @property
+    def model_name(self) -> str:
+        return self.current().model_name
+
+
+def response_cost(messages: List[ModelMessage]) -> Optional[float]:
+    """Price of the model responses in USD from genai-prices, or None if a model is not in its catalog."""
+    total = 0.0
+    for message in messages:
+        if isinstance(message, ModelResponse):
+            try:
+                total += float(message.cost().total_price)
+            except Exception:
+                return None
+    return total
+
+
+def route_entry(state: RouteState, messages: List[ModelMessage], usage: RunUsage, duration: float) -> Dict[str, Any]:
+    models = []
+    for message in messages:
+        if isinstance(message, ModelResponse) and message.model_name and message.model_name not in models:
+            models.append(message.model_name)
+    return {
+        "ts": datetime.now().isoformat(timespec="seconds"),
+        "route": state.initial,
+        "reason": state.reason,
+        "escalated": state.escalated,
+        "models": models,
+        "duration": round(duration, 3),
+        "requests": usage.requests,
+        "input_tokens": usage.input_tokens,
+        "output_tokens": usage.output_tokens,
+        "cost": response_cost(messages),
+    }
+
+
+class RouteStats:
+    """Per-route latency, token and cost totals of a session, also appended to the workspace's routes.jsonl."""
+
+    def __init__(self, work_dir: str = None):
+        self.path = Path(work_dir) / ROUTES_FILE if work_dir else None
+        self.totals: Dict[str, Dict[str, float]] = {}
+
+    def record(self, entry: Dict[str, Any]):
+        totals = self.totals.setdefault(entry["route"], {"runs": 0, "escalated": 0, "duration": 0.0, "input_tokens": 0, "output_tokens": 0, "cost": 0.0})
+        totals["runs"] += 1
+        totals["escalated"] += 1 if entry["escalated"] else 0
+        totals["duration"] += entry["duration"]
+        totals["input_tokens"] += entry["input_tokens"]
+        totals["output_tokens"] += entry["output_tokens"]
+        totals["cost"] += entry["cost"] or 0.0
+        if self.path is not None:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            except OSError:
+                pass
+
+    def summary(self) -> List[str]:
+        lines = []
+        for route, totals in sorted(self.totals.items()):
+            runs = totals["runs"]
+            line = f"{route}: {runs} run(s), avg {totals['duration'] / runs:.2f}s, {totals['input_tokens']} in / {totals['output_tokens']} out tokens"
+            if totals["cost"]:
+                line += f", ${totals['cost']:.4f}"
+            if totals["escalated"]:
+                line += f", {totals['escalated']} escalated"
+            lines.append(line)
+        return lines
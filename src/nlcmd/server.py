@@ -0,0 +1,247 @@
+import asyncio
+import hmac
+import itertools
+import json
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import typer
+from rich.panel import Panel
+
+try:
+    from websockets.asyncio.server import serve
+    from websockets.exceptions import ConnectionClosed
+except ImportError:
+    serve = None
+    ConnectionClosed = Exception
+
+from nlcmd import config
+from nlcmd.llm import CommandGenerator, build_agent_model, create_agent
+from nlcmd.memory import get_indexer
+from nlcmd.session import close_sessions, shell_owner
+from nlcmd.ui import LiveResponseStream, console, session_output, session_prompts
+from nlcmd.utils import WorkspaceError, resolve_workspace
+
+serve_app = typer.Typer(help="Serve many nlcmd sessions from one process over WebSocket")
+
+# Protocol, one JSON object per WebSocket message:
+#   client: hello {workspace?, token?} | query {text, dry_run?} | answer {id, value} | reset
+#   server: ready {session, workspace} | output {data} | confirm {id, question} | input {id, prompt}
+#           | done {response} | error {message}
+
+
+class SessionOutput:
+    """File-like stream the console writes to while serving a session; each write becomes an output message."""
+
+    def __init__(self, outbox: asyncio.Queue):
+        self._outbox = outbox
+        self._loop = asyncio.get_running_loop()
+        self._thread = threading.get_ident()
+
+    def write(self, text: str) -> int:
+        if text:
+            message = {"type": "output", "data": text}
+            # Written from the loop thread in order with prompts; other threads hand over through the loop
+            if threading.get_ident() == self._thread:
+                self._outbox.put_nowait(message)
+            else:
+                self._loop.call_soon_threadsafe(self._outbox.put_nowait, message)
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self) -> bool:
+        return False
+
+
+class SessionPrompts:
+    """Confirmations and inputs of a session, asked on its client; prompts of other sessions don't wait for them."""
+
+    def __init__(self, outbox: asyncio.Queue):
+        self._outbox = outbox
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._turn = asyncio.Lock()
+
+    def turn(self) -> asyncio.Lock:
+        return self._turn
+
+    async def _ask(self, message: Dict[str, Any]):
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self._outbox.put_nowait({**message, "id": request_id})
+        try:
+            return await future
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def confirm(self, question: str, **kwargs) -> bool:
+        return bool(await self._ask({"type": "confirm", "question": question}))
+
+    async def input(self, prompt: str) -> str:
+        return str(await self._ask({"type": "input", "prompt": prompt}))
+
+    def answer(self, request_id: int, value):
+        future = self._pending.get(request_id)
+        if future is not None and not future.done():
+            future.set_result(value)
+
+    def cancel(self):
+        for future in self._pending.values():
+            future.cancel()
+
+
+class SharedWorkspace:
+    """What the sessions of one workspace share: the agent with its skills catalog, and the memory index."""
+
+    def __init__(self, path: str, model):
+        self.path = path
+        self.agent, self.skills_toolset = create_agent(model, path)
+        self.memory_indexer = get_indexer(Path(path) / "memory" / "index")
+
+
+class Session:
+    """One client: its own message history, output stream, prompts and shell session, on a shared workspace."""
+
+    def __init__(self, workspace: SharedWorkspace, model):
+        self.id = uuid.uuid4().hex[:12]
+        self.workspace = workspace
+        self.outbox: asyncio.Queue = asyncio.Queue()
+        self.output = SessionOutput(self.outbox)
+        self.prompts = SessionPrompts(self.outbox)
+        self.generator = CommandGenerator(
+            workspace=workspace.path, model=model, agent=workspace.agent, memory_indexer=workspace.memory_indexer,
+        )
+        self.task: Optional[asyncio.Task] = None
+
+    def send(self, message: Dict[str, Any]):
+        self.outbox.put_nowait(message)
+
+    async def run_query(self, text: str, dry_run: bool = False):
+        # Context variables set here only apply to this task, i.e. to this session's turn
+        session_output.set(self.output)
+        session_prompts.set(self.prompts)
+        shell_owner.set(self.id)
+        stream = LiveResponseStream(console)
+        try:
+            response = await self.generator.run_task(text, dry_run=dry_run, stream=stream)
+        except WorkspaceError as e:
+            self.send({"type": "error", "message": str(e)})
+            return
+        except Exception as e:
+            self.send({"type": "error", "message": f"Error executing command: {e}"})
+            return
+        if isinstance(response, str) and response.strip() and not stream.finished:
+            console.print(Panel(response, title="AI Response", border_style="green"))
+        self.send({"type": "done", "response": response})
+
+    def close(self):
+        self.prompts.cancel()
+        if self.task is not None:
+            self.task.cancel()
+
+
+class SessionServer:
+    """
+    Hosts many sessions in one process. The model client (with its retry and circuit breaker state), the
+    skills catalog, the agent and the memory index with its embedding model are loaded once per process or
+    workspace instead of once per user.
+    """
+
+    def __init__(self, model=None, token: str = None):
+        self.model = model or build_agent_model()
+        self.token = config.SERVE_TOKEN if token is None else token
+        self.workspaces: Dict[str, SharedWorkspace] = {}
+        self._workspace_locks: Dict[str, asyncio.Lock] = {}
+        self.sessions: Dict[str, Session] = {}
+
+    async def workspace(self, path: Optional[str]) -> SharedWorkspace:
+        resolved = str(resolve_workspace(path or str(config.WORKSPACE)))
+        # Building the agent reads the skills catalog and opens the memory index; do it off the event loop,
+        # once per workspace even when several clients say hello at the same time
+        lock = self._workspace_locks.setdefault(resolved, asyncio.Lock())
+        async with lock:
+            if resolved not in self.workspaces:
+                self.workspaces[resolved] = await asyncio.to_thread(SharedWorkspace, resolved, self.model)
+        return self.workspaces[resolved]
+
+    async def _send_loop(self, websocket, session: Session):
+        while True:
+            message = await session.outbox.get()
+            await websocket.send(json.dumps(message, ensure_ascii=False))
+
+    async def handler(self, websocket):
+        try:
+            hello = json.loads(await websocket.recv())
+        except (ConnectionClosed, ValueError):
+            return
+        if self.token and not hmac.compare_digest(str(hello.get("token") or ""), self.token):
+            await websocket.send(json.dumps({"type": "error", "message": "Invalid token"}))
+            return
+        try:
+            session = Session(await self.workspace(hello.get("workspace")), self.model)
+        except WorkspaceError as e:
+            await websocket.send(json.dumps({"type": "error", "message": str(e)}))
+            return
+
+        self.sessions[session.id] = session
+        sender = asyncio.create_task(self._send_loop(websocket, session))
+        session.send({"type": "ready", "session": session.id, "workspace": session.workspace.path})
+        try:
+            async for raw in websocket:
+                try:
+                    message = json.loads(raw)
+                except ValueError:
+                    continue
+                kind = message.get("type")
+                if kind == "query":
+                    if session.task is not None and not session.task.done():
+                        session.send({"type": "error", "message": "A query is already running in this session"})
+                        continue
+                    session.task = asyncio.create_task(session.run_query(str(message.get("text", "")), bool(message.get("dry_run"))))
+                elif kind == "answer":
+                    session.prompts.answer(message.get("id"), message.get("value"))
+                elif kind == "reset":
+                    session.generator.message_history = []
+        except ConnectionClosed:
+            pass
+        finally:
+            session.close()
+            self.sessions.pop(session.id, None)
+            if session.task is not None:
+                await asyncio.gather(session.task, return_exceptions=True)
+            sender.cancel()
+            # The client's shell (session backend) and everything it started
+            await asyncio.to_thread(close_sessions, session.id)
+
+    async def start(self, host: str = None, port: int = None):
+        if serve is None:
+            raise ImportError("websockets is not installed. Please run 'uv sync --extra serve' to enable nlcmd serve.")
+        return await serve(self.handler, host or config.SERVE_HOST, config.SERVE_PORT if port is None else port)
+
+
+@serve_app.command()
+def run(
+    host: str = typer.Option(None, "--host", help="Address to listen on (SERVE_HOST)"),
+    port: int = typer.Option(None, "--port", "-p", help="Port to listen on (SERVE_PORT)"),
+):
+    async def main():
+        server = await SessionServer().start(host, port)
+        address = server.sockets[0].getsockname()
+        console.print(f"[bold green]nlcmd serving on ws://{address[0]}:{address[1]}[/bold green]")
+        if not config.SERVE_TOKEN:
+            console.print("[yellow]SERVE_TOKEN is not set: anyone who can reach this port can run commands.[/yellow]")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await asyncio.to_thread(close_sessions)
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        console.print("\nStopped.")
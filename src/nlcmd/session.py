@@ -0,0 +1,261 @@
+import atexit
+import os
+import platform
+import queue
+import re
+import shutil
+import signal
+import subprocess
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+from nlcmd import config
+
+STREAM_CHUNK_SIZE = 65536
+KILL_GRACE_PERIOD = 2.0
+# Bytes kept from the previous chunk so a sentinel split across two reads is still found
+SENTINEL_WINDOW = 128
+
+
+class SessionResult(NamedTuple):
+    stdout: bytes
+    stderr: bytes
+    returncode: Optional[int]
+    timed_out: bool = False
+    stdout_dropped: int = 0
+    stderr_dropped: int = 0
+    restarted: bool = False
+
+
+def kill_process_tree(process: subprocess.Popen):
+    """Terminate a process started in its own session/process group together with everything it started."""
+    if process.poll() is not None:
+        return
+    if platform.system() == "Windows":
+        subprocess.run(["taskkill", "/F", "/T", "/PID", str(process.pid)], capture_output=True)
+    else:
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+            process.wait(KILL_GRACE_PERIOD)
+        except subprocess.TimeoutExpired:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        except ProcessLookupError:
+            pass
+    process.wait()
+
+
+def _is_powershell(shell: str) -> bool:
+    name = Path(shell).name.lower()
+    return "powershell" in name or name.startswith("pwsh")
+
+
+def default_session_shell() -> str:
+    """PowerShell on Windows, otherwise bash (falling back to /bin/sh); the framing needs one of those syntaxes."""
+    if platform.system() == "Windows":
+        return config.DEFAULT_SHELL if _is_powershell(config.DEFAULT_SHELL) else "powershell"
+    return shutil.which("bash") or "/bin/sh"
+
+
+class _Collected(NamedTuple):
+    data: bytes
+    match: Optional[re.Match]
+    dropped: int
+    eof: bool
+
+
+class ShellSession:
+    """
+    One long-lived bash or PowerShell process that runs commands one at a time.
+    Each command is framed by a random sentinel echoed on stdout (with the exit code) and on stderr,
+    which marks where its output ends without closing the pipes. Blocking; call it from a worker thread.
+    """
+
+    def __init__(self, work_dir: str, shell: str = None, preexec_fn: Callable = None):
+        self.work_dir = work_dir
+        self.shell = shell or default_session_shell()
+        self.powershell = _is_powershell(self.shell)
+        self.bash = Path(self.shell).name.startswith("bash")
+        self.preexec_fn = preexec_fn
+        self._process: Optional[subprocess.Popen] = None
+        self._stdout: "queue.Queue[bytes]" = queue.Queue()
+        self._stderr: "queue.Queue[bytes]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+
+    @property
+    def alive(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def _args(self) -> list:
+        if self.powershell:
+            return [self.shell, "-NoLogo", "-NoProfile", "-NonInteractive", "-Command", "-"]
+        if self.bash:
+            return [self.shell, "--noprofile", "--norc"]
+        return [self.shell]
+
+    def _start(self):
+        kwargs = {}
+        if platform.system() == "Windows":
+            kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            kwargs["start_new_session"] = True
+            if self.preexec_fn is not None:
+                kwargs["preexec_fn"] = self.preexec_fn
+        self._stdout, self._stderr = queue.Queue(), queue.Queue()
+        self._process = subprocess.Popen(
+            self._args(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=self.work_dir,
+            bufsize=0,
+            **kwargs,
+        )
+        for stream, chunks in ((self._process.stdout, self._stdout), (self._process.stderr, self._stderr)):
+            threading.Thread(target=self._pump, args=(stream, chunks), daemon=True, name="nlcmd-shell-reader").start()
+        if self.powershell:
+            self._write("[Console]::OutputEncoding = [System.Text.Encoding]::UTF8\n")
+        self._started = True
+
+    @staticmethod
+    def _pump(stream, chunks: "queue.Queue[bytes]"):
+        try:
+            while chunk := stream.read(STREAM_CHUNK_SIZE):
+                chunks.put(chunk)
+        except (OSError, ValueError):
+            pass
+        chunks.put(b"")
+
+    def _write(self, text: str):
+        self._process.stdin.write(text.encode("utf-8"))
+        self._process.stdin.flush()
+
+    def _frame(self, cmd: str, marker: str) -> str:
+        if self.powershell:
+            # Dot-sourcing keeps variables and location in the session scope; the blank line ends the block
+            return (
+                f". {{\n{cmd}\n}} < $null\n"
+                "$__nlcmd_rc = if ($?) { 0 } else { 1 }; if ($LASTEXITCODE) { $__nlcmd_rc = $LASTEXITCODE }; $global:LASTEXITCODE = 0\n"
+                f'[Console]::Out.Write("`n{marker} $__nlcmd_rc`n"); [Console]::Out.Flush()\n'
+                f'[Console]::Error.Write("`n{marker}`n"); [Console]::Error.Flush()\n\n'
+            )
+        # The command arrives through a quoted heredoc and runs via eval in the current shell, so cd/export
+        # persist and a syntax error fails only this command; stdin is detached from the protocol pipe
+        if self.bash:
+            load = f"IFS= read -r -d '' __nlcmd_cmd <<'{marker}'\n{cmd}\n{marker}\n"
+        else:
+            load = f"__nlcmd_cmd=$(cat <<'{marker}'\n{cmd}\n{marker}\n)\n"
+        return (
+            load
+            + "eval \"$__nlcmd_cmd\" < /dev/null\n"
+            f"__nlcmd_rc=$?; printf '\\n%s %d\\n' '{marker}' \"$__nlcmd_rc\"; printf '\\n%s\\n' '{marker}' >&2\n"
+        )
+
+    @staticmethod
+    def _collect(chunks: "queue.Queue[bytes]", pattern: re.Pattern, deadline: Optional[float], limit: int) -> _Collected:
+        kept = bytearray()
+        window = b""
+        total = 0
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            try:
+                if remaining is not None and remaining <= 0:
+                    raise queue.Empty
+                chunk = chunks.get(timeout=remaining)
+            except queue.Empty:
+                return _Collected(bytes(kept), None, max(total - limit, 0), False)
+            if not chunk:
+                return _Collected(bytes(kept), None, max(total - limit, 0), True)
+
+            window_start = total - len(window)
+            window += chunk
+            total += len(chunk)
+            if len(kept) < limit:
+                kept += chunk[:limit - len(kept)]
+
+            match = pattern.search(window)
+            if match:
+                end = window_start + match.start()
+                return _Collected(bytes(kept[:end]), match, max(end - limit, 0), False)
+            window = window[-SENTINEL_WINDOW:]
+
+    def _drain(self, chunks: "queue.Queue[bytes]", limit: int) -> bytes:
+        """Read what a killed session left in a pipe, up to EOF or the grace period."""
+        return self._collect(chunks, re.compile(rb"(?!)"), time.monotonic() + KILL_GRACE_PERIOD, limit).data
+
+    def run(self, cmd: str, timeout: float = None, limit: int = 10 * 1024 * 1024) -> SessionResult:
+        with self._lock:
+            restarted = False
+            if not self.alive:
+                restarted = self._started
+                self._start()
+
+            marker = f"__NLCMD_{uuid.uuid4().hex}"
+            out_pattern = re.compile(rb"\r?\n" + marker.encode() + rb" (-?\d+)\r?\n")
+            err_pattern = re.compile(rb"\r?\n" + marker.encode() + rb"\r?\n")
+            deadline = None if timeout is None else time.monotonic() + timeout
+
+            try:
+                self._write(self._frame(cmd, marker))
+            except (BrokenPipeError, OSError):
+                self._kill()
+                return SessionResult(b"", b"", self._process.poll(), restarted=restarted)
+
+            out = self._collect(self._stdout, out_pattern, deadline, limit)
+            if out.match is None:
+                # Timed out, or the command ended the shell (e.g. `exit`)
+                timed_out = not out.eof
+                self._kill()
+                stderr = self._drain(self._stderr, limit)
+                returncode = None if timed_out else self._process.returncode
+                return SessionResult(out.data, stderr, returncode, timed_out, out.dropped, 0, restarted)
+
+            # stdout sentinel is printed first, so stderr's is already on its way
+            err = self._collect(self._stderr, err_pattern, time.monotonic() + KILL_GRACE_PERIOD, limit)
+            if err.match is None:
+                self._kill()
+            return SessionResult(out.data, err.data, int(out.match.group(1)), False, out.dropped, err.dropped, restarted)
+
+    def _kill(self):
+        if self._process is not None:
+            kill_process_tree(self._process)
+
+    def close(self):
+        """Kill the shell and everything it started. Safe to call from another thread while `run` blocks."""
+        self._kill()
+
+
+# Set by `nlcmd serve` in the task serving a remote session, so every client gets its own shell
+shell_owner: ContextVar[Optional[str]] = ContextVar("shell_owner", default=None)
+
+_sessions: Dict[Tuple[str, Optional[str]], ShellSession] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(work_dir: str, preexec_fn: Callable = None, owner: str = None) -> ShellSession:
+    """
+    The shell session of a workspace (and owner, a served client), created on first use and kept until
+    close_sessions() or the end of the process.
+    """
+    with _sessions_lock:
+        session = _sessions.get((work_dir, owner))
+        if session is None:
+            session = _sessions[(work_dir, owner)] = ShellSession(work_dir, preexec_fn=preexec_fn)
+        return session
+
+
+@atexit.register
+def close_sessions(owner: str = None):
+    """Kill the shells of one owner, or all shells when no owner is given."""
+    with _sessions_lock:
+        keys = [key for key in _sessions if owner is None or key[1] == owner]
+        sessions = [_sessions.pop(key) for key in keys]
+    for session in sessions:
+        session.close()
@@ -0,0 +1,360 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from pydantic_ai import RunContext
+from pydantic_ai_skills import SkillsToolset
+from pydantic_ai_skills.exceptions import SkillResourceNotFoundError
+from pydantic_ai_skills.directory import discover_skills
+from pydantic_ai_skills.local import LocalSkillScriptExecutor, create_file_based_resource, create_file_based_script
+from pydantic_ai_skills.types import Skill
+
+from nlcmd import config
+
+# Skills shipped with nlcmd; the workspace's skills/ directory is searched after it and wins on name clashes
+BUNDLED_SKILLS_DIR = Path(__file__).parent.parent.parent / "skills"
+# Relative to the workspace, next to the command journal
+MANIFEST_FILE = Path(".nlcmd") / "skills.json"
+MANIFEST_VERSION = 1
+
+# Same wording as pydantic-ai-skills' default catalog instructions
+INSTRUCTION_TEMPLATE = (
+    "You have access to a collection of skills containing domain-specific knowledge and capabilities.\n"
+    "Each skill provides specialized instructions, resources, and scripts for specific tasks.\n\n"
+    "<available_skills>\n{skills_list}\n</available_skills>\n\n"
+    "When a task falls within a skill's domain:\n"
+    "1. Use `load_skill` to read the complete skill instructions\n"
+    "2. Follow the skill's guidance to complete the task\n"
+    "3. Use any additional skill resources and scripts as needed\n\n"
+    "Use progressive disclosure: load only what you need, when you need it."
+)
+
+# Skills per fingerprint, shared by every CommandGenerator of the process (e.g. each cron firing)
+_loaded: Dict[str, List[Skill]] = {}
+MAX_LOADED = 16
+_executor = LocalSkillScriptExecutor()
+
+
+def fingerprint(directories: Sequence[Path]) -> str:
+    """
+    Hash of the directory tree's mtimes and each SKILL.md's mtime and size. Adding, removing or renaming
+    a skill, resource or script changes a directory mtime; editing a SKILL.md changes its own stat.
+    Only stat calls, no file is read.
+    """
+    digest = hashlib.sha1()
+    for directory in directories:
+        digest.update(str(directory).encode())
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            digest.update(f"{root}:{os.stat(root).st_mtime_ns}".encode())
+            if "SKILL.md" in files:
+                stat = os.stat(os.path.join(root, "SKILL.md"))
+                digest.update(f":{stat.st_mtime_ns}:{stat.st_size}".encode())
+    return digest.hexdigest()
+
+
+def _to_entry(skill: Skill) -> Dict[str, Any]:
+    return {
+        "name": skill.name,
+        "description": skill.description,
+        "content": skill.content,
+        "license": skill.license,
+        "compatibility": skill.compatibility,
+        "uri": skill.uri,
+        "metadata": skill.metadata,
+        "resources": [[resource.name, resource.uri] for resource in skill.resources],
+        "scripts": [[script.name, script.uri] for script in skill.scripts],
+    }
+
+
+def _from_entry(entry: Dict[str, Any]) -> Skill:
+    return Skill(
+        name=entry["name"],
+        description=entry["description"],
+        content=entry["content"],
+        license=entry["license"],
+        compatibility=entry["compatibility"],
+        uri=entry["uri"],
+        metadata=entry["metadata"],
+        resources=[create_file_based_resource(name=name, uri=uri) for name, uri in entry["resources"]],
+        scripts=[
+            create_file_based_script(name=name, uri=uri, skill_name=entry["name"], executor=_executor)
+            for name, uri in entry["scripts"]
+        ],
+    )
+
+
+def _discover(directories: Sequence[Path]) -> List[Skill]:
+    skills: Dict[str, Skill] = {}
+    for directory in directories:
+        for skill in discover_skills(directory, script_executor=_executor):
+            skills[skill.name] = skill
+    return list(skills.values())
+
+
+def _read_manifest(path: Path, key: str) -> Optional[List[Skill]]:
+    try:
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+        if manifest.get("version") != MANIFEST_VERSION or manifest.get("fingerprint") != key:
+            return None
+        return [_from_entry(entry) for entry in manifest["skills"]]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _write_manifest(path: Path, key: str, skills: List[Skill]):
+    manifest = {"version": MANIFEST_VERSION, "fingerprint": key, "skills": [_to_entry(skill) for skill in skills]}
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(manifest, ensure_ascii=False, default=str), encoding="utf-8")
+        tmp.replace(path)
+    except OSError:
+        pass
+
+
+def load_skills(directories: Sequence[Path], manifest: Optional[Path] = None) -> Tuple[List[Skill], str]:
+    """
+    Skills of the directories, last directory winning on name clashes. Comes from the in-process cache or
+    the manifest when the fingerprint still matches; otherwise the directories are parsed and the manifest
+    is rewritten. Returns the skills and where they came from ("memory", "manifest" or "scan").
+    """
+    directories = [Path(directory).expanduser().resolve() for directory in directories]
+    directories = [directory for directory in directories if directory.is_dir()]
+    key = fingerprint(directories)
+    if key in _loaded:
+        return _loaded[key], "memory"
+    skills = _read_manifest(manifest, key) if manifest is not None else None
+    source = "manifest"
+    if skills is None:
+        skills = _discover(directories)
+        source = "scan"
+        if manifest is not None:
+            _write_manifest(manifest, key, skills)
+    if len(_loaded) >= MAX_LOADED:
+        _loaded.pop(next(iter(_loaded)))
+    _loaded[key] = skills
+    return skills, source
+
+
+def _triggers(skill: Skill) -> List[str]:
+    triggers = (skill.metadata or {}).get("triggers") or []
+    if isinstance(triggers, str):
+        triggers = [triggers]
+    return [str(trigger).lower() for trigger in triggers if str(trigger).strip()]
+
+
+def catalog_text(skill: Skill) -> str:
+    """What a skill is embedded as: name, description and trigger words."""
+    return " ".join([skill.name, skill.description, *_triggers(skill)])
+
+
+def memory_encoder(index_path: Path) -> Callable[[List[str]], np.ndarray]:
+    """
+    Encodes with the embedding model of the workspace's memory indexer (get_indexer), so memory recall and
+    skill selection load the model once per process. Raises if the model cannot be loaded.
+    """
+    def encode(texts: List[str]) -> np.ndarray:
+        from nlcmd.memory.indexer import get_indexer
+
+        return np.asarray(get_indexer(index_path).embeddings.batchtransform(texts), dtype=np.float32)
+    return encode
+
+
+def _keyword_score(skill: Skill, query: str) -> float:
+    # Without the embedding model: share of the skill's name and description words found in the query
+    words = {word for word in re.findall(r"\w{3,}", f"{skill.name} {skill.description}".lower())}
+    return sum(word in query for word in words) / len(words) if words else 0.0
+
+
+class SkillSelector:
+    """
+    Picks the skills worth listing for a request: skills whose trigger words appear in it first, then the
+    closest by embedding similarity (keyword overlap without an encoder, or once it has failed).
+    """
+
+    def __init__(self, skills: List[Skill], top_k: int = None, encoder: Callable[[List[str]], np.ndarray] = None):
+        self.skills = skills
+        self.top_k = config.SKILLS_TOP_K if top_k is None else top_k
+        self._encoder = encoder
+        self._vectors: Optional[np.ndarray] = None
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        vectors = self._encoder(texts)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+    def _similarities(self, query: str) -> Optional[np.ndarray]:
+        if self._encoder is None:
+            return None
+        try:
+            if self._vectors is None:
+                self._vectors = self._encode([catalog_text(skill) for skill in self.skills])
+            return self._vectors @ self._encode([query])[0]
+        except Exception:
+            # Don't retry a model that cannot be loaded on every request
+            self._encoder = None
+            return None
+
+    def select(self, query: str) -> List[Skill]:
+        if self.top_k <= 0 or len(self.skills) <= self.top_k or not query.strip():
+            return self.skills
+        query = query.lower()
+        similarities = self._similarities(query)
+        scores = [
+            (any(trigger in query for trigger in _triggers(skill)),
+             float(similarities[i]) if similarities is not None else _keyword_score(skill, query))
+            for i, skill in enumerate(self.skills)
+        ]
+        ranked = sorted(range(len(self.skills)), key=lambda i: scores[i], reverse=True)
+        return [self.skills[i] for i in sorted(ranked[:self.top_k], key=lambda i: self.skills[i].name)]
+
+
+# Markdown headings outside code blocks; "# comment" lines in fenced code are not split at
+HEADING = re.compile(r"#{1,6} ")
+
+
+def chunk_text(text: str, size: int) -> List[Tuple[str, str]]:
+    """
+    Splits a document into (title, text) chunks of at most `size` characters, cutting at markdown
+    headings where possible and at line ends otherwise. The title is the heading the chunk starts in.
+    """
+    sections: List[List[str]] = []
+    fenced = False
+    for line in text.splitlines(keepends=True):
+        if line.startswith("```"):
+            fenced = not fenced
+        heading = not fenced and HEADING.match(line)
+        if not sections or heading:
+            sections.append([line.lstrip("#").strip()[:80] if heading else "", line])
+        else:
+            sections[-1][1] += line
+
+    pieces: List[Tuple[str, str]] = []
+    for title, section in sections:
+        while len(section) > size:
+            cut = section.rfind("\n", 0, size) + 1 or size
+            pieces.append((title, section[:cut]))
+            section = section[cut:]
+            title = f"{title} (continued)" if title and not title.endswith("(continued)") else title
+        pieces.append((title, section))
+
+    chunks: List[Tuple[str, str]] = []
+    for title, piece in pieces:
+        if chunks and len(chunks[-1][1]) + len(piece) <= size:
+            chunks[-1] = (chunks[-1][0], chunks[-1][1] + piece)
+        else:
+            chunks.append((title, piece))
+    return chunks
+
+
+class CachedSkillsToolset(SkillsToolset):
+    """
+    SkillsToolset loaded through the skills manifest. The catalog in the instructions only lists the skills
+    relevant to the request (SKILLS_TOP_K), and long resources are read one chunk at a time.
+    """
+
+    def __init__(self, directories: Sequence[Path], manifest: Optional[Path] = None, top_k: int = None,
+                 chunk_chars: int = None, encoder=None, instruction_template: str = None, exclude_tools=(), **kwargs):
+        skills, self.source = load_skills(directories, manifest)
+        self._instructions: Dict[Tuple[str, ...], Optional[str]] = {}
+        self.top_k = config.SKILLS_TOP_K if top_k is None else top_k
+        self.chunk_chars = config.SKILL_CHUNK_CHARS if chunk_chars is None else chunk_chars
+        self.template = instruction_template or INSTRUCTION_TEMPLATE
+        self._encoder = encoder
+        self._selector: Optional[SkillSelector] = None
+        self._selected_from: Tuple[str, ...] = ()
+        # read_skill_resource is replaced by the chunked version below
+        super().__init__(skills=skills, exclude_tools={*exclude_tools, "read_skill_resource"}, **kwargs)
+        if "read_skill_resource" not in exclude_tools:
+            self._add_read_skill_resource()
+
+    def selector(self) -> SkillSelector:
+        # Skills can still be added after construction (the `skill` decorator)
+        names = tuple(sorted(self.skills))
+        if self._selector is None or names != self._selected_from:
+            self._selector = SkillSelector([self.skills[name] for name in names], self.top_k, self._encoder)
+            self._selected_from = names
+            self._instructions = {}
+        return self._selector
+
+    def _catalog(self, skills: List[Skill]) -> Optional[str]:
+        if not skills:
+            return None
+        lines = []
+        for skill in skills:
+            lines.append("<skill>")
+            lines.append(f"<name>{skill.name}</name>")
+            lines.append(f"<description>{skill.description}</description>")
+            if skill.uri:
+                lines.append(f"<uri>{skill.uri}</uri>")
+            lines.append("</skill>")
+        text = self.template.format(skills_list="\n".join(lines))
+        if len(skills) < len(self.skills):
+            text += (f"\n\nOnly the {len(skills)} skills most relevant to this request are listed; "
+                     f"`list_skills` shows all {len(self.skills)}.")
+        return text
+
+    async def get_instructions(self, ctx: RunContext[Any]) -> Optional[str]:
+        prompt = getattr(ctx, "prompt", None)
+        query = prompt if isinstance(prompt, str) else ""
+        selector = self.selector()
+        if len(selector.skills) > selector.top_k > 0 and query.strip():
+            # Embedding the query blocks; the requests of one run share the prompt and hit the cache below
+            skills = await asyncio.to_thread(selector.select, query)
+        else:
+            skills = selector.skills
+        key = tuple(skill.name for skill in skills)
+        if key not in self._instructions:
+            self._instructions[key] = self._catalog(skills)
+        return self._instructions[key]
+
+    def _add_read_skill_resource(self):
+        @self.tool
+        async def read_skill_resource(
+            ctx: RunContext[Any],
+            skill_name: str,
+            resource_name: str,
+            chunk: int = 1,
+            args: Optional[Dict[str, Any]] = None,
+        ) -> Any:
+            """Access supplementary documentation, templates, or data from a skill.
+
+            Long documents are returned one chunk at a time, with a table of contents of all chunks;
+            read further chunks only when the section you need is in them.
+
+            Args:
+                skill_name: Name of the skill containing the resource.
+                resource_name: Exact name of the resource as listed in the skill. Must match exactly.
+                chunk: Which chunk of a long document to return, starting at 1.
+                args: Arguments for callable resources (optional for static files).
+            """
+            skill = self.get_skill(skill_name)
+            resource = next((r for r in skill.resources or [] if r.name == resource_name), None)
+            if resource is None:
+                available = [r.name for r in skill.resources] if skill.resources else []
+                raise SkillResourceNotFoundError(
+                    f"Resource '{resource_name}' not found in skill '{skill_name}'. Available: {available}"
+                )
+            content = await resource.load(ctx=ctx, args=args)
+            if not isinstance(content, str) or self.chunk_chars <= 0 or len(content) <= self.chunk_chars:
+                return content
+            chunks = chunk_text(content, self.chunk_chars)
+            if not 1 <= chunk <= len(chunks):
+                return f"Error: '{resource_name}' has chunks 1 to {len(chunks)}."
+            contents = "\n".join(f"{i}. {title}" for i, (title, _) in enumerate(chunks, 1))
+            return (f"[{resource_name}: chunk {chunk} of {len(chunks)}. Chunks:\n{contents}]\n\n"
+                    f"{chunks[chunk - 1][1]}")
+
+
+def workspace_skills_toolset(workspace: str) -> CachedSkillsToolset:
+    return CachedSkillsToolset(
+        [BUNDLED_SKILLS_DIR, Path(workspace) / "skills"],
+        Path(workspace) / MANIFEST_FILE,
+        encoder=memory_encoder(Path(workspace) / "memory" / "index"),
+    )
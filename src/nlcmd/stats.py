@@ -0,0 +1,65 @@
+import json
+from datetime import datetime
+
+import typer
+from rich.table import Table
+
+from nlcmd import config
+from nlcmd.ui import console
+from nlcmd.tracing import TRACE_FILE, TURN_PHASES, read_spans, summarize, turn_breakdowns
+
+stats_app = typer.Typer(help="Show where time went, from the workspace's local trace file")
+
+
+def _seconds(value: float) -> str:
+    return f"{value:.2f}s" if value else "[dim]-[/dim]"
+
+
+@stats_app.command()
+def stats(
+    last: int = typer.Option(10, "--last", "-n", help="Number of recent turns to break down"),
+    as_json: bool = typer.Option(False, "--json", help="Print JSON lines instead of tables"),
+):
+    records = list(read_spans(config.WORKSPACE / TRACE_FILE))
+    spans = summarize(records)
+    turns = turn_breakdowns(records, last)
+
+    if as_json:
+        for row in spans:
+            print(json.dumps({"type": "span", **row}, ensure_ascii=False))
+        for row in turns:
+            print(json.dumps({"type": "turn", **row}, ensure_ascii=False))
+        return
+    if not records:
+        console.print("[dim]No traces recorded yet (TRACE_ENABLED=false?).[/dim]")
+        return
+
+    table = Table(title="Span latency")
+    table.add_column("Span", overflow="fold")
+    for column in ("Count", "p50", "p95", "Max", "Total"):
+        table.add_column(column, justify="right")
+    for row in spans:
+        table.add_row(
+            row["span"], str(row["count"]), f"{row['p50']:.2f}s", f"{row['p95']:.2f}s",
+            f"{row['max']:.2f}s", f"{row['total']:.2f}s",
+        )
+    console.print(table)
+
+    if not turns:
+        return
+    table = Table(title=f"Last {len(turns)} turn(s)")
+    table.add_column("Time")
+    table.add_column("Route")
+    table.add_column("History", justify="right")
+    table.add_column("Total", justify="right")
+    for phase in TURN_PHASES:
+        table.add_column(phase.capitalize(), justify="right")
+    for row in turns:
+        table.add_row(
+            datetime.fromtimestamp(row["start"]).strftime("%Y-%m-%d %H:%M:%S"),
+            row["route"],
+            str(row["history_messages"]),
+            f"{row['total']:.2f}s",
+            *(_seconds(row[phase]) for phase in TURN_PHASES),
+        )
+    console.print(table)
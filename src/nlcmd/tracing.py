@@ -0,0 +1,218 @@
+import json
+import threading
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import logfire
+from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter, SpanExportResult
+
+from nlcmd import config
+
+# Relative to the workspace, next to the command journal
+TRACE_FILE = Path(".nlcmd") / "trace.jsonl"
+# Attribute values longer than this are not written
+MAX_ATTRIBUTE_CHARS = 200
+# Instrumentation attributes holding prompts, answers, tool arguments or output; never written
+CONTENT_ATTRIBUTES = ("messages", "tool_arguments", "tool_response", "final_result", "model_request_parameters")
+# Set on every span started during a turn: the workspace whose trace file it goes to
+WORKSPACE_ATTRIBUTE = "nlcmd.workspace"
+
+# Workspace of the turn running in this context (CLI, cron job or served session)
+trace_workspace: ContextVar[Optional[str]] = ContextVar("trace_workspace", default=None)
+
+
+def _attributes(span: ReadableSpan) -> Dict[str, Any]:
+    kept = {}
+    for key, value in (span.attributes or {}).items():
+        if key.startswith("logfire.") or key.startswith("code.") or key == WORKSPACE_ATTRIBUTE or any(word in key for word in CONTENT_ATTRIBUTES):
+            continue
+        if isinstance(value, str) and len(value) > MAX_ATTRIBUTE_CHARS:
+            continue
+        if isinstance(value, (str, int, float, bool)):
+            kept[key] = value
+    return kept
+
+
+def span_record(span: ReadableSpan) -> Dict[str, Any]:
+    return {
+        "trace_id": format(span.context.trace_id, "032x"),
+        "span_id": format(span.context.span_id, "016x"),
+        "parent_id": format(span.parent.span_id, "016x") if span.parent is not None else None,
+        "name": span.name,
+        "start": span.start_time / 1e9,
+        "duration": (span.end_time - span.start_time) / 1e9,
+        "status": span.status.status_code.name.lower(),
+        "attributes": _attributes(span),
+    }
+
+
+class WorkspaceSpanProcessor(SpanProcessor):
+    """Stamps spans with the workspace of the turn they are started in, before they reach a batch thread."""
+
+    def on_start(self, span, parent_context=None):
+        workspace = trace_workspace.get()
+        if workspace is not None:
+            span.set_attribute(WORKSPACE_ATTRIBUTE, workspace)
+
+
+class JsonlSpanExporter(SpanExporter):
+    """
+    Writes finished spans as JSON lines to a local file, one rotation kept (trace.1.jsonl).
+    Only small scalar attributes are written, so prompts and command output stay out of the file.
+    Without a `path`, each span goes to the trace file of its turn's workspace; spans outside a turn are dropped.
+    """
+
+    def __init__(self, path: Optional[Path] = None, max_bytes: int = None):
+        self.path = Path(path) if path is not None else None
+        self.max_bytes = int(config.TRACE_MAX_MB * 1024 * 1024) if max_bytes is None else max_bytes
+        self._lock = threading.Lock()
+
+    def _path(self, span: ReadableSpan) -> Optional[Path]:
+        if self.path is not None:
+            return self.path
+        workspace = (span.attributes or {}).get(WORKSPACE_ATTRIBUTE)
+        return Path(workspace) / TRACE_FILE if workspace else None
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        files: Dict[Path, List[str]] = {}
+        for span in spans:
+            path = self._path(span)
+            if path is not None:
+                files.setdefault(path, []).append(json.dumps(span_record(span), ensure_ascii=False) + "\n")
+        try:
+            with self._lock:
+                for path, lines in files.items():
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    if path.exists() and path.stat().st_size > self.max_bytes:
+                        path.replace(path.with_name(path.stem + ".1.jsonl"))
+                    with open(path, "a", encoding="utf-8") as f:
+                        f.write("".join(lines))
+        except OSError:
+            return SpanExportResult.FAILURE
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+
+_configured = False
+_configure_lock = threading.Lock()
+
+
+def configure():
+    """
+    Local-only by default: spans reach Logfire only when LOGFIRE_TOKEN is set, and go to the trace file of
+    their turn's workspace if enabled. Runs once, on the first span, so importing nlcmd configures nothing.
+    """
+    global _configured
+    with _configure_lock:
+        if _configured:
+            return
+        _configured = True
+        processors = []
+        if config.TRACE_ENABLED:
+            processors += [WorkspaceSpanProcessor(), BatchSpanProcessor(JsonlSpanExporter())]
+        logfire.configure(send_to_logfire="if-token-present", additional_span_processors=processors)
+        logfire.instrument_pydantic_ai()
+
+
+def span(*args, **attributes):
+    configure()
+    return logfire.span(*args, **attributes)
+
+
+def read_spans(path: Path) -> Iterator[Dict[str, Any]]:
+    """Spans from the trace file and its rotation, oldest first."""
+    for file in (path.with_name(path.stem + ".1.jsonl"), path):
+        if not file.exists():
+            continue
+        with open(file, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+
+def span_key(record: Dict[str, Any]) -> str:
+    """Group name for a span: model requests by model, tool runs by tool, everything else by span name."""
+    attributes = record["attributes"]
+    if "gen_ai.tool.name" in attributes:
+        return f"tool {attributes['gen_ai.tool.name']}"
+    if record["name"].startswith("chat "):
+        return f"model {attributes.get('gen_ai.request.model', record['name'][5:])}"
+    return record["name"]
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def summarize(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Count, p50, p95, max and total duration per span group, slowest total first."""
+    groups: Dict[str, List[float]] = {}
+    for record in records:
+        groups.setdefault(span_key(record), []).append(record["duration"])
+    rows = [
+        {"span": key, "count": len(durations), "p50": percentile(durations, 0.5), "p95": percentile(durations, 0.95),
+         "max": max(durations), "total": sum(durations)}
+        for key, durations in groups.items()
+    ]
+    return sorted(rows, key=lambda row: row["total"], reverse=True)
+
+
+TURN_SPAN = "agent_execution"
+# Where a turn spent its time; nested spans of the same kind are only counted once
+TURN_PHASES = ("model", "first token", "tool", "confirmation", "command", "memory")
+
+
+def _phase(record: Dict[str, Any]) -> Optional[str]:
+    key = span_key(record)
+    if key.startswith("model "):
+        return "model"
+    if key.startswith("tool "):
+        return "tool"
+    if key == "confirmation wait":
+        return "confirmation"
+    if key == "command":
+        return "command"
+    if key.startswith("memory "):
+        return "memory"
+    return None
+
+
+def turn_breakdowns(records: List[Dict[str, Any]], last: int = 10) -> List[Dict[str, Any]]:
+    """Per turn: total time, time per phase, time to first token and history size, most recent last."""
+    turns = [r for r in records if r["name"] == TURN_SPAN][-last:]
+    by_trace: Dict[str, List[Dict[str, Any]]] = {}
+    for record in records:
+        by_trace.setdefault(record["trace_id"], []).append(record)
+
+    breakdowns = []
+    for turn in turns:
+        row = {"start": turn["start"], "total": turn["duration"], **{phase: 0.0 for phase in TURN_PHASES}}
+        row["route"] = turn["attributes"].get("route", "")
+        row["history_messages"] = turn["attributes"].get("history_messages", 0)
+        children = by_trace.get(turn["trace_id"], [])
+        ids = {r["span_id"]: r for r in children}
+        for record in children:
+            phase = _phase(record)
+            if phase is None:
+                continue
+            # Skip spans nested in a span of the same phase (e.g. a model call inside a tool)
+            parent = ids.get(record["parent_id"])
+            nested = False
+            while parent is not None:
+                if _phase(parent) == phase:
+                    nested = True
+                    break
+                parent = ids.get(parent["parent_id"])
+            if not nested:
+                row[phase] += record["duration"]
+            if "ttft" in record["attributes"] and not row["first token"]:
+                row["first token"] = record["attributes"]["ttft"]
+        breakdowns.append(row)
+    return breakdowns
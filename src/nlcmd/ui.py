@@ -1,3 +1,233 @@
+import asyncio
+import functools
+import sys
+import threading
+import time
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import ContextVar
+from typing import Any, Optional, TextIO
+
 from rich.console import Console
+from rich.live import Live
+from rich.markup import escape
+from rich.panel import Panel
+from rich.prompt import Confirm, InvalidResponse
+
+# Set by `nlcmd serve` in the task serving a remote session: that session's output stream and prompts
+session_output: ContextVar[Optional[TextIO]] = ContextVar("session_output", default=None)
+session_prompts: ContextVar[Optional["PromptQueue"]] = ContextVar("session_prompts", default=None)
+
+
+class _SessionFile:
+    """stdout, or the output of the remote session being served, so one console serves every session."""
+
+    def _target(self) -> TextIO:
+        return session_output.get() or sys.stdout
+
+    def write(self, text: str) -> int:
+        return self._target().write(text)
+
+    def flush(self):
+        self._target().flush()
+
+    def isatty(self) -> bool:
+        return self._target().isatty()
+
+    def __getattr__(self, name):
+        return getattr(self._target(), name)
+
+
+console = Console(file=_SessionFile())
+
+
+class PromptQueue:
+    """
+    Runs interactive prompts on a single input-reader thread so the event loop keeps serving
+    indexing, scheduler jobs and model streams while the user decides.
+    Prompts are answered in the order they are asked. Hold `turn()` around a prompt and the
+    output that introduces it (command panel, option list) so concurrent tools don't interleave.
+
+    A blocked `input()` cannot be interrupted, so when a prompt is cancelled (Ctrl+C, a cancelled
+    turn) its read is kept and the line the user types next goes to the next reader, e.g. the REPL.
+    """
+
+    def __init__(self):
+        self._reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="nlcmd-input")
+        self._turns = weakref.WeakKeyDictionary()
+        self._abandoned: Optional[Future] = None
+        self._abandoned_lock = threading.Lock()
+
+    def _remote(self) -> Optional["PromptQueue"]:
+        remote = session_prompts.get()
+        return remote if remote is not None and remote is not self else None
+
+    def turn(self) -> asyncio.Lock:
+        remote = self._remote()
+        if remote is not None:
+            return remote.turn()
+        # asyncio.Lock is bound to one loop; the REPL starts a new loop per query
+        loop = asyncio.get_running_loop()
+        lock = self._turns.get(loop)
+        if lock is None:
+            lock = self._turns[loop] = asyncio.Lock()
+        return lock
+
+    async def ask(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._reader, functools.partial(func, *args, **kwargs))
+
+    def _start_read(self, prompt, password: bool) -> Future:
+        with self._abandoned_lock:
+            read, self._abandoned = self._abandoned, None
+        if read is not None and not read.cancelled():
+            # The user answers the earlier, cancelled prompt's read; show this prompt instead
+            console.print(prompt, end="")
+            return read
+        return self._reader.submit(console.input, prompt, password=password)
+
+    def _abandon(self, read: Future):
+        with self._abandoned_lock:
+            self._abandoned = read
+
+    async def read_line(self, prompt="", password: bool = False) -> str:
+        """One line from the terminal, read on the reader thread."""
+        read = self._start_read(prompt, password)
+        try:
+            return await asyncio.shield(asyncio.wrap_future(read))
+        except asyncio.CancelledError:
+            self._abandon(read)
+            raise
+
+    def read_line_blocking(self, prompt="", password: bool = False) -> str:
+        """read_line for code outside an event loop (the REPL); Ctrl+C leaves the line to the next reader."""
+        read = self._start_read(prompt, password)
+        try:
+            return read.result()
+        except KeyboardInterrupt:
+            self._abandon(read)
+            raise
+
+    async def confirm(self, question: str, default: Any = ..., **kwargs) -> bool:
+        remote = self._remote()
+        if remote is not None:
+            return await remote.confirm(question, **({} if default is ... else {"default": default}), **kwargs)
+        # Confirm.ask's loop, with the line read through read_line so cancelling it is safe
+        prompt = Confirm(question, console=console, **kwargs)
+        while True:
+            prompt.pre_prompt()
+            value = await self.read_line(prompt.make_prompt(default), prompt.password)
+            if value == "" and default is not ...:
+                return default
+            try:
+                return prompt.process_response(value)
+            except InvalidResponse as error:
+                prompt.on_validate_error(value, error)
+
+    async def input(self, prompt: str) -> str:
+        remote = self._remote()
+        if remote is not None:
+            return await remote.input(prompt)
+        return await self.read_line(prompt)
+
+
+prompts = PromptQueue()
+
+
+class ResponseStream:
+    """
+    Receives an agent run as it happens: text deltas of model responses, tool calls and their results,
+    and the final answer. The base class ignores everything; see LiveResponseStream.
+    """
+
+    def text(self, delta: str):
+        pass
+
+    def tool_call(self, call_id: str, name: str, args: str):
+        pass
+
+    def tool_result(self, call_id: str, name: str, ok: bool):
+        pass
+
+    def finish(self, text: str):
+        pass
+
+    def close(self):
+        """Release the display; called once the run ends, also on errors and cancellation."""
+        pass
+
+
+class LiveResponseStream(ResponseStream):
+    """
+    Renders the answer panel while it is generated. The live region is paused whenever a tool runs so
+    command panels and confirmation prompts print normally. Without a terminal (cron, pipes) text is
+    written through as it arrives.
+    """
+
+    def __init__(self, console: Console = console, title: str = "AI Response", args_chars: int = 80):
+        self.console = console
+        self.title = title
+        self.args_chars = args_chars
+        self.finished = False
+        self._text = ""
+        self._live = None
+        self._calls = {}
+
+    def _panel(self) -> Panel:
+        return Panel(self._text, title=self.title, border_style="green")
+
+    def text(self, delta: str):
+        if not delta:
+            return
+        self._text += delta
+        if not self.console.is_terminal:
+            self.console.file.write(delta)
+            self.console.file.flush()
+        elif self._live is None:
+            # Transient: the finished panel is printed once by finish(), not left behind by the live region
+            self._live = Live(self._panel(), console=self.console, refresh_per_second=12, transient=True)
+            self._live.start()
+        else:
+            self._live.update(self._panel())
+
+    def _stop(self):
+        if self._live is not None:
+            self._live.stop()
+            self._live = None
+
+    def _end_text(self):
+        # Text before a tool call is the model commenting on what it is about to do
+        self._stop()
+        if self._text.strip() and self.console.is_terminal:
+            self.console.print(self._text.strip(), style="dim", markup=False)
+        elif self._text:
+            self.console.file.write("\n")
+        self._text = ""
+
+    def tool_call(self, call_id: str, name: str, args: str):
+        self._end_text()
+        self._calls[call_id] = time.monotonic()
+        if len(args) > self.args_chars:
+            args = args[:self.args_chars] + "..."
+        self.console.print(f"[dim]> {escape(name)}({escape(args)})[/dim]", highlight=False)
+
+    def tool_result(self, call_id: str, name: str, ok: bool):
+        started = self._calls.pop(call_id, None)
+        elapsed = f" {time.monotonic() - started:.1f}s" if started is not None else ""
+        status = "[green]done[/green]" if ok else "[yellow]retry[/yellow]"
+        self.console.print(f"[dim]< {escape(name)}[/dim] {status}[dim]{elapsed}[/dim]", highlight=False)
+
+    def finish(self, text: str):
+        self._stop()
+        self.finished = True
+        if not self.console.is_terminal:
+            if self._text:
+                self.console.file.write("\n")
+            elif text.strip():
+                self.console.print(text, markup=False)
+        elif text.strip():
+            self.console.print(Panel(text, title=self.title, border_style="green"))
+        self._text = ""
 
-console = Console()
+    def close(self):
+        self._stop()
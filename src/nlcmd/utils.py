@@ -1,30 +1,65 @@
 import os
 import sys
 import re
+import codecs
 import tempfile
 import platform
+import shlex
+import shutil
+import signal
 import asyncio
+import subprocess
+import time
+import tomllib
+import uuid
+from datetime import datetime
 from pathlib import Path
+from typing import Callable, Dict, Literal, NamedTuple, Optional, Sequence
+from pydantic import BaseModel, ValidationError
 from rich.syntax import Syntax
 from rich.panel import Panel
-from rich.prompt import Confirm
 
 from nlcmd import config
-from nlcmd.ui import console
+from nlcmd.ui import console, prompts
+from nlcmd.session import get_session, kill_process_tree, shell_owner
+from nlcmd.pyworker import get_pool
+from nlcmd.journal import get_journal
+from nlcmd.tracing import span
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
 
 class WorkspaceError(Exception):
     """Exception raised when workspace directory cannot be created or accessed."""
     pass
 
-def _ensure_workspace_dir(cwd: str = None) -> str:
+class ResolvedWorkspace(NamedTuple):
+    """An absolute, existing workspace directory. Obtain it from resolve_workspace(), which caches it."""
+    path: Path
+
+    def __str__(self) -> str:
+        return str(self.path)
+
+    def contains(self, path) -> bool:
+        """Whether an already resolved path is the workspace or inside it. Pure path arithmetic, no syscalls."""
+        return Path(path).is_relative_to(self.path)
+
+_workspaces: Dict[str, ResolvedWorkspace] = {}
+
+def resolve_workspace(cwd: str = None) -> ResolvedWorkspace:
     """
-    Ensure the workspace directory exists and is accessible.
-    Returns the absolute path to the workspace directory.
-    Raises WorkspaceError if the directory cannot be created.
+    Resolve, create if missing and validate a workspace directory once; later calls are a dict lookup.
+    Entries are dropped with forget_workspace() when running in them fails, so a deleted workspace is recreated.
+    Raises WorkspaceError if the directory cannot be created or is not a directory.
     """
-    work_dir = Path(cwd) if cwd else config.WORKSPACE
-    work_dir = work_dir.resolve()
-    
+    key = str(cwd) if cwd else str(config.WORKSPACE)
+    workspace = _workspaces.get(key)
+    if workspace is not None:
+        return workspace
+
+    work_dir = Path(key).resolve()
     if not work_dir.exists():
         try:
             work_dir.mkdir(parents=True, exist_ok=True)
@@ -37,7 +72,26 @@ def _ensure_workspace_dir(cwd: str = None) -> str:
     if not work_dir.is_dir():
         raise WorkspaceError(f"Workspace path '{work_dir}' exists but is not a directory")
     
-    return str(work_dir)
+    workspace = ResolvedWorkspace(work_dir)
+    # Callers pass the resolved string back in (e.g. execute_prepared_command_async), so cache it under both keys
+    _workspaces[key] = _workspaces[str(work_dir)] = workspace
+    return workspace
+
+def forget_workspace(cwd: str = None):
+    """Drop a cached workspace so the next resolve_workspace() checks the filesystem again."""
+    key = str(cwd) if cwd else str(config.WORKSPACE)
+    workspace = _workspaces.pop(key, None)
+    if workspace is not None:
+        for other in [k for k, v in _workspaces.items() if v == workspace]:
+            del _workspaces[other]
+
+def _ensure_workspace_dir(cwd: str = None) -> str:
+    """
+    Ensure the workspace directory exists and is accessible.
+    Returns the absolute path to the workspace directory.
+    Raises WorkspaceError if the directory cannot be created.
+    """
+    return str(resolve_workspace(cwd).path)
 
 def _quote_arg(arg: str) -> str:
     if (arg.startswith('"') and arg.endswith('"')) or (arg.startswith("'") and arg.endswith("'")):
@@ -56,94 +110,732 @@ def build_powershell_command(cmd: str) -> str:
     args_q = " ".join(_quote_arg(a) for a in args)
     return f"[Console]::OutputEncoding = [System.Text.Encoding]::UTF8; & {head_q} {args_q}".strip()
 
+PYTHON_COMMANDS = {"python", "python3", "py"}
+SHELL_OPERATOR_CHARS = set("();<>|&")
+
+def parse_python_c(cmd: str) -> Optional[tuple[str, list[str]]]:
+    """
+    Return (code, args) when `cmd` is exactly `python -c <code> [args...]`, i.e. nothing the shell would
+    expand, redirect or pipe. Such snippets can run on a warm worker instead of through the shell.
+    """
+    if "$" in cmd or "`" in cmd:
+        return None
+    try:
+        lexer = shlex.shlex(cmd, posix=True, punctuation_chars=True)
+        lexer.whitespace_split = True
+        tokens = list(lexer)
+    except ValueError:
+        return None
+    if len(tokens) < 3 or tokens[0].lower() not in PYTHON_COMMANDS or tokens[1] != "-c":
+        return None
+    if any(token and set(token) <= SHELL_OPERATOR_CHARS for token in tokens[2:]):
+        return None
+    return tokens[2], tokens[3:]
+
 def transform_python_c(cmd: str):
-    m = re.match(r'^\s*(python|py)\s+-c\s+(.+)$', cmd, re.IGNORECASE | re.DOTALL)
-    if not m:
+    """Write a plain `python -c` snippet to a temp script and return (command running it, script path)."""
+    snippet = parse_python_c(cmd)
+    if snippet is None:
         return cmd, None
-    code = m.group(2).strip()
-    if (code.startswith('"') and code.endswith('"')) or (code.startswith("'") and code.endswith("'")):
-        code = code[1:-1]
+    code, args = snippet
     try:
         tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".py", mode="w", encoding="utf-8")
         tmp.write(code)
         tmp.flush()
         tmp.close()
-        new_cmd = f"\"{sys.executable}\" \"{tmp.name}\""
+        new_cmd = " ".join([f"\"{sys.executable}\"", f"\"{tmp.name}\"", *(_quote_arg(a) for a in args)])
         return new_cmd, tmp.name
     except Exception:
         return cmd, None
 
 def prepare_shell_command(cmd: str) -> tuple[str, str, str]:
-    """Prepare a shell command for execution. Returns (display_cmd, execution_cmd, cleanup_path)."""
+    """
+    Prepare a shell command for execution. Returns (display_cmd, execution_cmd, cleanup_path).
+    `python -c` snippets are rewritten at execution time, so nothing is written to disk before the user confirms.
+    """
     cmd = cmd.strip()
-    cmd, cleanup_path = transform_python_c(cmd)
-    return cmd, cmd, cleanup_path
+    return cmd, cmd, None
+
+# Commands that only read. Anything with an option in READ_ONLY_REJECTED_OPTIONS writes or runs other programs.
+READ_ONLY_COMMANDS = {
+    "ls", "dir", "pwd", "cat", "head", "tail", "wc", "stat", "du", "df", "free", "uptime", "uname", "whoami",
+    "id", "date", "which", "echo", "grep", "egrep", "fgrep", "tree", "ps", "nproc", "basename", "dirname",
+    "realpath", "readlink", "md5sum", "sha1sum", "sha256sum", "find", "git", "hostname", "env", "printenv",
+    # PowerShell (matched case-insensitively, like PowerShell itself)
+    "get-childitem", "get-content", "get-location", "get-date", "get-process", "get-psdrive", "get-item",
+    "test-path", "select-string", "measure-object", "select-object", "sort-object", "format-table", "format-list",
+}
+READ_ONLY_REJECTED_OPTIONS = {
+    "tail": ("-f", "-F", "--follow"),
+    "date": ("-s", "--set"),
+    "tree": ("-o",),
+    "find": ("-delete", "-exec", "-execdir", "-ok", "-okdir", "-fprint", "-fprint0", "-fprintf", "-fls"),
+    # `git status -v` prints a diff
+    "git": ("-v", "-vv", "--verbose"),
+}
+# Git commands that produce no diffs: diff, log, show and blame can run external diff drivers and textconv
+# filters from the repository's config or .gitattributes
+GIT_READ_ONLY = {"status", "ls-files", "rev-parse", "describe", "shortlog"}
+# Environment of speculated commands: git takes no optional locks and starts no fsmonitor hook
+SPECULATION_ENV = {
+    "GIT_OPTIONAL_LOCKS": "0",
+    "GIT_CONFIG_COUNT": "1",
+    "GIT_CONFIG_KEY_0": "core.fsmonitor",
+    "GIT_CONFIG_VALUE_0": "false",
+}
+# Operators that separate commands; every command around them has to be read-only
+COMMAND_SEPARATORS = {"|", "||", "&&", ";"}
 
-async def execute_prepared_command_async(cmd: str, cleanup_path: str = None, cwd: str = None) -> str:
-    """Execute a previously prepared shell command asynchronously using asyncio.subprocess."""
+def _read_only_segment(tokens: list) -> bool:
+    if not tokens:
+        return False
+    name = tokens[0]
+    if "/" in name or "\\" in name or "=" in name:
+        # A script path or a variable assignment, not a known program
+        return False
+    name = name.lower()
+    if name not in READ_ONLY_COMMANDS:
+        return False
+    args = tokens[1:]
+    if any(arg.startswith("--output") for arg in args):
+        return False
+    rejected = READ_ONLY_REJECTED_OPTIONS.get(name, ())
+    if any(arg == option or (option.startswith("--") and arg.startswith(option + "=")) for arg in args for option in rejected):
+        return False
+    if name == "git":
+        return bool(args) and args[0] in GIT_READ_ONLY
+    if name in ("hostname", "env"):
+        # With arguments they set the hostname or run another command
+        return not args
+    return True
+
+def is_read_only(cmd: str) -> bool:
+    """
+    Whether a command provably only reads: known read-only programs joined by pipes or command separators,
+    with no expansion, substitution, background jobs or redirection other than to /dev/null.
+    Anything not recognized is treated as not read-only.
+    """
+    if not cmd.strip() or any(c in cmd for c in "$`\n\r"):
+        return False
     try:
-        work_dir = _ensure_workspace_dir(cwd)
-        console.print(f"[dim]Executing: {cmd}[/dim]")
-        console.print(f"[dim]Working directory: {work_dir}[/dim]")
-        
+        lexer = shlex.shlex(cmd, posix=True, punctuation_chars=True)
+        lexer.whitespace_split = True
+        tokens = list(lexer)
+    except ValueError:
+        return False
+
+    segment = []
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token in COMMAND_SEPARATORS:
+            if not _read_only_segment(segment):
+                return False
+            segment = []
+        elif token in (">", ">>") and i + 1 < len(tokens) and tokens[i + 1] == "/dev/null":
+            i += 1
+        elif token == ">&" and i + 1 < len(tokens) and tokens[i + 1] in ("1", "2"):
+            i += 1
+        elif token and set(token) <= SHELL_OPERATOR_CHARS:
+            return False
+        else:
+            segment.append(token)
+        i += 1
+    return _read_only_segment(segment)
+
+# Seconds a killed process group gets between SIGTERM and SIGKILL, and to drain its pipes afterwards
+KILL_GRACE_PERIOD = 2.0
+STREAM_CHUNK_SIZE = 65536
+
+def resolve_timeout(timeout: float = None) -> float | None:
+    """Effective timeout for one command: the requested value (or COMMAND_TIMEOUT), capped at COMMAND_TIMEOUT_MAX. 0 disables."""
+    timeout = config.COMMAND_TIMEOUT if timeout is None else timeout
+    if config.COMMAND_TIMEOUT_MAX > 0:
+        timeout = min(timeout, config.COMMAND_TIMEOUT_MAX) if timeout > 0 else config.COMMAND_TIMEOUT_MAX
+    return timeout if timeout > 0 else None
+
+SANDBOX_FILE = "sandbox.toml"
+SANDBOX_BACKENDS = ("subprocess", "rlimit", "bwrap", "session")
+MB = 1024 * 1024
+
+class SandboxConfig(BaseModel):
+    """Execution backend and resource limits, read from `<workspace>/sandbox.toml`. Unset limits are not applied."""
+    backend: Literal["subprocess", "rlimit", "bwrap", "session"] = "subprocess"
+    cpu_seconds: Optional[int] = None
+    memory_mb: Optional[int] = None
+    file_size_mb: Optional[int] = None
+    # RLIMIT_NPROC counts every process of the user, not just the command's
+    nproc: Optional[int] = None
+    max_output_mb: float = 10
+    network: bool = True
+
+    def rlimits(self) -> list[tuple[int, int]]:
+        if resource is None:
+            return []
+        limits = [
+            (getattr(resource, "RLIMIT_CPU", None), self.cpu_seconds),
+            (getattr(resource, "RLIMIT_AS", None), self.memory_mb and self.memory_mb * MB),
+            (getattr(resource, "RLIMIT_FSIZE", None), self.file_size_mb and self.file_size_mb * MB),
+            (getattr(resource, "RLIMIT_NPROC", None), self.nproc),
+        ]
+        return [(which, value) for which, value in limits if which is not None and value]
+
+# Receives a command's output as it arrives: the stream name ("stdout" or "stderr") and decoded text
+OutputCallback = Callable[[str, str], None]
+
+class ExecResult(NamedTuple):
+    stdout: str
+    stderr: str
+    returncode: Optional[int]
+    timed_out: bool = False
+    # Bytes of output discarded over max_output_mb
+    stdout_dropped: int = 0
+    stderr_dropped: int = 0
+    # Set when the command ran in a fresh shell because the previous session had died
+    restarted: bool = False
+
+_sandbox_cache: dict[str, tuple[int, SandboxConfig]] = {}
+
+def load_sandbox_config(work_dir: str) -> SandboxConfig:
+    """
+    Load the sandbox settings for a workspace. `sandbox.toml` keys override the SANDBOX_BACKEND default.
+    Raises WorkspaceError if the file is invalid.
+    """
+    path = Path(work_dir) / SANDBOX_FILE
+    try:
+        mtime_ns = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return SandboxConfig(backend=config.SANDBOX_BACKEND)
+
+    cached = _sandbox_cache.get(str(path))
+    if cached and cached[0] == mtime_ns:
+        return cached[1]
+    try:
+        with open(path, "rb") as f:
+            settings = {"backend": config.SANDBOX_BACKEND, **tomllib.load(f)}
+        sandbox = SandboxConfig(**settings)
+    except (tomllib.TOMLDecodeError, ValidationError) as e:
+        raise WorkspaceError(f"Invalid sandbox configuration '{path}': {e}")
+    _sandbox_cache[str(path)] = (mtime_ns, sandbox)
+    return sandbox
+
+class Executor:
+    """Starts a shell command in its own process group (so a timeout or Ctrl+C can take down its children too)."""
+    name = "subprocess"
+    python_workers = True
+
+    def __init__(self, sandbox: SandboxConfig = None, env: Dict[str, str] = None):
+        self.sandbox = sandbox or SandboxConfig()
+        # Extra environment variables for the commands this executor spawns
+        self.env = env
+
+    def command(self, cmd: str, work_dir: str, ro_paths: Sequence[str] = ()) -> str:
         if platform.system() == "Windows" and str(getattr(config, "DEFAULT_SHELL", "")).lower().find("powershell") != -1:
-            ps_cmd = build_powershell_command(cmd)
-            process = await asyncio.create_subprocess_shell(
-                f'powershell -NoProfile -Command "{ps_cmd}"',
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-                cwd=work_dir,
-            )
+            return f'powershell -NoProfile -Command "{build_powershell_command(cmd)}"'
+        return cmd
+
+    def preexec(self):
+        return None
+
+    async def spawn(self, cmd: str, work_dir: str, ro_paths: Sequence[str] = ()) -> asyncio.subprocess.Process:
+        if platform.system() == "Windows":
+            group = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
         else:
-            process = await asyncio.create_subprocess_shell(
-                cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-                cwd=work_dir,
-            )
+            group = {"start_new_session": True, "preexec_fn": self.preexec()}
+        return await asyncio.create_subprocess_shell(
+            self.command(cmd, work_dir, ro_paths),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=work_dir,
+            env={**os.environ, **self.env} if self.env else None,
+            **group,
+        )
+
+    async def run(self, cmd: str, work_dir: str, timeout: float = None, ro_paths: Sequence[str] = (),
+                  on_output: OutputCallback = None) -> ExecResult:
+        """
+        Run a command to completion. It is killed with its process group after `timeout` seconds
+        or when the calling task is cancelled (Ctrl+C); output produced until then is returned.
+        Captured output is also passed to `on_output` as it is read.
+        """
+        process = await self.spawn(cmd, work_dir, ro_paths)
+        output_limit = int(self.sandbox.max_output_mb * MB)
+        stdout_chunks, stderr_chunks = [], []
+        readers = [
+            asyncio.create_task(_read_stream(process.stdout, stdout_chunks, output_limit, on_output and (lambda text: on_output("stdout", text)))),
+            asyncio.create_task(_read_stream(process.stderr, stderr_chunks, output_limit, on_output and (lambda text: on_output("stderr", text)))),
+        ]
         
-        stdout_bytes, stderr_bytes = await process.communicate()
-        stdout = stdout_bytes.decode('utf-8', errors='replace') if stdout_bytes else ""
-        stderr = stderr_bytes.decode('utf-8', errors='replace') if stderr_bytes else ""
+        timed_out = False
+        try:
+            await asyncio.wait_for(process.wait(), timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            await kill_process_group(process)
+        except asyncio.CancelledError:
+            await asyncio.shield(kill_process_group(process))
+            for reader in readers:
+                reader.cancel()
+            raise
         
-        if cleanup_path and os.path.isfile(cleanup_path):
-            try:
-                os.remove(cleanup_path)
-            except Exception:
-                pass
-                
-        output_parts = []
-        if stdout:
-            console.print(Panel(stdout, title="Output", border_style="green"))
-            output_parts.append(f"Stdout:\n{stdout}")
-                
-        if stderr:
-            console.print(Panel(stderr, title="Error Output", border_style="red"))
-            output_parts.append(f"Stderr:\n{stderr}")
-            
-        if process.returncode != 0:
-            console.print(f"[bold red]Command failed with exit code {process.returncode}[/bold red]")
-            output_parts.append(f"Exit Code: {process.returncode}")
+        # A daemonized grandchild may still hold the pipes open; don't wait on it forever
+        _, pending = await asyncio.wait(readers, timeout=KILL_GRACE_PERIOD)
+        for reader in pending:
+            reader.cancel()
+        stdout_dropped, stderr_dropped = (reader.result() if reader not in pending else 0 for reader in readers)
+        
+        return ExecResult(
+            stdout=b"".join(stdout_chunks).decode('utf-8', errors='replace'),
+            stderr=b"".join(stderr_chunks).decode('utf-8', errors='replace'),
+            returncode=process.returncode,
+            timed_out=timed_out,
+            stdout_dropped=stdout_dropped,
+            stderr_dropped=stderr_dropped,
+        )
+
+    async def run_python(self, code: str, args: Sequence[str], work_dir: str, timeout: float = None) -> ExecResult:
+        """Run a `python -c` snippet on a pre-started worker interpreter, under this executor's resource limits."""
+        limits = tuple(self.sandbox.rlimits()) if isinstance(self, RlimitExecutor) else ()
+        pool = get_pool(limits)
+        output_limit = int(self.sandbox.max_output_mb * MB)
+        worker = await asyncio.to_thread(pool.acquire)
+        try:
+            result = await asyncio.to_thread(pool.communicate, worker, code, work_dir, args, timeout, output_limit)
+        except asyncio.CancelledError:
+            await asyncio.to_thread(kill_process_tree, worker)
+            raise
+        return ExecResult(
+            stdout=result.stdout.decode('utf-8', errors='replace'),
+            stderr=result.stderr.decode('utf-8', errors='replace'),
+            returncode=result.returncode,
+            timed_out=result.timed_out,
+            stdout_dropped=result.stdout_dropped,
+            stderr_dropped=result.stderr_dropped,
+        )
+
+class RlimitExecutor(Executor):
+    """Applies CPU time, address space, file size and process count limits in the child before exec."""
+    name = "rlimit"
+
+    def preexec(self):
+        limits = self.sandbox.rlimits()
+        if not limits:
+            return None
+        def apply_limits():
+            for which, value in limits:
+                resource.setrlimit(which, (value, value))
+        return apply_limits
+
+class BubblewrapExecutor(RlimitExecutor):
+    """
+    Runs the command under bubblewrap with fresh namespaces: the host filesystem is read-only,
+    only the workspace is writable, /tmp is private and the network is optional. Resource limits still apply.
+    """
+    name = "bwrap"
+    # Snippets must see the same read-only filesystem as everything else, so they go through bwrap too
+    python_workers = False
+
+    @staticmethod
+    def available() -> bool:
+        return platform.system() == "Linux" and shutil.which("bwrap") is not None
+
+    def command(self, cmd: str, work_dir: str, ro_paths: Sequence[str] = ()) -> str:
+        args = [
+            "bwrap", "--ro-bind", "/", "/", "--dev", "/dev", "--proc", "/proc", "--tmpfs", "/tmp",
+            "--bind", work_dir, work_dir, "--unshare-all", "--die-with-parent", "--chdir", work_dir,
+        ]
+        for path in ro_paths:
+            args += ["--ro-bind", path, path]
+        if self.sandbox.network:
+            args.append("--share-net")
+        args += ["/bin/sh", "-c", cmd]
+        return shlex.join(args)
+
+class ShellSessionExecutor(RlimitExecutor):
+    """
+    Runs commands in one long-lived shell per workspace, so `cd`, `export` and shell variables carry over
+    between steps and no shell is spawned per command. A timeout or cancel kills the session; the next
+    command starts a fresh one. Resource limits apply to every process the session starts.
+    """
+    name = "session"
+    # Snippets must see the session's cwd and exported variables, which a pooled worker does not have
+    python_workers = False
+
+    def __init__(self, sandbox: SandboxConfig = None, env: Dict[str, str] = None, owner: str = None):
+        super().__init__(sandbox, env)
+        # Served clients (nlcmd serve) each get their own shell in a shared workspace
+        self.owner = owner
+
+    async def run(self, cmd: str, work_dir: str, timeout: float = None, ro_paths: Sequence[str] = (),
+                  on_output: OutputCallback = None) -> ExecResult:
+        # The session hands back a command's output once it finished, so `on_output` gets it in one piece
+        session = get_session(work_dir, self.preexec(), owner=self.owner)
+        output_limit = int(self.sandbox.max_output_mb * MB)
+        try:
+            result = await asyncio.to_thread(session.run, cmd, timeout, output_limit)
+        except asyncio.CancelledError:
+            # Killing the shell unblocks the worker thread
+            session.close()
+            raise
+        exec_result = ExecResult(
+            stdout=result.stdout.decode('utf-8', errors='replace'),
+            stderr=result.stderr.decode('utf-8', errors='replace'),
+            returncode=result.returncode,
+            timed_out=result.timed_out,
+            stdout_dropped=result.stdout_dropped,
+            stderr_dropped=result.stderr_dropped,
+            restarted=result.restarted,
+        )
+        _deliver(exec_result, on_output)
+        return exec_result
+
+EXECUTORS = {"subprocess": Executor, "rlimit": RlimitExecutor, "bwrap": BubblewrapExecutor, "session": ShellSessionExecutor}
+
+def get_executor(work_dir: str) -> Executor:
+    """Pick the executor configured for a workspace, degrading to the strongest backend this host supports."""
+    sandbox = load_sandbox_config(work_dir)
+    backend = sandbox.backend
+    if backend == "bwrap" and not BubblewrapExecutor.available():
+        console.print("[yellow]bubblewrap is not available, falling back to the rlimit sandbox.[/yellow]")
+        backend = "rlimit"
+    if backend == "rlimit" and resource is None:
+        backend = "subprocess"
+    if backend == "session":
+        return ShellSessionExecutor(sandbox, owner=shell_owner.get())
+    return EXECUTORS[backend](sandbox)
+
+async def _read_stream(stream: asyncio.StreamReader, chunks: list, limit: int, on_text: Callable[[str], None] = None) -> int:
+    """
+    Collect up to `limit` bytes and keep draining the rest so the command never blocks on a full pipe.
+    Kept bytes are also passed to `on_text` as decoded text. Returns bytes dropped.
+    """
+    kept = dropped = 0
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    while chunk := await stream.read(STREAM_CHUNK_SIZE):
+        room = max(limit - kept, 0)
+        if room:
+            chunks.append(chunk[:room])
+            kept += min(room, len(chunk))
+            if on_text is not None:
+                on_text(decoder.decode(chunk[:room]))
+        dropped += max(len(chunk) - room, 0)
+    if on_text is not None:
+        on_text(decoder.decode(b"", final=True))
+    return dropped
+
+def _deliver(result: ExecResult, on_output: Optional[OutputCallback]):
+    """For executors that only get output once the command finished: pass it to `on_output` in one piece."""
+    if on_output is not None:
+        for name in ("stdout", "stderr"):
+            if getattr(result, name):
+                on_output(name, getattr(result, name))
+
+async def kill_process_group(process: asyncio.subprocess.Process):
+    """Terminate a command started by an `Executor` together with everything it started."""
+    if process.returncode is not None:
+        return
+    if platform.system() == "Windows":
+        killer = await asyncio.create_subprocess_exec(
+            "taskkill", "/F", "/T", "/PID", str(process.pid),
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL,
+        )
+        await killer.wait()
+    else:
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            return
+        try:
+            await asyncio.wait_for(process.wait(), KILL_GRACE_PERIOD)
+            return
+        except asyncio.TimeoutError:
+            pass
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            return
+    await process.wait()
+
+def _remove_file(path: Optional[str]):
+    if path and os.path.isfile(path):
+        try:
+            os.remove(path)
+        except Exception:
+            pass
+
+# Full output of long commands is kept here (relative to the workspace) so the model can page through it
+SPILL_DIR = Path(".nlcmd") / "output"
+SPILL_KEEP = 200
+
+def _clip_middle(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    half = limit // 2
+    return f"{text[:half]}\n... [{len(text) - 2 * half} characters omitted] ...\n{text[-half:]}"
+
+class CommandResult(BaseModel):
+    """
+    Outcome of one shell command. `render()` is the compact text given to the model; `to_json()` is the full
+    record for scripts, cron jobs and the journal.
+    """
+    command: str
+    cwd: str = ""
+    # ok / failed / timed_out / error / dry_run / declined
+    status: str = "ok"
+    exit_code: Optional[int] = None
+    executor: str = ""
+    started_at: Optional[datetime] = None
+    duration: float = 0.0
+    timeout: Optional[float] = None
+    stdout: str = ""
+    stderr: str = ""
+    # Bytes the command wrote, including any discarded over the sandbox's max_output_mb
+    stdout_bytes: int = 0
+    stderr_bytes: int = 0
+    stdout_truncated: bool = False
+    stderr_truncated: bool = False
+    # Set when a stream was longer than the model's output budget and was saved in full
+    stdout_path: Optional[str] = None
+    stderr_path: Optional[str] = None
+    restarted: bool = False
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "ok"
+
+    @classmethod
+    def from_exec(cls, cmd: str, result: ExecResult, **fields) -> "CommandResult":
+        if result.timed_out:
+            status = "timed_out"
         else:
-            console.print("[bold green]Command executed successfully![/bold green]")
-            
-        return "\n".join(output_parts) if output_parts else "Command executed with no output"
+            status = "ok" if result.returncode == 0 else "failed"
+        return cls(
+            command=cmd,
+            status=status,
+            exit_code=result.returncode,
+            stdout=result.stdout,
+            stderr=result.stderr,
+            stdout_bytes=len(result.stdout.encode("utf-8")) + result.stdout_dropped,
+            stderr_bytes=len(result.stderr.encode("utf-8")) + result.stderr_dropped,
+            stdout_truncated=result.stdout_dropped > 0,
+            stderr_truncated=result.stderr_dropped > 0,
+            restarted=result.restarted,
+            **fields,
+        )
+
+    def spill(self, directory: Path, max_chars: int):
+        """Save streams longer than `max_chars` to files under `directory`, pruning the oldest spill files."""
+        long_streams = [name for name in ("stdout", "stderr") if len(getattr(self, name)) > max_chars]
+        if not long_streams:
+            return
+        directory.mkdir(parents=True, exist_ok=True)
+        stamp = (self.started_at or datetime.now()).strftime("%Y%m%d-%H%M%S") + f"-{uuid.uuid4().hex[:8]}"
+        for name in long_streams:
+            path = directory / f"{stamp}.{name}.txt"
+            path.write_text(getattr(self, name), encoding="utf-8")
+            setattr(self, f"{name}_path", str(path))
+        old = sorted(directory.glob("*.txt"), key=lambda p: p.name)[:-SPILL_KEEP]
+        for path in old:
+            _remove_file(str(path))
+
+    def render(self, max_chars: int = None) -> str:
+        """Compact text for the model: status line, then each stream clipped to `max_chars` (head and tail)."""
+        if self.status == "dry_run":
+            return "Dry run: Command not executed"
+        if self.status == "declined":
+            return "Execution cancelled by user"
+        if self.status == "error":
+            return f"Error: {self.error}"
+
+        max_chars = config.COMMAND_OUTPUT_CHARS if max_chars is None else max_chars
+        if self.status == "timed_out":
+            killed = "the shell session was killed and will restart" if self.executor == "session" else "the command and its child processes were killed"
+            head = f"Timed out after {self.timeout:g}s; {killed}. Partial output follows."
+        else:
+            head = f"Exit code: {self.exit_code}"
+        lines = [f"{head} ({self.duration:.2f}s)"]
+        if self.restarted:
+            lines.append("Note: the previous shell session had ended; this command ran in a new session, so earlier cd/export state is gone.")
+
+        for name in ("stdout", "stderr"):
+            text = getattr(self, name)
+            if not text:
+                continue
+            notes = []
+            if len(text) > max_chars:
+                notes.append(f"{getattr(self, name + '_bytes')} bytes, showing start and end")
+            if getattr(self, name + "_path"):
+                notes.append(f"full output: {getattr(self, name + '_path')}")
+            if getattr(self, name + "_truncated"):
+                notes.append("capture limit reached, the rest was discarded")
+            label = name.capitalize() + (f" ({'; '.join(notes)})" if notes else "")
+            lines.append(f"{label}:\n{_clip_middle(text, max_chars)}")
+        if not self.stdout and not self.stderr:
+            lines.append("No output")
+        return "\n".join(lines)
+
+    def to_json(self, include_output: bool = True) -> str:
+        return self.model_dump_json(exclude=None if include_output else {"stdout", "stderr"})
+
+    def __str__(self) -> str:
+        return self.render()
+
+async def run_command(cmd: str, work_dir: str, timeout: float = None, cleanup_path: str = None, executor: Executor = None, output_chars: int = None, journal: bool = True, on_output: OutputCallback = None, spill: bool = True) -> CommandResult:
+    """
+    Run a prepared command with the workspace's executor without printing anything. Plain `python -c`
+    snippets go to a warm worker; other snippets are written to a temp script that is removed afterwards.
+    Streams longer than `output_chars` (default COMMAND_OUTPUT_CHARS) are spilled to files in the workspace.
+    With `journal=False` and `spill=False` the caller decides whether the result is recorded and spilled
+    (see speculative execution).
+    `on_output` receives the output as it arrives (in one piece from executors that cannot stream it).
+    """
+    executor = executor or get_executor(work_dir)
+    started_at = datetime.now()
+    start = time.perf_counter()
+    try:
+        snippet = parse_python_c(cmd) if executor.python_workers and config.PYTHON_WORKERS > 0 else None
+        with span("command", executor=executor.name, python_worker=snippet is not None) as command_span:
+            if snippet is not None:
+                result = await executor.run_python(*snippet, work_dir, timeout)
+                _deliver(result, on_output)
+            else:
+                exec_cmd, cleanup_path = transform_python_c(cmd) if cleanup_path is None else (cmd, cleanup_path)
+                result = await executor.run(exec_cmd, work_dir, timeout, ro_paths=[cleanup_path] if cleanup_path else (), on_output=on_output)
+            command_span.set_attribute("returncode", result.returncode if result.returncode is not None else -1)
+            command_span.set_attribute("timed_out", result.timed_out)
+    except OSError:
+        # Most likely the workspace was removed or replaced since it was resolved; check it again next time
+        forget_workspace(work_dir)
+        raise
+    finally:
+        _remove_file(cleanup_path)
+
+    command_result = CommandResult.from_exec(
+        cmd,
+        result,
+        cwd=work_dir,
+        executor=executor.name,
+        started_at=started_at,
+        duration=time.perf_counter() - start,
+        timeout=timeout,
+    )
+    if spill:
+        command_result.spill(Path(work_dir) / SPILL_DIR, config.COMMAND_OUTPUT_CHARS if output_chars is None else output_chars)
+    if journal and config.JOURNAL_ENABLED:
+        get_journal(work_dir).record(command_result)
+    return command_result
+
+def _print_result(result: CommandResult, executor: Executor, timeout: float = None, note: str = ""):
+    if result.stdout:
+        console.print(Panel(result.stdout, title="Output", border_style="green"))
+    if result.stderr:
+        console.print(Panel(result.stderr, title="Error Output", border_style="red"))
+    for name in ("stdout", "stderr"):
+        if getattr(result, f"{name}_truncated"):
+            console.print(f"[yellow]{name} exceeded the {executor.sandbox.max_output_mb:g} MB capture limit and was truncated.[/yellow]")
+        
+    if result.status == "timed_out":
+        console.print(f"[bold red]Command timed out after {timeout:g}s[/bold red]")
+    elif result.status == "failed":
+        console.print(f"[bold red]Command failed with exit code {result.exit_code}[/bold red]")
+    else:
+        console.print(f"[bold green]Command executed successfully![/bold green] [dim]({result.duration:.2f}s{note})[/dim]")
+
+async def execute_prepared_command_async(cmd: str, cleanup_path: str = None, cwd: str = None, timeout: float = None) -> CommandResult:
+    """
+    Execute a previously prepared shell command asynchronously with the workspace's executor.
+    The command is killed with its process group after `timeout` seconds (default config.COMMAND_TIMEOUT)
+    or when the calling task is cancelled (Ctrl+C); output produced until then is returned.
+    """
+    try:
+        work_dir = _ensure_workspace_dir(cwd)
+        timeout = resolve_timeout(timeout)
+        console.print(f"[dim]Executing: {cmd}[/dim]")
+        console.print(f"[dim]Working directory: {work_dir}[/dim]")
+        
+        executor = get_executor(work_dir)
+        if executor.name != "subprocess":
+            console.print(f"[dim]Executor: {executor.name}[/dim]")
+        try:
+            result = await run_command(cmd, work_dir, timeout, cleanup_path=cleanup_path, executor=executor)
+        except asyncio.CancelledError:
+            console.print("[yellow]Command cancelled.[/yellow]")
+            raise
+        
+        _print_result(result, executor, timeout)
+        return result
         
     except Exception as e:
         console.print(f"[bold red]Execution failed:[/bold red] {e}")
-        return f"Error: {str(e)}"
+        return CommandResult(command=cmd, cwd=str(cwd or ""), status="error", error=str(e))
+    finally:
+        _remove_file(cleanup_path)
 
-def execute_prepared_command(cmd: str, cleanup_path: str = None, cwd: str = None) -> str:
+def execute_prepared_command(cmd: str, cleanup_path: str = None, cwd: str = None, timeout: float = None) -> CommandResult:
     """Execute a previously prepared shell command (synchronous wrapper for backward compatibility)."""
-    return asyncio.run(execute_prepared_command_async(cmd, cleanup_path, cwd))
+    return asyncio.run(execute_prepared_command_async(cmd, cleanup_path, cwd, timeout))
+
+# Backends that sandbox a fresh process per command; only these run unconfirmed commands
+SPECULATIVE_EXECUTORS = ("rlimit", "bwrap")
+
+class _Speculation(NamedTuple):
+    task: asyncio.Task
+    cmd: str
+    work_dir: str
+    executor: Executor
+    timeout: Optional[float]
 
-async def run_shell_command_with_confirmation_async(cmd: str, dry_run: bool = False, cwd: str = None) -> str:
+def _speculate(cmd: str, cleanup_path: str, work_dir: str, timeout: float = None) -> Optional[_Speculation]:
+    """
+    Start a read-only command while the user is still being asked, so "yes" shows the output at once.
+    Only under the rlimit and bwrap sandboxes: a plain subprocess is not sandboxed, and the shell session's
+    cwd and exported variables may differ from a fresh process's, so its commands must run in the session.
+    """
+    if not config.SPECULATIVE_EXECUTION or cleanup_path is not None or not is_read_only(cmd):
+        return None
+    executor = get_executor(work_dir)
+    if executor.name not in SPECULATIVE_EXECUTORS:
+        return None
+    timeout = resolve_timeout(timeout)
+    # The user may still decline: a speculated `git status` must not take index.lock or run hooks,
+    # and nothing is journaled or spilled into the workspace before "yes"
+    executor = type(executor)(executor.sandbox, env=SPECULATION_ENV)
+    task = asyncio.create_task(run_command(cmd, work_dir, timeout, executor=executor, journal=False, spill=False))
+    return _Speculation(task, cmd, work_dir, executor, timeout)
+
+async def _discard(speculation: _Speculation):
+    speculation.task.cancel()
+    try:
+        await speculation.task
+    except BaseException:
+        # Cancelled, or it failed on its own; either way nothing was confirmed
+        pass
+
+async def _finish_speculation(speculation: _Speculation) -> CommandResult:
+    console.print(f"[dim]Executing: {speculation.cmd}[/dim]")
+    try:
+        result = await speculation.task
+    except asyncio.CancelledError:
+        console.print("[yellow]Command cancelled.[/yellow]")
+        raise
+    except Exception as e:
+        console.print(f"[bold red]Execution failed:[/bold red] {e}")
+        return CommandResult(command=speculation.cmd, cwd=speculation.work_dir, status="error", error=str(e))
+    result.spill(Path(speculation.work_dir) / SPILL_DIR, config.COMMAND_OUTPUT_CHARS)
+    if config.JOURNAL_ENABLED:
+        get_journal(speculation.work_dir).record(result)
+    _print_result(result, speculation.executor, speculation.timeout, note=", started while confirming")
+    return result
+
+async def run_shell_command_with_confirmation_async(cmd: str, dry_run: bool = False, cwd: str = None, timeout: float = None) -> CommandResult:
     """
     Run a shell command with user confirmation (async version).
     Args:
         cmd: The command to execute
         dry_run: If True, only show the command without executing
         cwd: Working directory for command execution (defaults to config.WORKSPACE)
+        timeout: Seconds before the command is killed (defaults to config.COMMAND_TIMEOUT)
     Raises:
         WorkspaceError: If workspace directory cannot be created or accessed
     """
@@ -152,43 +844,59 @@ async def run_shell_command_with_confirmation_async(cmd: str, dry_run: bool = Fa
     display_cmd, exec_cmd, cleanup = prepare_shell_command(cmd)
     
     if not display_cmd:
-        return "Error: Empty command"
-        
-    syntax = Syntax(display_cmd, "bash", theme="monokai", line_numbers=False)
-    console.print(Panel(syntax, title="Generated Command", border_style="blue"))
-    console.print(f"[dim]Working directory: {work_dir}[/dim]")
+        return CommandResult(command=cmd, cwd=work_dir, status="error", error="Empty command")
     
-    if dry_run:
-        console.print("[yellow]Dry run mode enabled. Command not executed.[/yellow]")
-        return "Dry run: Command not executed"
-        
     try:
-        if Confirm.ask("Do you want to execute this command?"):
-            return await execute_prepared_command_async(exec_cmd, cleanup, cwd=work_dir)
+        async with prompts.turn():
+            syntax = Syntax(display_cmd, "bash", theme="monokai", line_numbers=False)
+            console.print(Panel(syntax, title="Generated Command", border_style="blue"))
+            console.print(f"[dim]Working directory: {work_dir}[/dim]")
+            
+            if dry_run:
+                console.print("[yellow]Dry run mode enabled. Command not executed.[/yellow]")
+                return CommandResult(command=display_cmd, cwd=work_dir, status="dry_run")
+            
+            speculation = _speculate(exec_cmd, cleanup, work_dir, timeout)
+            try:
+                with span("confirmation wait", speculative=speculation is not None):
+                    confirmed = await prompts.confirm("Do you want to execute this command?")
+            except BaseException:
+                if speculation is not None:
+                    await _discard(speculation)
+                raise
+        
+        if speculation is not None:
+            if not confirmed:
+                await _discard(speculation)
+            else:
+                return await _finish_speculation(speculation)
+        if confirmed:
+            return await execute_prepared_command_async(exec_cmd, cleanup, cwd=work_dir, timeout=timeout)
         else:
             console.print("[yellow]Execution cancelled.[/yellow]")
-            return "Execution cancelled by user"
+            return CommandResult(command=display_cmd, cwd=work_dir, status="declined")
     except WorkspaceError:
         raise
     except Exception as e:
         console.print(f"[bold red]Execution failed:[/bold red] {e}")
-        return f"Error: {str(e)}"
+        return CommandResult(command=display_cmd, cwd=work_dir, status="error", error=str(e))
 
-def run_shell_command_with_confirmation(cmd: str, dry_run: bool = False, cwd: str = None) -> str:
+def run_shell_command_with_confirmation(cmd: str, dry_run: bool = False, cwd: str = None, timeout: float = None) -> CommandResult:
     """
     Run a shell command with user confirmation (synchronous wrapper for backward compatibility).
     Args:
         cmd: The command to execute
         dry_run: If True, only show the command without executing
         cwd: Working directory for command execution (defaults to config.WORKSPACE)
+        timeout: Seconds before the command is killed (defaults to config.COMMAND_TIMEOUT)
     Raises:
         WorkspaceError: If workspace directory cannot be created or accessed
     """
-    return asyncio.run(run_shell_command_with_confirmation_async(cmd, dry_run, cwd))
+    return asyncio.run(run_shell_command_with_confirmation_async(cmd, dry_run, cwd, timeout))
 
 def execute_shell_command(cmd: str, dry_run: bool = False, cwd: str = None) -> str:
     """
     Deprecated: Kept for backward compatibility.
     Use run_shell_command_with_confirmation or execute_prepared_command instead.
     """
-    return run_shell_command_with_confirmation(cmd, dry_run, cwd=cwd)
+    return run_shell_command_with_confirmation(cmd, dry_run, cwd=cwd).render()
@@ -0,0 +1,4 @@
+import os
+
+# Keep test runs from writing spans into the project's workspace/.nlcmd/trace.jsonl
+os.environ.setdefault("TRACE_ENABLED", "false")
@@ -0,0 +1,110 @@
+import asyncio
+import json
+import platform
+from datetime import datetime, timedelta
+
+import pytest
+from typer.testing import CliRunner
+
+from nlcmd.history import history_app
+from nlcmd.journal import Journal, current_query
+from nlcmd.utils import CommandResult, run_command
+
+START = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def _result(command, seconds=0, status="ok", exit_code=0, duration=0.1, stdout=""):
+    return CommandResult(
+        command=command, cwd="/work", status=status, exit_code=exit_code, duration=duration,
+        started_at=START + timedelta(seconds=seconds), stdout=stdout, stdout_bytes=len(stdout),
+    )
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = Journal(tmp_path / "journal", max_bytes=1024 * 1024, backups=2)
+    yield journal
+    journal.close()
+
+
+class TestJournal:
+    def test_record_writes_jsonl_and_index(self, journal):
+        journal.record(_result("echo hi", stdout="hi\n"), query="say hi")
+        journal.flush()
+
+        entries = [json.loads(line) for line in journal.path.read_text(encoding="utf-8").splitlines()]
+        assert len(entries) == 1
+        assert entries[0]["command"] == "echo hi"
+        assert entries[0]["query"] == "say hi"
+        assert entries[0]["stdout_bytes"] == 3
+        assert "stdout" not in entries[0]
+        assert journal.query()[0]["command"] == "echo hi"
+
+    def test_query_filters(self, journal):
+        journal.record(_result("fast", seconds=1, duration=0.1))
+        journal.record(_result("slow", seconds=2, duration=5.0))
+        journal.record(_result("broken", seconds=3, status="failed", exit_code=2, duration=0.2))
+        journal.record(_result("hung", seconds=4, status="timed_out", exit_code=None, duration=3.0))
+        journal.flush()
+
+        assert [e["command"] for e in journal.query()] == ["hung", "broken", "slow", "fast"]
+        assert [e["command"] for e in journal.query(slow=True, limit=2)] == ["slow", "hung"]
+        assert [e["command"] for e in journal.query(failed=True)] == ["hung", "broken"]
+        assert [e["command"] for e in journal.query(contains="ro")] == ["broken"]
+
+    def test_top_groups_repeated_commands(self, journal):
+        for i in range(3):
+            journal.record(_result("git status", seconds=i, stdout="clean\n" if i else "dirty\n"))
+        journal.record(_result("ls", seconds=10, status="failed", exit_code=1))
+        journal.flush()
+
+        top = journal.top()
+        assert top[0]["command"] == "git status"
+        assert top[0]["runs"] == 3
+        assert top[0]["distinct_outputs"] == 2
+        assert top[1]["failures"] == 1
+
+    def test_rotation_prunes_index(self, tmp_path):
+        journal = Journal(tmp_path / "journal", max_bytes=2000, backups=1)
+        try:
+            for i in range(40):
+                journal.record(_result(f"echo {i}", seconds=i))
+            journal.flush()
+        finally:
+            journal.close()
+
+        files = sorted(p.name for p in journal.directory.glob("*.jsonl"))
+        assert files == ["journal.1.jsonl", "journal.jsonl"]
+        on_disk = sum(len(p.read_text(encoding="utf-8").splitlines()) for p in journal.directory.glob("*.jsonl"))
+        indexed = journal.query(limit=100)
+        assert len(indexed) == on_disk < 40
+        assert indexed[0]["command"] == "echo 39"
+
+    def test_query_without_index(self, tmp_path):
+        assert Journal(tmp_path / "missing").query() == []
+        assert Journal(tmp_path / "missing").top() == []
+
+    def test_current_query_is_recorded(self, journal):
+        token = current_query.set("list files")
+        try:
+            journal.record(_result("ls"))
+        finally:
+            current_query.reset(token)
+        journal.flush()
+        assert journal.query()[0]["query"] == "list files"
+
+
+@pytest.mark.skipif(platform.system() == "Windows", reason="uses POSIX shell commands")
+class TestRunCommandJournal:
+    def test_executed_commands_are_journaled(self, tmp_path, monkeypatch):
+        from nlcmd.journal import get_journal
+
+        monkeypatch.setattr("nlcmd.config.WORKSPACE", tmp_path)
+        asyncio.run(run_command("echo journaled", str(tmp_path), 10))
+        asyncio.run(run_command("exit 3", str(tmp_path), 10))
+        get_journal(str(tmp_path)).flush()
+
+        result = CliRunner().invoke(history_app, ["--failed", "--json"])
+        assert result.exit_code == 0
+        rows = [json.loads(line) for line in result.output.splitlines()]
+        assert [(row["command"], row["exit_code"]) for row in rows] == [("exit 3", 3)]
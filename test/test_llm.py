@@ -0,0 +1,228 @@
+import asyncio
+import io
+import threading
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from pydantic_ai.messages import ModelResponse, TextPart, ToolCallPart
+from pydantic_ai.models.function import AgentInfo, DeltaToolCall, FunctionModel
+from pydantic_ai.usage import RunUsage
+from rich.console import Console
+
+from nlcmd import llm
+from nlcmd.llm import AgentState, OrderedSkillsToolset, build_system_prompt, cache_hit_rate, create_agent, format_usage
+from nlcmd.memory.indexer import MemoryIndexer
+from nlcmd.ui import LiveResponseStream, ResponseStream
+
+
+def _deps(workspace, shell="bash"):
+    return AgentState(os_name="Linux", shell_name=shell, workspace=str(workspace))
+
+
+def _instructions(workspace, shell="bash"):
+    seen = []
+
+    def respond(messages, info: AgentInfo):
+        seen.append(messages[-1].instructions)
+        return ModelResponse(parts=[TextPart("done")])
+
+    agent, _ = create_agent(FunctionModel(respond), str(workspace))
+    asyncio.run(agent.run("hi", deps=_deps(workspace, shell)))
+    return seen[0]
+
+
+class TestPromptLayout:
+    def test_static_rules_do_not_depend_on_request(self, tmp_path):
+        prompt = build_system_prompt(_deps(tmp_path))
+        assert str(tmp_path) not in prompt
+        assert "Linux" not in prompt
+        assert build_system_prompt(_deps(tmp_path / "other")) == prompt
+
+    def test_context_is_the_trailing_section(self, tmp_path):
+        instructions = _instructions(tmp_path)
+        static = build_system_prompt(_deps(tmp_path))
+        assert instructions.startswith(static)
+        tail = instructions[instructions.index("## Context:"):]
+        assert str(tmp_path) in tail
+        assert "Linux" in tail
+
+    def test_prefix_is_stable_across_days_and_workspaces(self, tmp_path):
+        first = _instructions(tmp_path / "a")
+        with patch.object(llm, "datetime") as fake:
+            fake.now.return_value = datetime(2030, 1, 2, 3, 4, 5)
+            second = _instructions(tmp_path / "b")
+        assert "2030-01-02" in second
+        prefix = first[:first.index("## Context:")]
+        assert second.startswith(prefix)
+
+    def test_powershell_rules_stay_in_prefix(self, tmp_path):
+        instructions = _instructions(tmp_path, shell="powershell.exe")
+        assert instructions.index("PowerShell-Specific Rules") < instructions.index("## Context:")
+
+
+class TestUsage:
+    def test_cache_hit_rate(self):
+        assert cache_hit_rate(RunUsage()) is None
+        usage = RunUsage(requests=2, input_tokens=1000, cache_read_tokens=750, output_tokens=20)
+        assert cache_hit_rate(usage) == 0.75
+        assert format_usage(usage) == "2 request(s), 1000 input tokens, 750 cached (75%), 20 output tokens"
+
+
+class RecordingStream(ResponseStream):
+    def __init__(self):
+        self.events = []
+
+    def text(self, delta):
+        self.events.append(("text", delta))
+
+    def tool_call(self, call_id, name, args):
+        self.events.append(("call", name))
+
+    def tool_result(self, call_id, name, ok):
+        self.events.append(("result", name, ok))
+
+    def finish(self, text):
+        self.events.append(("finish", text))
+
+    def close(self):
+        self.events.append(("close",))
+
+
+class TestStreaming:
+    def _generator(self, workspace):
+        async def stream_response(messages, info: AgentInfo):
+            if len(messages) == 1:
+                yield {0: DeltaToolCall(name="list_memories", json_args="{}", tool_call_id="c1")}
+            else:
+                for delta in ("Hello", ", ", "world"):
+                    yield delta
+
+        with patch.object(llm.config, "OPENAI_API_KEY", "test"):
+            generator = llm.CommandGenerator(workspace=str(workspace))
+        generator.agent, _ = create_agent(FunctionModel(stream_function=stream_response), str(workspace))
+        return generator
+
+    def test_text_and_tool_progress_are_streamed(self, tmp_path):
+        generator = self._generator(tmp_path)
+        stream = RecordingStream()
+        response = asyncio.run(generator.run_task("hi", stream=stream))
+
+        assert response == "Hello, world"
+        assert stream.events[:2] == [("call", "list_memories"), ("result", "list_memories", True)]
+        assert "".join(e[1] for e in stream.events if e[0] == "text") == "Hello, world"
+        assert stream.events[-2:] == [("finish", "Hello, world"), ("close",)]
+
+    def test_live_stream_without_terminal_writes_through(self, tmp_path):
+        out = io.StringIO()
+        stream = LiveResponseStream(console=Console(file=out, force_terminal=False))
+        response = asyncio.run(self._generator(tmp_path).run_task("hi", stream=stream))
+
+        assert response == "Hello, world"
+        assert stream.finished
+        assert "> list_memories({})" in out.getvalue()
+        assert out.getvalue().endswith("Hello, world\n")
+
+
+class FakeIndexer:
+    def __init__(self, intervals):
+        self.intervals = intervals
+
+    async def recall_async(self, query, limit=5, category_boosts=None):
+        start = time.monotonic()
+        await asyncio.sleep(0.2)
+        self.intervals.append((query, start, time.monotonic()))
+        return []
+
+
+def _overlap(a, b):
+    return a[1] < b[2] and b[1] < a[2]
+
+
+class TestToolConcurrency:
+    def _run(self, workspace, calls):
+        def respond(messages, info: AgentInfo):
+            if len(messages) == 1:
+                return ModelResponse(parts=[
+                    ToolCallPart(tool_name=name, args=args, tool_call_id=f"c{i}") for i, (name, args) in enumerate(calls)
+                ])
+            return ModelResponse(parts=[TextPart("done")])
+
+        recalls, commands = [], []
+
+        async def fake_command(command, **kwargs):
+            start = time.monotonic()
+            await asyncio.sleep(0.05)
+            commands.append((command, start, time.monotonic()))
+            return SimpleNamespace(status="ok", render=lambda: "ok")
+
+        agent, _ = create_agent(FunctionModel(respond), str(workspace))
+        generator = llm.CommandGenerator(workspace=str(workspace), model=FunctionModel(respond), agent=agent,
+                                         memory_indexer=FakeIndexer(recalls))
+        with patch.object(llm, "run_shell_command_with_confirmation_async", new=fake_command):
+            asyncio.run(generator.run_task("go"))
+        return recalls, commands
+
+    def test_read_only_tools_overlap(self, tmp_path):
+        recalls, _ = self._run(tmp_path, [("recall_memory", {"query": "a"}), ("recall_memory", {"query": "b"})])
+
+        assert len(recalls) == 2
+        assert _overlap(*recalls)
+
+    def test_side_effecting_tools_run_one_at_a_time_in_call_order(self, tmp_path):
+        calls = [("run_shell_command", {"command": name}) for name in ("first", "second", "third")]
+        recalls, commands = self._run(tmp_path, calls + [("recall_memory", {"query": "a"})])
+
+        assert [command for command, _, _ in commands] == ["first", "second", "third"]
+        assert not any(_overlap(a, b) for a, b in zip(commands, commands[1:]))
+        # Read-only tools don't wait for the queue of side-effecting ones
+        assert _overlap(recalls[0], commands[0])
+
+    def test_skill_scripts_are_serialized(self):
+        running, started, peak = [], [], []
+
+        class Wrapped:
+            async def call_tool(self, name, tool_args, ctx, tool):
+                running.append(name)
+                started.append((name, tool_args["i"]))
+                peak.append(running.count("run_skill_script"))
+                await asyncio.sleep(0.02)
+                running.remove(name)
+
+        async def main():
+            toolset = OrderedSkillsToolset(Wrapped())
+            ctx = SimpleNamespace(deps=AgentState(os_name="Linux", shell_name="bash", side_effects=asyncio.Lock()))
+            await asyncio.gather(
+                *(toolset.call_tool("run_skill_script", {"i": i}, ctx, None) for i in range(3)),
+                toolset.call_tool("load_skill", {"i": 3}, ctx, None),
+            )
+
+        asyncio.run(main())
+        assert [i for name, i in started if name == "run_skill_script"] == [0, 1, 2]
+        assert max(peak) == 1
+        # load_skill started while the first script was still running
+        assert started.index(("load_skill", 3)) < 2
+
+
+class TestIndexerLoad:
+    def test_concurrent_first_use_loads_once(self, tmp_path):
+        created = []
+
+        def slow_embeddings(config):
+            time.sleep(0.1)
+            created.append(config)
+            return MagicMock()
+
+        indexer = MemoryIndexer(tmp_path / "memory" / "index")
+        indexer._ensure_model = lambda: "test_model"
+        results = []
+        with patch("nlcmd.memory.indexer.Embeddings", side_effect=slow_embeddings):
+            threads = [threading.Thread(target=lambda: results.append(indexer.embeddings)) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        assert len(created) == 1
+        assert len(results) == 8 and all(result is results[0] for result in results)
@@ -0,0 +1,113 @@
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+
+from nlcmd.memory.bundle import (
+    BundleError,
+    export_bundle,
+    import_bundle,
+    model_fingerprint,
+    read_bundle,
+)
+
+
+def _workspace_with_memory(tmp_path):
+    memory_dir = tmp_path / "memory" / "important"
+    memory_dir.mkdir(parents=True)
+    (memory_dir / "pref.md").write_text("---\nName: pref\n---\n### [2024-01-01 10:00:00]\nuses vim\n", encoding="utf-8")
+    (tmp_path / "memory" / "index").mkdir()
+    return tmp_path
+
+
+def _source_indexer():
+    indexer = MagicMock()
+    indexer.all_documents.return_value = [
+        ("pref_0", {"text": "### [2024-01-01 10:00:00]\nuses vim\n", "filename": "pref.md", "type": "important", "category": "pref"}, None),
+        ("pref_1", {"text": "### [2024-01-02 10:00:00]\nuses zsh\n", "filename": "pref.md", "type": "important", "category": "pref"}, None),
+        ("shell_0", {"text": "### [2024-01-03 10:00:00]\nuses tmux\n", "filename": "shell.md", "type": "important", "category": "shell"}, None),
+    ]
+    indexer.embeddings.batchtransform.side_effect = lambda texts, category=None: np.ones((len(texts), 4))
+    return indexer
+
+
+class TestExportBundle:
+    def test_roundtrip_manifest_entries_and_vectors(self, tmp_path):
+        workspace = _workspace_with_memory(tmp_path / "src")
+        output = tmp_path / "memory.npz"
+        
+        manifest = export_bundle(str(workspace), output, indexer=_source_indexer())
+        bundle = read_bundle(output)
+        
+        assert manifest["count"] == 3
+        assert bundle["manifest"]["fingerprint"] == model_fingerprint()
+        assert bundle["vectors"].dtype == np.float16
+        assert bundle["vectors"].shape == (3, 4)
+        assert [uid for uid, _ in bundle["entries"]] == ["pref_0", "pref_1", "shell_0"]
+        assert "uses vim" in bundle["files"]["important/pref.md"]
+
+    def test_rejects_foreign_file(self, tmp_path):
+        path = tmp_path / "other.npz"
+        np.savez(path, manifest=np.frombuffer(b'{"format": "other"}', dtype=np.uint8))
+        
+        with pytest.raises(BundleError, match="not an nlcmd memory bundle"):
+            read_bundle(path)
+
+
+class TestImportBundle:
+    @pytest.fixture
+    def bundle_path(self, tmp_path):
+        workspace = _workspace_with_memory(tmp_path / "src")
+        output = tmp_path / "memory.npz"
+        export_bundle(str(workspace), output, indexer=_source_indexer())
+        return output
+
+    def test_reuses_vectors_when_model_matches(self, tmp_path, bundle_path):
+        target = tmp_path / "dst"
+        indexer = MagicMock()
+        
+        summary = import_bundle(str(target), bundle_path, indexer=indexer)
+        
+        assert summary["reused_vectors"] is True
+        documents, vectors = indexer.index_vectors.call_args[0]
+        assert [doc[0] for doc in documents] == ["pref_0", "pref_1", "shell_0"]
+        assert vectors.shape == (3, 4)
+        indexer.index_documents.assert_not_called()
+        assert (target / "memory" / "important" / "pref.md").exists()
+        assert (target / "memory" / "snapshot.db").exists()
+
+    def test_reembeds_when_model_differs(self, tmp_path, bundle_path, monkeypatch):
+        monkeypatch.setattr("nlcmd.memory.bundle.model_fingerprint", lambda: "other-model")
+        indexer = MagicMock()
+        
+        summary = import_bundle(str(tmp_path / "dst"), bundle_path, indexer=indexer)
+        
+        assert summary["reused_vectors"] is False
+        indexer.index_documents.assert_called_once()
+        indexer.index_vectors.assert_not_called()
+
+    def test_refuses_to_replace_existing_index(self, tmp_path, bundle_path):
+        target = tmp_path / "dst"
+        (target / "memory" / "index").mkdir(parents=True)
+        
+        with pytest.raises(BundleError, match="--force"):
+            import_bundle(str(target), bundle_path, indexer=MagicMock())
+
+    def test_keeps_differing_local_files(self, tmp_path, bundle_path):
+        target = tmp_path / "dst"
+        local = target / "memory" / "important" / "pref.md"
+        local.parent.mkdir(parents=True)
+        local.write_text("---\nName: pref\n---\n### [2024-02-01 10:00:00]\nuses emacs\n", encoding="utf-8")
+        indexer = MagicMock()
+        
+        summary = import_bundle(str(target), bundle_path, indexer=indexer)
+        
+        assert summary["skipped"] == ["important/pref.md"]
+        assert "uses emacs" in local.read_text(encoding="utf-8")
+        # The bundle's entries for the kept file are left out; the local copy is indexed instead
+        documents, vectors = indexer.index_vectors.call_args[0]
+        assert [doc[0] for doc in documents] == ["shell_0"]
+        assert vectors.shape == (1, 4)
+        filename, memory_type, local_documents = indexer.replace_file.call_args[0]
+        assert (filename, memory_type) == ("pref.md", "important")
+        assert [doc[1]["text"] for doc in local_documents] == ["### [2024-02-01 10:00:00]\nuses emacs\n"]
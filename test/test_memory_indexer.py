@@ -1,9 +1,10 @@
 import hashlib
 from pathlib import Path
 from unittest.mock import patch, MagicMock
+import numpy as np
 import pytest
 
-from nlcmd.memory.indexer import MemoryIndexer
+from nlcmd.memory.indexer import MemoryIndexer, get_indexer
 
 
 class TestMemoryIndexerInit:
@@ -60,6 +61,147 @@ class TestEmbeddingsProperty:
             mock_embeddings.load.assert_called_once_with(str(index_path))
 
 
+class TestMmapBackend:
+    def test_rejects_unknown_backend(self, tmp_path):
+        with pytest.raises(ValueError, match="Unsupported memory index backend"):
+            MemoryIndexer(tmp_path / "index", backend="redis")
+
+    def test_default_backend_has_no_ann_overrides(self, tmp_path):
+        indexer = MemoryIndexer(tmp_path / "index", backend="memory")
+        
+        assert indexer._backend_config() == {}
+
+    def test_creates_quantized_faiss_config(self, tmp_path):
+        index_path = tmp_path / "memory" / "index"
+        
+        with patch("nlcmd.memory.indexer.Embeddings") as MockEmbeddings:
+            with patch("nlcmd.memory.indexer.config.MEMORY_INDEX_PRECISION", "int8"):
+                indexer = MemoryIndexer(index_path, backend="mmap")
+                indexer._ensure_model = lambda: "test_model"
+                _ = indexer.embeddings
+            
+            call_args = MockEmbeddings.call_args[0][0]
+            assert call_args["backend"] == "faiss"
+            assert call_args["faiss"] == {"quantize": 8, "mmap": False}
+
+    def test_float16_precision(self, tmp_path):
+        with patch("nlcmd.memory.indexer.config.MEMORY_INDEX_PRECISION", "float16"):
+            indexer = MemoryIndexer(tmp_path / "index", backend="mmap")
+            
+            faiss_params = indexer._backend_config()["faiss"]
+        
+        assert faiss_params["components"] == "IDMap,SQfp16"
+        assert faiss_params["mmap"] is True
+
+    def test_loads_existing_index_memory_mapped(self, tmp_path):
+        index_path = tmp_path / "memory" / "index"
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        index_path.touch()
+        mock_embeddings = MagicMock()
+        
+        with patch("nlcmd.memory.indexer.Embeddings") as MockEmbeddings:
+            MockEmbeddings.return_value = mock_embeddings
+            
+            indexer = MemoryIndexer(index_path, backend="mmap")
+            indexer._ensure_model = lambda: "test_model"
+            _ = indexer.embeddings
+            
+            overrides = mock_embeddings.load.call_args.kwargs["config"]
+            assert overrides["faiss"]["mmap"] is True
+            assert indexer._mmapped is True
+
+    def test_reloads_into_memory_before_write(self, tmp_path):
+        index_path = tmp_path / "memory" / "index"
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        index_path.touch()
+        mock_embeddings = MagicMock()
+        
+        with patch("nlcmd.memory.indexer.Embeddings") as MockEmbeddings:
+            MockEmbeddings.return_value = mock_embeddings
+            
+            indexer = MemoryIndexer(index_path, backend="mmap")
+            indexer._ensure_model = lambda: "test_model"
+            indexer.index_memory("content", {})
+            
+            assert mock_embeddings.load.call_count == 2
+            overrides = mock_embeddings.load.call_args.kwargs["config"]
+            assert overrides["faiss"]["mmap"] is False
+            assert indexer._mmapped is False
+            mock_embeddings.upsert.assert_called_once()
+
+
+class TestSharedIndex:
+    def test_get_indexer_is_shared_per_index(self, tmp_path):
+        first = get_indexer(tmp_path / "memory" / "index")
+        
+        assert get_indexer(tmp_path / "memory" / ".." / "memory" / "index") is first
+        assert get_indexer(tmp_path / "other" / "index") is not first
+
+    def test_reloads_index_saved_by_another_writer_before_write(self, tmp_path):
+        index_path = tmp_path / "memory" / "index"
+        index_path.mkdir(parents=True)
+        (index_path / "documents").write_text("v1")
+        mock_embeddings = MagicMock()
+        
+        with patch("nlcmd.memory.indexer.Embeddings") as MockEmbeddings:
+            MockEmbeddings.return_value = mock_embeddings
+            
+            indexer = MemoryIndexer(index_path)
+            indexer._ensure_model = lambda: "test_model"
+            indexer.index_memory("first", {})
+            assert mock_embeddings.load.call_count == 1
+            
+            # Our own save does not force a reload
+            indexer.index_memory("second", {})
+            assert mock_embeddings.load.call_count == 1
+            
+            # Another process saves the index in between
+            (index_path / "documents").write_text("v2 with more entries")
+            indexer.index_memory("third", {})
+            assert mock_embeddings.load.call_count == 2
+
+    def test_search_sees_index_saved_by_another_writer(self, tmp_path):
+        index_path = tmp_path / "memory" / "index"
+        index_path.mkdir(parents=True)
+        (index_path / "documents").write_text("v1")
+        mock_embeddings = MagicMock()
+        mock_embeddings.search.return_value = []
+        
+        with patch("nlcmd.memory.indexer.Embeddings") as MockEmbeddings:
+            MockEmbeddings.return_value = mock_embeddings
+            
+            indexer = MemoryIndexer(index_path)
+            indexer._ensure_model = lambda: "test_model"
+            indexer.search("query")
+            indexer.search("query")
+            assert mock_embeddings.load.call_count == 1
+            
+            (index_path / "documents").write_text("v2 with more entries")
+            indexer.search("query")
+            assert mock_embeddings.load.call_count == 2
+
+
+    def test_reload_swaps_in_a_new_instance(self, tmp_path):
+        index_path = tmp_path / "memory" / "index"
+        index_path.mkdir(parents=True)
+        (index_path / "documents").write_text("v1")
+        first, second = MagicMock(), MagicMock()
+        first.search.return_value = second.search.return_value = []
+        
+        with patch("nlcmd.memory.indexer.Embeddings", side_effect=[first, second]):
+            indexer = MemoryIndexer(index_path)
+            indexer._ensure_model = lambda: "test_model"
+            indexer.search("query")
+            
+            (index_path / "documents").write_text("v2 with more entries")
+            indexer.search("query")
+        
+        # A search still running on the old instance never sees it reloaded underneath it
+        first.load.assert_called_once()
+        second.load.assert_called_once()
+        assert indexer.embeddings is second
+        second.search.assert_called_once()
+
 class TestIndexMemory:
     def test_creates_index_directory(self, tmp_path):
         index_path = tmp_path / "memory" / "index"
@@ -268,3 +410,111 @@ class TestSearch:
             
             call_sql = mock_embeddings.search.call_args[0][0]
             assert "LIMIT 10" in call_sql
+
+
+def _faiss_ann(vectors, spec="IDMap,Flat"):
+    faiss = pytest.importorskip("faiss")
+    vectors = np.asarray(vectors, dtype=np.float32)
+    index = faiss.index_factory(vectors.shape[1], spec, faiss.METRIC_INNER_PRODUCT)
+    index.train(vectors)
+    index.add_with_ids(vectors, np.arange(len(vectors), dtype=np.int64))
+    return MagicMock(backend=index)
+
+
+PARAPHRASED = [
+    {"id": "a", "text": "### [2024-01-01 10:00:00]\nThe user prefers vim as their editor", "score": 0.9, "data": '{"timestamp": "2024-01-01 10:00:00"}'},
+    {"id": "b", "text": "### [2024-01-01 10:00:00]\nUser's preferred editor is vim", "score": 0.85, "data": '{"timestamp": "2024-01-01 10:00:00"}'},
+    {"id": "c", "text": "### [2024-01-01 10:00:00]\nThe user works on a Mac", "score": 0.5, "data": '{"timestamp": "2024-01-01 10:00:00"}'},
+]
+
+
+class TestRecall:
+    def _indexer(self, tmp_path, mock_embeddings):
+        with patch("nlcmd.memory.indexer.Embeddings", return_value=mock_embeddings):
+            indexer = MemoryIndexer(tmp_path / "memory" / "index")
+            indexer._ensure_model = lambda: "test_model"
+            indexer.embeddings
+        return indexer
+
+    def test_over_fetches_and_reranks(self, tmp_path):
+        mock_embeddings = MagicMock()
+        mock_embeddings.search.return_value = [
+            {"id": "a", "text": "### [2024-01-01 10:00:00]\nsame", "score": 0.9, "data": '{"timestamp": "2024-01-01 10:00:00"}'},
+            {"id": "b", "text": "### [2024-01-01 10:00:00]\nsame", "score": 0.9, "data": '{"timestamp": "2024-01-01 10:00:00"}'},
+        ]
+        mock_embeddings.batchtransform.side_effect = Exception("no model")
+        
+        results = self._indexer(tmp_path, mock_embeddings).recall("query", limit=2)
+        
+        call_sql = mock_embeddings.search.call_args[0][0]
+        assert "LIMIT 6" in call_sql
+        assert len(results) == 1
+        assert results[0]["id"] == "a"
+
+    @pytest.mark.parametrize("spec", ["IDMap,Flat", "IDMap,SQfp16"])
+    def test_paraphrases_deduplicated_with_stored_vectors(self, tmp_path, spec):
+        mock_embeddings = MagicMock()
+        mock_embeddings.search.return_value = PARAPHRASED
+        # Index ids 0..2 hold a, b, c; a and b are near-identical in the stored vectors
+        mock_embeddings.database.ids.return_value = [(0, "a"), (1, "b"), (2, "c")]
+        mock_embeddings.ann = _faiss_ann([[1.0, 0.0, 0.0], [0.99, 0.05, 0.0], [0.0, 1.0, 0.0]], spec)
+        
+        results = self._indexer(tmp_path, mock_embeddings).recall("editor", limit=3)
+        
+        assert [r["id"] for r in results] == ["a", "c"]
+        mock_embeddings.batchtransform.assert_not_called()
+
+    def test_stored_vectors_follow_deletions(self, tmp_path):
+        mock_embeddings = MagicMock()
+        mock_embeddings.search.return_value = PARAPHRASED
+        mock_embeddings.database.ids.return_value = [(4, "a"), (2, "b"), (3, "c")]
+        ann = _faiss_ann([[0.0, 0.0, 1.0], [0.0, 0.0, 1.0], [0.99, 0.05, 0.0], [0.0, 1.0, 0.0], [1.0, 0.0, 0.0]])
+        ann.backend.remove_ids(np.array([0, 1], dtype=np.int64))
+        mock_embeddings.ann = ann
+        
+        results = self._indexer(tmp_path, mock_embeddings).recall("editor", limit=3)
+        
+        assert [r["id"] for r in results] == ["a", "c"]
+
+    def test_falls_back_to_embedding_candidates(self, tmp_path):
+        mock_embeddings = MagicMock()
+        mock_embeddings.search.return_value = PARAPHRASED
+        mock_embeddings.database.ids.side_effect = Exception("no database")
+        mock_embeddings.batchtransform.return_value = np.array([[1.0, 0.0], [0.99, 0.05], [0.0, 1.0]])
+        
+        results = self._indexer(tmp_path, mock_embeddings).recall("editor", limit=3)
+        
+        assert [r["id"] for r in results] == ["a", "c"]
+
+
+class TestIndexVectors:
+    def test_feeds_precomputed_vectors_to_index(self, tmp_path):
+        index_path = tmp_path / "memory" / "index"
+        mock_embeddings = MagicMock()
+        seen = []
+        
+        def fake_index(documents):
+            model = mock_embeddings.model
+            seen.append(model.vectorize(["a"], "data"))
+            seen.append(model.vectorize(["b", "c"], "data"))
+        mock_embeddings.index.side_effect = fake_index
+        
+        with patch("nlcmd.memory.indexer.Embeddings") as MockEmbeddings:
+            MockEmbeddings.return_value = mock_embeddings
+            
+            indexer = MemoryIndexer(index_path)
+            documents = [("a", {"text": "a"}, None), ("b", {"text": "b"}, None), ("c", {"text": "c"}, None)]
+            vectors = np.array([[2.0, 0.0], [0.0, 3.0], [1.0, 1.0]], dtype=np.float16)
+            
+            indexer.index_vectors(documents, vectors)
+            
+            assert seen[0].shape == (1, 2)
+            assert seen[1].shape == (2, 2)
+            assert np.allclose(np.linalg.norm(np.vstack(seen), axis=1), 1.0)
+            mock_embeddings.save.assert_called_once_with(str(index_path))
+
+    def test_rejects_mismatched_lengths(self, tmp_path):
+        indexer = MemoryIndexer(tmp_path / "index")
+        
+        with pytest.raises(ValueError, match="2 vectors for 1 documents"):
+            indexer.index_vectors([("a", {"text": "a"}, None)], np.zeros((2, 2)))
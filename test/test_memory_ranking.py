@@ -0,0 +1,101 @@
+from datetime import datetime
+
+import numpy as np
+
+from nlcmd.memory.ranking import rerank
+
+
+NOW = datetime(2024, 6, 1, 12, 0, 0)
+
+
+def _result(uid, score, timestamp="", mem_type="important", category="test", text=None):
+    return {
+        "id": uid,
+        "text": text if text is not None else f"### [{timestamp}]\ncontent {uid}\n",
+        "score": score,
+        "type": mem_type,
+        "category": category,
+        "timestamp": timestamp,
+    }
+
+
+class TestRerank:
+    def test_empty_results(self):
+        assert rerank([], 5, now=NOW) == []
+
+    def test_recent_entry_outranks_old_one(self):
+        results = [
+            _result("old", 0.80, "2023-01-01 10:00:00"),
+            _result("new", 0.75, "2024-05-31 10:00:00"),
+        ]
+        
+        ranked = rerank(results, 5, now=NOW, type_boosts={})
+        
+        assert [r["id"] for r in ranked] == ["new", "old"]
+
+    def test_missing_timestamp_is_not_decayed(self):
+        results = [_result("a", 0.5)]
+        
+        ranked = rerank(results, 5, now=NOW, type_boosts={})
+        
+        assert ranked[0]["score"] == 0.5
+        assert ranked[0]["similarity"] == 0.5
+
+    def test_type_and_category_boosts(self):
+        results = [
+            _result("temp", 0.6, mem_type="temp", category="notes"),
+            _result("pref", 0.5, mem_type="important", category="user_preference"),
+        ]
+        
+        ranked = rerank(
+            results, 5, now=NOW,
+            type_boosts={"important": 1.1},
+            category_boosts={"user_preference": 1.2},
+        )
+        
+        assert ranked[0]["id"] == "pref"
+
+    def test_dedups_identical_text_without_vectors(self):
+        results = [
+            _result("md5", 0.9, text="### [2024-05-01 10:00:00]\nuses vim\n\n"),
+            _result("cat_0", 0.9, text="### [2024-05-01 10:00:00]\nuses  vim\n"),
+            _result("other", 0.5, text="### [2024-05-01 10:00:00]\nuses zsh\n"),
+        ]
+        
+        ranked = rerank(results, 5, now=NOW)
+        
+        assert [r["id"] for r in ranked] == ["md5", "other"]
+
+    def test_dedups_same_uid(self):
+        results = [
+            _result("important/notes.md#0", 0.9, text="### [2024-05-01 10:00:00]\nuses vim\n"),
+            _result("important/notes.md#0", 0.8, text="### [2024-05-01 10:00:00]\nuses vim, edited\n"),
+        ]
+        
+        ranked = rerank(results, 5, now=NOW)
+        
+        assert len(ranked) == 1
+        assert ranked[0]["similarity"] == 0.9
+
+    def test_non_positive_half_life_disables_decay(self):
+        results = [_result("old", 0.9, "2020-01-01 00:00:00"), _result("new", 0.8, "2024-06-01 00:00:00")]
+        
+        for half_life in (0, -5):
+            ranked = rerank(results, 5, now=NOW, half_life_days=half_life, type_boosts={})
+            assert [r["id"] for r in ranked] == ["old", "new"]
+            assert [r["score"] for r in ranked] == [0.9, 0.8]
+
+    def test_dedups_near_identical_vectors(self):
+        results = [_result("a", 0.9), _result("b", 0.8), _result("c", 0.7)]
+        vectors = np.array([[1.0, 0.0], [0.99, 0.01], [0.0, 1.0]])
+        
+        ranked = rerank(results, 5, vectors=vectors, now=NOW)
+        
+        assert [r["id"] for r in ranked] == ["a", "c"]
+
+    def test_respects_limit(self):
+        results = [_result(str(i), 1.0 - i / 10) for i in range(6)]
+        
+        ranked = rerank(results, 2, now=NOW)
+        
+        assert [r["id"] for r in ranked] == ["0", "1"]
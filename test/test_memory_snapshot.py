@@ -0,0 +1,81 @@
+import os
+
+from nlcmd.memory.snapshot import FileSnapshot, FileState, hash_file, scan_changes
+
+
+class TestFileSnapshot:
+    def test_load_missing_database(self, tmp_path):
+        snapshot = FileSnapshot(tmp_path / "snapshot.db")
+        
+        assert snapshot.load() == {}
+
+    def test_save_and_load_roundtrip(self, tmp_path):
+        snapshot = FileSnapshot(tmp_path / "memory" / "snapshot.db")
+        states = {
+            "/a.md": FileState(1, 1_700_000_000_123_456_789, 10, "abc"),
+            "/b.md": FileState(2, 5, 0, None),
+        }
+        
+        snapshot.save(states)
+        
+        assert snapshot.load() == states
+
+    def test_save_replaces_previous_state(self, tmp_path):
+        snapshot = FileSnapshot(tmp_path / "snapshot.db")
+        snapshot.save({"/a.md": FileState(1, 1, 1, "x")})
+        
+        snapshot.save({"/b.md": FileState(2, 2, 2, "y")})
+        
+        assert list(snapshot.load()) == ["/b.md"]
+
+
+class TestScanChanges:
+    def test_new_files_are_changed(self, tmp_path):
+        (tmp_path / "a.md").write_text("hello", encoding="utf-8")
+        (tmp_path / "ignore.txt").write_text("x", encoding="utf-8")
+        
+        current, changed, removed = scan_changes(tmp_path, {})
+        
+        path = str(tmp_path / "a.md")
+        assert changed == [path]
+        assert removed == []
+        assert current[path].hash == hash_file(path)
+        assert current[path].mtime_ns == os.stat(path).st_mtime_ns
+
+    def test_unchanged_files_are_not_hashed(self, tmp_path, monkeypatch):
+        (tmp_path / "a.md").write_text("hello", encoding="utf-8")
+        current, _, _ = scan_changes(tmp_path, {})
+        
+        def fail(path):
+            raise AssertionError("hashed an unchanged file")
+        monkeypatch.setattr("nlcmd.memory.snapshot.hash_file", fail)
+        
+        again, changed, removed = scan_changes(tmp_path, current)
+        
+        assert changed == []
+        assert removed == []
+        assert again == current
+
+    def test_touched_file_with_same_content_is_unchanged(self, tmp_path):
+        path = tmp_path / "a.md"
+        path.write_text("hello", encoding="utf-8")
+        current, _, _ = scan_changes(tmp_path, {})
+        
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        again, changed, _ = scan_changes(tmp_path, current)
+        
+        assert changed == []
+        assert again[str(path)].mtime_ns == stat.st_mtime_ns + 1_000_000
+
+    def test_modified_and_removed_files(self, tmp_path):
+        (tmp_path / "a.md").write_text("hello", encoding="utf-8")
+        (tmp_path / "b.md").write_text("bye", encoding="utf-8")
+        current, _, _ = scan_changes(tmp_path, {})
+        
+        (tmp_path / "a.md").write_text("hello world", encoding="utf-8")
+        (tmp_path / "b.md").unlink()
+        _, changed, removed = scan_changes(tmp_path, current)
+        
+        assert changed == [str(tmp_path / "a.md")]
+        assert removed == [str(tmp_path / "b.md")]
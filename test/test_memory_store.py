@@ -170,3 +170,32 @@ Second entry
         
         args = mock_indexer.index_documents.call_args[0][0]
         assert len(args) == 2
+
+    def test_documents_carry_entry_timestamp(self, tmp_path):
+        store = MemoryStore(str(tmp_path))
+        
+        memory_dir = tmp_path / "memory" / "important"
+        memory_dir.mkdir(parents=True)
+        (memory_dir / "test.md").write_text("---\nName: test\n---\n### [2024-01-01 10:00:00]\nEntry\n", encoding="utf-8")
+        
+        mock_indexer = MagicMock()
+        
+        store.reindex_all(mock_indexer)
+        
+        uid, data, _ = mock_indexer.index_documents.call_args[0][0][0]
+        assert uid == "important/test.md#0"
+        assert data["timestamp"] == "2024-01-01 10:00:00"
+        assert data["category"] == "test"
+
+    def test_uids_differ_across_memory_types(self, tmp_path):
+        store = MemoryStore(str(tmp_path))
+        for memory_type in ("important", "temp"):
+            (tmp_path / "memory" / memory_type).mkdir(parents=True)
+            (tmp_path / "memory" / memory_type / "notes.md").write_text("---\nName: notes\n---\n### [2024-01-01 10:00:00]\nEntry\n", encoding="utf-8")
+        
+        mock_indexer = MagicMock()
+        
+        store.reindex_all(mock_indexer)
+        
+        uids = [doc[0] for doc in mock_indexer.index_documents.call_args[0][0]]
+        assert sorted(uids) == ["important/notes.md#0", "temp/notes.md#0"]
@@ -0,0 +1,87 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from nlcmd.memory.watcher import MemoryWatcher
+
+
+@pytest.fixture
+def watcher(tmp_path):
+    (tmp_path / "memory" / "important").mkdir(parents=True)
+    return MemoryWatcher(str(tmp_path), indexer=MagicMock(), debounce=60)
+
+
+class TestNotify:
+    def test_ignores_non_memory_files(self, watcher):
+        root = watcher.memory_root
+        
+        watcher.notify(str(root / "important" / "snapshot.json"))
+        watcher.notify(str(root / "index" / "documents"))
+        watcher.notify(str(root / "important" / "nested" / "a.md"))
+        watcher.notify("/elsewhere/a.md")
+        
+        assert watcher._pending == set()
+        assert watcher._timer is None
+
+    def test_debounces_repeated_events(self, watcher):
+        path = watcher.memory_root / "important" / "a.md"
+        
+        watcher.notify(str(path))
+        first_timer = watcher._timer
+        watcher.notify(str(path))
+        
+        assert watcher._pending == {path}
+        assert first_timer is not watcher._timer
+        watcher._timer.cancel()
+
+
+class TestFlush:
+    def test_reindexes_touched_file(self, watcher):
+        path = watcher.memory_root / "important" / "a.md"
+        path.write_text("---\nName: a\n---\n### [2024-01-01 10:00:00]\nfirst\n\n### [2024-01-02 10:00:00]\nsecond\n", encoding="utf-8")
+        
+        watcher.notify(str(path))
+        watcher._timer.cancel()
+        watcher.flush()
+        
+        filename, memory_type, documents = watcher.indexer.replace_file.call_args[0]
+        assert filename == "a.md"
+        assert memory_type == "important"
+        assert [doc[0] for doc in documents] == ["important/a.md#0", "important/a.md#1"]
+        assert watcher._pending == set()
+
+    def test_deleted_file_is_removed_from_index(self, watcher):
+        path = watcher.memory_root / "important" / "gone.md"
+        
+        watcher.notify(str(path))
+        watcher._timer.cancel()
+        watcher.flush()
+        
+        watcher.indexer.replace_file.assert_called_once_with("gone.md", "important", [])
+
+    def test_queues_messages_instead_of_printing(self, watcher):
+        path = watcher.memory_root / "important" / "a.md"
+        path.write_text("---\nName: a\n---\n### [2024-01-01 10:00:00]\nfirst\n", encoding="utf-8")
+        
+        watcher.notify(str(path))
+        watcher._timer.cancel()
+        with patch("nlcmd.memory.watcher.console") as console:
+            watcher.flush()
+            console.print.assert_not_called()
+        
+        assert watcher.take_messages() == ["[dim]Reindexed 1 entries from a.md[/dim]"]
+        assert watcher.take_messages() == []
+
+    def test_start_requires_watchdog(self, watcher):
+        with patch("nlcmd.memory.watcher.Observer", None):
+            with pytest.raises(ImportError, match="watchdog is not installed"):
+                watcher.start()
+
+
+class TestSharedIndexer:
+    def test_uses_process_wide_indexer(self, tmp_path):
+        from nlcmd.memory.indexer import get_indexer
+        
+        watcher = MemoryWatcher(str(tmp_path))
+        
+        assert watcher.indexer is get_indexer(tmp_path / "memory" / "index")
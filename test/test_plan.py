@@ -0,0 +1,114 @@
+import asyncio
+import platform
+import time
+
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from nlcmd.plan import PlanStep, StepOutput, execute_plan_async, run_plan_with_confirmation_async, validate_plan
+
+pytestmark = pytest.mark.skipif(platform.system() == "Windows", reason="uses POSIX shell commands")
+
+
+def _steps(*specs):
+    return [PlanStep(id=sid, command=cmd, depends_on=deps) for sid, cmd, deps in specs]
+
+
+class TestValidatePlan:
+    def test_valid_plan(self):
+        validate_plan(_steps(("a", "true", []), ("b", "true", ["a"]), ("c", "true", ["a", "b"])))
+
+    def test_duplicate_ids(self):
+        with pytest.raises(ValueError, match="Duplicate"):
+            validate_plan(_steps(("a", "true", []), ("a", "true", [])))
+
+    def test_unknown_dependency(self):
+        with pytest.raises(ValueError, match="unknown"):
+            validate_plan(_steps(("a", "true", ["missing"])))
+
+    def test_cycle(self):
+        with pytest.raises(ValueError, match="cycle"):
+            validate_plan(_steps(("a", "true", ["c"]), ("b", "true", ["a"]), ("c", "true", ["b"]), ("d", "true", [])))
+
+
+class TestExecutePlan:
+    def test_independent_steps_run_in_parallel(self, tmp_path):
+        steps = _steps(*((f"s{i}", "sleep 0.5", []) for i in range(4)))
+        start = time.monotonic()
+        result = asyncio.run(execute_plan_async(steps, cwd=str(tmp_path), max_parallel=4))
+        assert time.monotonic() - start < 1.5
+        assert result.startswith("Plan finished: 4 ok")
+
+    def test_parallelism_is_bounded(self, tmp_path):
+        steps = _steps(*((f"s{i}", "sleep 0.3", []) for i in range(4)))
+        start = time.monotonic()
+        asyncio.run(execute_plan_async(steps, cwd=str(tmp_path), max_parallel=2))
+        assert time.monotonic() - start >= 0.6
+
+    def test_dependencies_run_in_order(self, tmp_path):
+        steps = _steps(
+            ("write", "sleep 0.2; echo data > a.txt", []),
+            ("copy", "cp a.txt b.txt", ["write"]),
+        )
+        result = asyncio.run(execute_plan_async(steps, cwd=str(tmp_path)))
+        assert "[copy] ok" in result
+        assert (tmp_path / "b.txt").read_text() == "data\n"
+
+    def test_failure_skips_dependents_only(self, tmp_path):
+        steps = _steps(
+            ("fail", "echo broken >&2; exit 2", []),
+            ("after", "touch after.txt", ["fail"]),
+            ("after-after", "touch after2.txt", ["after"]),
+            ("other", "touch other.txt", []),
+        )
+        result = asyncio.run(execute_plan_async(steps, cwd=str(tmp_path)))
+        assert "[fail] failed (exit code 2)" in result
+        assert "Stderr:\nbroken" in result
+        assert "[after] skipped" in result
+        assert "[after-after] skipped" in result
+        assert "[other] ok" in result
+        assert not (tmp_path / "after.txt").exists()
+        assert (tmp_path / "other.txt").exists()
+
+    def test_output_is_shown_as_it_arrives(self, tmp_path):
+        printed = []
+        steps = _steps(("slow", "echo first; echo oops >&2; sleep 0.5; printf last", []))
+
+        def record(self, name, line):
+            printed.append((time.monotonic(), name, line))
+
+        with patch.object(StepOutput, "_print", record):
+            start = time.monotonic()
+            asyncio.run(execute_plan_async(steps, cwd=str(tmp_path)))
+            finished = time.monotonic()
+
+        lines = [(name, line) for _, name, line in printed]
+        # stdout and stderr are separate pipes, so only the order within each is fixed
+        assert sorted(lines[:2]) == [("stderr", "oops"), ("stdout", "first")]
+        assert lines[2:] == [("stdout", "last")]
+        assert max(at for at, _, _ in printed[:2]) - start < 0.4
+        assert finished - printed[0][0] >= 0.4
+
+
+class TestRunPlanWithConfirmation:
+    def test_invalid_plan_is_reported(self, tmp_path):
+        result = asyncio.run(run_plan_with_confirmation_async(_steps(("a", "true", ["a"])), cwd=str(tmp_path)))
+        assert result.startswith("Error: Invalid plan")
+
+    def test_dry_run(self, tmp_path):
+        result = asyncio.run(run_plan_with_confirmation_async(_steps(("a", "touch a.txt", [])), dry_run=True, cwd=str(tmp_path)))
+        assert result == "Dry run: Plan not executed"
+        assert not (tmp_path / "a.txt").exists()
+
+    def test_confirmed_once(self, tmp_path):
+        steps = _steps(("a", "touch a.txt", []), ("b", "touch b.txt", []))
+        with patch("nlcmd.plan.prompts.confirm", new=AsyncMock(return_value=True)) as confirm:
+            result = asyncio.run(run_plan_with_confirmation_async(steps, cwd=str(tmp_path)))
+        confirm.assert_awaited_once()
+        assert result.startswith("Plan finished: 2 ok")
+
+    def test_declined(self, tmp_path):
+        with patch("nlcmd.plan.prompts.confirm", new=AsyncMock(return_value=False)):
+            result = asyncio.run(run_plan_with_confirmation_async(_steps(("a", "touch a.txt", [])), cwd=str(tmp_path)))
+        assert result == "Execution cancelled by user"
+        assert not (tmp_path / "a.txt").exists()
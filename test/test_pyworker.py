@@ -0,0 +1,93 @@
+import asyncio
+import platform
+import time
+
+import pytest
+
+from nlcmd.pyworker import PythonWorkerPool
+from nlcmd.utils import execute_prepared_command_async
+
+
+@pytest.fixture
+def pool():
+    pool = PythonWorkerPool(size=1, preload=["json"])
+    yield pool
+    pool.close()
+
+
+def _run(pool, code, cwd, args=(), timeout=10):
+    return pool.communicate(pool.acquire(), code, cwd, args, timeout)
+
+
+class TestPythonWorkerPool:
+    def test_captures_output_and_exit_code(self, pool, tmp_path):
+        result = _run(pool, "import sys; print('out'); print('err', file=sys.stderr); sys.exit(3)", str(tmp_path))
+        assert result.stdout.strip() == b"out"
+        assert result.stderr.strip() == b"err"
+        assert result.returncode == 3
+
+    def test_runs_in_cwd_with_args(self, pool, tmp_path):
+        result = _run(pool, "import os, sys; print(os.getcwd()); print(sys.argv)", str(tmp_path), ["a", "b"])
+        assert result.stdout.decode().splitlines() == [str(tmp_path), "['-c', 'a', 'b']"]
+
+    def test_exception_traceback(self, pool, tmp_path):
+        result = _run(pool, "raise ValueError('boom')", str(tmp_path))
+        assert result.returncode == 1
+        assert b'File "<string>", line 1' in result.stderr
+        assert b"ValueError: boom" in result.stderr
+
+    def test_snippets_do_not_share_state(self, pool, tmp_path):
+        _run(pool, "import json; json.shared = 1", str(tmp_path))
+        result = _run(pool, "import json; print(hasattr(json, 'shared'))", str(tmp_path))
+        assert result.stdout.strip() == b"False"
+
+    def test_keeps_warm_workers(self, pool, tmp_path):
+        pool.fill()
+        warm = pool._idle.queue[0]
+        worker = pool.acquire()
+        assert worker is warm
+        assert pool._idle.qsize() == 1
+        pool.communicate(worker, "pass", str(tmp_path))
+
+    def test_timeout_returns_partial_output(self, pool, tmp_path):
+        start = time.monotonic()
+        result = _run(pool, "import time; print('started'); time.sleep(30)", str(tmp_path), timeout=0.5)
+        assert time.monotonic() - start < 5
+        assert result.timed_out
+        assert result.stdout.strip() == b"started"
+
+    def test_output_over_limit_kills_worker(self, pool, tmp_path):
+        start = time.monotonic()
+        result = pool.communicate(pool.acquire(), "while True: print('x' * 10**6)", str(tmp_path), timeout=30, limit=100_000)
+        assert time.monotonic() - start < 10
+        assert not result.timed_out and result.returncode != 0
+        assert len(result.stdout) == 100_000
+        assert result.stdout_dropped > 0
+
+    @pytest.mark.skipif(platform.system() == "Windows", reason="uses resource limits")
+    def test_cpu_limit_starts_with_the_snippet(self, tmp_path, monkeypatch):
+        import resource
+
+        # A preload that uses more CPU than the snippet's whole budget
+        (tmp_path / "slow_preload.py").write_text(
+            "import time\nstart = time.process_time()\nwhile time.process_time() - start < 1.5:\n    pass\n"
+        )
+        monkeypatch.setenv("PYTHONPATH", str(tmp_path))
+        pool = PythonWorkerPool(size=0, preload=["slow_preload"], limits=((resource.RLIMIT_CPU, 1),))
+        try:
+            result = pool.communicate(pool.acquire(), "print('ran')", str(tmp_path), timeout=30)
+            assert result.returncode == 0 and result.stdout.strip() == b"ran"
+            spin = pool.communicate(pool.acquire(), "while True: pass", str(tmp_path), timeout=30)
+            assert not spin.timed_out and spin.returncode != 0
+        finally:
+            pool.close()
+
+class TestPythonSnippetExecution:
+    def test_snippet_runs_on_worker(self, tmp_path):
+        result = asyncio.run(execute_prepared_command_async('python -c "print(6 * 7)"', cwd=str(tmp_path), timeout=10))
+        assert result.ok
+        assert result.stdout == "42\n"
+
+    def test_shell_features_fall_back_to_shell(self, tmp_path):
+        asyncio.run(execute_prepared_command_async("python -c 'print(1)' > out.txt", cwd=str(tmp_path), timeout=10))
+        assert (tmp_path / "out.txt").read_text() == "1\n"
@@ -0,0 +1,95 @@
+import asyncio
+import json
+from unittest.mock import patch
+
+from pydantic_ai.messages import ModelResponse, TextPart, ToolCallPart, ToolReturnPart
+
+from nlcmd import llm
+from nlcmd.loadtest import run_load
+from nlcmd.replay import ReplayModel, ReplayTurn, load_transcript, parse_turn, record_turn, simulated_wait
+
+SCRIPT = [
+    {"prompt": "list files", "responses": [
+        {"tool_calls": [{"name": "run_shell_command", "args": {"command": "ls"}}]},
+        {"text": "Here are your files."},
+    ]},
+    {"prompt": "hello", "responses": [{"text": "Hi there, how can I help?"}]},
+]
+
+
+def _generator(tmp_path, model):
+    workspace = tmp_path / "workspace"
+    workspace.mkdir(exist_ok=True)
+    return llm.CommandGenerator(workspace=str(workspace), model=model)
+
+
+class TestTranscripts:
+    def test_scripted_formats(self, tmp_path):
+        array = tmp_path / "script.json"
+        array.write_text(json.dumps(SCRIPT), encoding="utf-8")
+        lines = tmp_path / "script.jsonl"
+        lines.write_text("\n".join(json.dumps(turn) for turn in SCRIPT), encoding="utf-8")
+
+        for path in (array, lines):
+            turns = load_transcript(path)
+            assert [turn.prompt for turn in turns] == ["list files", "hello"]
+            call = turns[0].responses[0].parts[0]
+            assert isinstance(call, ToolCallPart) and call.args == {"command": "ls"}
+            assert turns[1].responses[0].parts[0].content == "Hi there, how can I help?"
+
+    def test_recorded_turn_round_trip(self, tmp_path):
+        generator = _generator(tmp_path, ReplayModel([parse_turn(turn) for turn in SCRIPT]))
+        with patch.object(llm.config, "RECORD_TRANSCRIPTS", True):
+            asyncio.run(generator.run_task("list files", dry_run=True))
+
+        (turn,) = load_transcript(tmp_path / "workspace" / ".nlcmd" / "transcripts.jsonl")
+        assert turn.prompt == "list files"
+        assert [type(part) for response in turn.responses for part in response.parts] == [ToolCallPart, TextPart]
+
+    def test_record_turn_replays(self, tmp_path):
+        path = tmp_path / "transcripts.jsonl"
+        recorder = _generator(tmp_path, ReplayModel([parse_turn(turn) for turn in SCRIPT]))
+        asyncio.run(recorder.run_task("hello"))
+        record_turn(path, "hello", recorder.message_history)
+
+        replayer = _generator(tmp_path, ReplayModel(load_transcript(path)))
+        assert asyncio.run(replayer.run_task("hello")) == "Hi there, how can I help?"
+
+
+class TestReplayModel:
+    def test_replays_tool_calls_through_the_agent(self, tmp_path):
+        generator = _generator(tmp_path, ReplayModel([parse_turn(turn) for turn in SCRIPT]))
+        assert asyncio.run(generator.run_task("list files", dry_run=True)) == "Here are your files."
+        returns = [part for message in generator.message_history for part in message.parts if isinstance(part, ToolReturnPart)]
+        assert returns[0].tool_name == "run_shell_command"
+        assert asyncio.run(generator.run_task("hello")) == "Hi there, how can I help?"
+        assert "No recorded turn" in asyncio.run(generator.run_task("unknown"))
+
+    def test_simulated_latency_is_accounted(self, tmp_path):
+        turn = ReplayTurn("hello", [ModelResponse(parts=[TextPart(content="x" * 32)])])
+        generator = _generator(tmp_path, ReplayModel([turn], latency=0.01, chars_per_second=3200))
+
+        async def run(stream):
+            waited = [0.0]
+            token = simulated_wait.set(waited)
+            try:
+                await generator.run_task("hello", stream=stream)
+            finally:
+                simulated_wait.reset(token)
+            return waited[0]
+
+        assert abs(asyncio.run(run(None)) - 0.02) < 1e-9
+        assert abs(asyncio.run(run(llm.ResponseStream())) - 0.02) < 1e-9
+
+
+class TestLoadHarness:
+    def test_run_load_reports(self, tmp_path):
+        turns = [parse_turn(turn) for turn in SCRIPT]
+        result = asyncio.run(run_load(turns, sessions=2, rounds=2, latency=0.001, workspace=str(tmp_path)))
+        assert result["turns"] == 8
+        assert result["throughput"] > 0
+        assert 0 <= result["overhead_p50"] <= result["turn_p95"]
+        assert "heap_peak_mb" in result
+
+        result = asyncio.run(run_load(turns, rounds=1, heap=False, workspace=str(tmp_path)))
+        assert "heap_peak_mb" not in result
@@ -0,0 +1,180 @@
+import asyncio
+import time
+
+import pytest
+from pydantic_ai import Agent
+from pydantic_ai.exceptions import ModelHTTPError
+from pydantic_ai.messages import ModelResponse, TextPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from nlcmd.resilience import CircuitBreaker, CircuitOpenError, ResilientModel
+
+
+def _model(name, calls, failures=(), delay=0.0):
+    """A FunctionModel answering `name`, raising the given errors on its first calls."""
+    failures = list(failures)
+
+    async def respond(messages, info: AgentInfo):
+        calls.append(name)
+        await asyncio.sleep(delay)
+        if failures:
+            raise failures.pop(0)
+        return ModelResponse(parts=[TextPart(name)])
+
+    async def stream(messages, info: AgentInfo):
+        calls.append(name)
+        await asyncio.sleep(delay)
+        if failures:
+            raise failures.pop(0)
+        yield name
+
+    return FunctionModel(respond, stream_function=stream, model_name=name)
+
+
+def _run(model) -> str:
+    return asyncio.run(Agent(model).run("hi")).output
+
+
+class TestRetries:
+    def test_transient_errors_are_retried(self):
+        calls = []
+        model = ResilientModel(_model("primary", calls, [ModelHTTPError(503, "primary"), ModelHTTPError(429, "primary")]), backoff=0)
+        assert _run(model) == "primary"
+        assert calls == ["primary"] * 3
+
+    def test_client_errors_are_not_retried(self):
+        calls = []
+        model = ResilientModel(_model("primary", calls, [ModelHTTPError(400, "primary")]), backoff=0)
+        with pytest.raises(ModelHTTPError):
+            _run(model)
+        assert calls == ["primary"]
+
+    def test_deadline(self):
+        calls = []
+        model = ResilientModel(_model("primary", calls, delay=1.0), retries=1, deadline=0.1, backoff=0)
+        start = time.monotonic()
+        with pytest.raises(TimeoutError):
+            _run(model)
+        assert time.monotonic() - start < 0.8
+        assert len(calls) == 2
+
+
+class TestHedging:
+    def test_slow_primary_is_hedged(self):
+        calls = []
+        model = ResilientModel(_model("primary", calls, delay=2.0), _model("secondary", calls), hedge_delay=0.05)
+        start = time.monotonic()
+        assert _run(model) == "secondary"
+        assert time.monotonic() - start < 1.0
+        assert calls == ["primary", "secondary"]
+
+    def test_fast_primary_is_not_hedged(self):
+        calls = []
+        model = ResilientModel(_model("primary", calls), _model("secondary", calls), hedge_delay=1.0)
+        assert _run(model) == "primary"
+        assert calls == ["primary"]
+
+    def test_failed_primary_goes_to_secondary_at_once(self):
+        calls = []
+        model = ResilientModel(_model("primary", calls, [ModelHTTPError(502, "primary")]), _model("secondary", calls), hedge_delay=5.0, backoff=0)
+        start = time.monotonic()
+        assert _run(model) == "secondary"
+        assert time.monotonic() - start < 1.0
+
+    def test_stream_falls_over_when_first_chunk_is_late(self):
+        calls = []
+        model = ResilientModel(_model("primary", calls, delay=2.0), _model("secondary", calls), hedge_delay=0.05)
+
+        async def main():
+            async with Agent(model).run_stream("hi") as result:
+                return await result.get_output()
+
+        start = time.monotonic()
+        assert asyncio.run(main()) == "secondary"
+        assert time.monotonic() - start < 1.0
+
+    def test_late_stream_on_hedge_is_not_a_failure_when_p95_equals_deadline(self):
+        calls = []
+        model = ResilientModel(_model("primary", calls, delay=2.0), _model("secondary", calls), deadline=0.1, hedge_delay=0.1)
+
+        async def main():
+            async with Agent(model).run_stream("hi") as result:
+                return await result.get_output()
+
+        assert asyncio.run(main()) == "secondary"
+        assert model.breakers[id(model.wrapped)].consecutive == 0
+
+
+class TestStreamTimeouts:
+    @staticmethod
+    def _stream_model(pauses):
+        """Streams one chunk per pause, sleeping that long before it."""
+        async def respond(messages, info: AgentInfo):
+            return ModelResponse(parts=[TextPart("unused")])
+
+        async def stream(messages, info: AgentInfo):
+            for i, pause in enumerate(pauses):
+                await asyncio.sleep(pause)
+                yield f"chunk{i} "
+
+        return FunctionModel(respond, stream_function=stream, model_name="streamer")
+
+    @staticmethod
+    def _collect(model, received):
+        async def main():
+            async with Agent(model).run_stream("hi") as result:
+                async for text in result.stream_output(debounce_by=None):
+                    received.append(text)
+
+        asyncio.run(main())
+
+    def test_stream_stalling_after_first_chunk_times_out(self):
+        model = ResilientModel(self._stream_model([0, 5.0]), retries=0, idle_timeout=0.2)
+        received = []
+
+        start = time.monotonic()
+        with pytest.raises(TimeoutError):
+            self._collect(model, received)
+        assert time.monotonic() - start < 2.0
+        assert received and received[-1].startswith("chunk0")
+        assert model.breakers[id(model.wrapped)].consecutive == 1
+
+    def test_overall_stream_deadline(self):
+        # Every chunk is within the idle timeout, but together they overrun the deadline
+        model = ResilientModel(self._stream_model([0] + [0.1] * 30), retries=0, idle_timeout=1.0, stream_deadline=0.5)
+
+        start = time.monotonic()
+        with pytest.raises(TimeoutError):
+            self._collect(model, [])
+        assert time.monotonic() - start < 2.0
+
+    def test_steady_stream_completes(self):
+        model = ResilientModel(self._stream_model([0, 0.05, 0.05]), retries=0, idle_timeout=0.5, stream_deadline=5.0)
+        received = []
+
+        self._collect(model, received)
+        assert received[-1] == "chunk0 chunk1 chunk2 "
+
+
+class TestCircuitBreaker:
+    def test_opens_and_fails_fast(self):
+        calls = []
+        errors = [ModelHTTPError(503, "primary")] * 10
+        model = ResilientModel(_model("primary", calls, errors), retries=5, backoff=0)
+        model.breakers[id(model.wrapped)] = CircuitBreaker(failures=3, cooldown=60)
+        with pytest.raises(CircuitOpenError):
+            _run(model)
+        assert len(calls) == 3
+        with pytest.raises(CircuitOpenError):
+            _run(model)
+        assert len(calls) == 3
+
+    def test_half_open_trial(self):
+        breaker = CircuitBreaker(failures=1, cooldown=0.05)
+        breaker.failure()
+        assert breaker.state == "open" and not breaker.allow()
+        time.sleep(0.06)
+        assert breaker.allow()
+        assert not breaker.allow()
+        breaker.success()
+        assert breaker.state == "closed" and breaker.allow()
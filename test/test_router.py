@@ -0,0 +1,93 @@
+import asyncio
+import json
+from unittest.mock import patch
+
+from pydantic_ai.messages import ModelResponse, TextPart, ToolCallPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+from pydantic_ai.usage import RunUsage
+
+from nlcmd import llm
+from nlcmd.llm import create_agent
+from nlcmd.router import RouterModel, RouteState, RouteStats, classify, current_route, escalate, route_entry
+
+
+class TestClassify:
+    def test_short_command_is_fast(self):
+        assert classify("list files").route == "fast"
+        assert classify("查看当前目录下的文件").route == "fast"
+
+    def test_multi_step_or_analysis_is_strong(self):
+        assert classify("compress the logs then upload them").route == "strong"
+        assert classify("分析一下这个目录的磁盘占用").route == "strong"
+        assert classify("summarize report.docx").route == "strong"
+        assert classify("x" * 200).route == "strong"
+        assert classify("ls\nrm a").route == "strong"
+
+    def test_escalate_only_from_fast(self):
+        state = RouteState("fast", "test")
+        token = current_route.set(state)
+        try:
+            escalate("command failed")
+            escalate("second")
+        finally:
+            current_route.reset(token)
+        assert (state.initial, state.route, state.escalated) == ("fast", "strong", "command failed")
+        # No run in progress: nothing to escalate
+        escalate("ignored")
+
+
+class TestRouting:
+    def _generator(self, workspace, fast, strong):
+        with patch.object(llm.config, "OPENAI_API_KEY", "test"):
+            generator = llm.CommandGenerator(workspace=str(workspace))
+        model = RouterModel(FunctionModel(strong, model_name="strong"), FunctionModel(fast, model_name="fast"))
+        generator.agent, _ = create_agent(model, str(workspace))
+        generator.routing = True
+        return generator
+
+    def test_simple_request_stays_on_fast_model(self, tmp_path):
+        calls = []
+
+        def fast(messages, info: AgentInfo):
+            calls.append("fast")
+            return ModelResponse(parts=[TextPart("ok")])
+
+        def strong(messages, info: AgentInfo):
+            calls.append("strong")
+            return ModelResponse(parts=[TextPart("ok")])
+
+        generator = self._generator(tmp_path, fast, strong)
+        asyncio.run(generator.run_task("list files"))
+        asyncio.run(generator.run_task("explain what this directory is for"))
+        assert calls == ["fast", "strong"]
+
+    def test_invalid_tool_call_escalates(self, tmp_path):
+        calls = []
+
+        def fast(messages, info: AgentInfo):
+            calls.append("fast")
+            return ModelResponse(parts=[ToolCallPart("list_memories", {"memory_type": "bogus"})])
+
+        def strong(messages, info: AgentInfo):
+            calls.append("strong")
+            return ModelResponse(parts=[TextPart("done")])
+
+        generator = self._generator(tmp_path, fast, strong)
+        assert asyncio.run(generator.run_task("list files")) == "done"
+        assert calls == ["fast", "strong"]
+
+        entries = [json.loads(line) for line in (tmp_path / ".nlcmd" / "routes.jsonl").read_text().splitlines()]
+        assert entries[0]["route"] == "fast"
+        assert entries[0]["escalated"] == "tool call retry"
+        assert entries[0]["models"] == ["fast", "strong"]
+        assert generator.route_stats.summary()[0].startswith("fast: 1 run(s)")
+
+
+class TestRouteStats:
+    def test_totals(self):
+        stats = RouteStats()
+        state = RouteState("strong", "test")
+        for duration in (1.0, 3.0):
+            stats.record(route_entry(state, [], RunUsage(requests=1, input_tokens=100, output_tokens=10), duration))
+        assert stats.totals["strong"]["runs"] == 2
+        assert stats.summary() == ["strong: 2 run(s), avg 2.00s, 200 in / 20 out tokens"]
@@ -0,0 +1,154 @@
+import asyncio
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+pytest.importorskip("websockets")
+
+from nlcmd import session as shell_sessions
+from nlcmd.client import Client, ServerError
+from nlcmd.replay import ReplayModel, parse_turn
+from nlcmd.server import SessionServer
+
+SCRIPT = [
+    {"prompt": "say hi", "responses": [
+        {"tool_calls": [{"name": "run_shell_command", "args": {"command": "echo hi-from-server"}}]},
+        {"text": "Printed the greeting."},
+    ]},
+    {"prompt": "hello", "responses": [{"text": "Hi there, how can I help?"}]},
+    {"prompt": "set foo", "responses": [
+        {"tool_calls": [{"name": "run_shell_command", "args": {"command": "export FOO=first-client"}}]},
+        {"text": "Set."},
+    ]},
+    {"prompt": "show foo", "responses": [
+        {"tool_calls": [{"name": "run_shell_command", "args": {"command": "echo \"foo=$FOO\""}}]},
+        {"text": "Shown."},
+    ]},
+]
+
+
+async def _serve(tmp_path, token=""):
+    server = SessionServer(model=ReplayModel([parse_turn(turn) for turn in SCRIPT]), token=token)
+    listener = await server.start("127.0.0.1", 0)
+    url = f"ws://127.0.0.1:{listener.sockets[0].getsockname()[1]}"
+    return server, listener, url, str(tmp_path / "workspace")
+
+
+class TestSessionServer:
+    def test_sessions_share_workspace_state_but_not_history(self, tmp_path):
+        async def main():
+            server, listener, url, workspace = await _serve(tmp_path)
+            async with listener:
+                first = await Client.connect(url, workspace)
+                second = await Client.connect(url, workspace)
+                output, questions = [], []
+
+                def confirm(question):
+                    questions.append(question)
+                    return True
+
+                answers = await asyncio.gather(
+                    first.run("say hi", write=output.append, confirm=confirm),
+                    second.run("hello"),
+                )
+                histories = [len(session.generator.message_history) for session in server.sessions.values()]
+                shared = {id(session.generator.agent) for session in server.sessions.values()}
+                await first.close()
+                await second.close()
+            return answers, "".join(output), questions, histories, shared, server
+
+        answers, output, questions, histories, shared, server = asyncio.run(main())
+        assert answers == ["Printed the greeting.", "Hi there, how can I help?"]
+        assert "Generated Command" in output and "Command executed successfully" in output
+        assert questions == ["Do you want to execute this command?"]
+        assert sorted(histories) == [2, 4]
+        assert len(shared) == 1 and len(server.workspaces) == 1
+
+    def test_declined_confirmation_does_not_run(self, tmp_path):
+        async def main():
+            _, listener, url, workspace = await _serve(tmp_path)
+            async with listener:
+                client = await Client.connect(url, workspace)
+                output = []
+                answer = await client.run("say hi", write=output.append, confirm=lambda question: False)
+                await client.close()
+            return answer, "".join(output)
+
+        answer, output = asyncio.run(main())
+        assert answer == "Printed the greeting."
+        assert "Execution cancelled." in output and "Command executed successfully" not in output
+
+    def test_clients_get_their_own_shell(self, tmp_path):
+        workspace = tmp_path / "workspace"
+        workspace.mkdir()
+        (workspace / "sandbox.toml").write_text('backend = "session"\n')
+
+        async def main():
+            _, listener, url, path = await _serve(tmp_path)
+            async with listener:
+                first = await Client.connect(url, path)
+                second = await Client.connect(url, path)
+                outputs = {"first": [], "second": []}
+                await first.run("set foo", confirm=lambda question: True)
+                await first.run("show foo", write=outputs["first"].append, confirm=lambda question: True)
+                await second.run("show foo", write=outputs["second"].append, confirm=lambda question: True)
+                owners = {key[1] for key in shell_sessions._sessions}
+                await first.close()
+                await second.close()
+                # Disconnecting closes the client's shell
+                for _ in range(50):
+                    if not shell_sessions._sessions:
+                        break
+                    await asyncio.sleep(0.05)
+            return {name: "".join(output) for name, output in outputs.items()}, owners
+
+        outputs, owners = asyncio.run(main())
+        assert "foo=first-client" in outputs["first"]
+        assert "foo=first-client" not in outputs["second"] and "foo=" in outputs["second"]
+        assert len(owners) == 2 and None not in owners
+        assert not shell_sessions._sessions
+
+    def test_rejects_bad_token(self, tmp_path):
+        async def main():
+            _, listener, url, workspace = await _serve(tmp_path, token="secret")
+            async with listener:
+                with pytest.raises(ServerError, match="Invalid token"):
+                    await Client.connect(url, workspace, token="wrong")
+                client = await Client.connect(url, workspace, token="secret")
+                await client.close()
+
+        asyncio.run(main())
+
+    def test_concurrent_hellos_build_workspace_once_off_the_loop(self, tmp_path):
+        built = []
+
+        def slow_workspace(path, model):
+            assert threading.current_thread() is not threading.main_thread()
+            time.sleep(0.2)
+            built.append(path)
+            return object()
+
+        async def main():
+            server = SessionServer(model=ReplayModel([]), token="")
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0.01)
+
+            ticking = asyncio.create_task(ticker())
+            with patch("nlcmd.server.SharedWorkspace", side_effect=slow_workspace):
+                first, second = await asyncio.gather(
+                    server.workspace(str(tmp_path / "workspace")), server.workspace(str(tmp_path / "workspace")),
+                )
+            ticking.cancel()
+            return first, second, ticks
+
+        first, second, ticks = asyncio.run(main())
+        assert first is second and len(built) == 1
+        # The event loop kept running while the workspace was built
+        assert ticks > 5
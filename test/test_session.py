@@ -0,0 +1,108 @@
+import asyncio
+import platform
+import time
+
+import pytest
+
+from nlcmd.session import ShellSession
+from nlcmd.utils import ShellSessionExecutor, SandboxConfig, execute_prepared_command_async
+
+pytestmark = pytest.mark.skipif(platform.system() == "Windows", reason="uses POSIX shell commands")
+
+
+@pytest.fixture
+def session(tmp_path):
+    session = ShellSession(str(tmp_path))
+    yield session
+    session.close()
+
+
+class TestShellSession:
+    def test_separates_stdout_stderr_and_exit_code(self, session):
+        result = session.run("echo out; echo err >&2; exit_code() { return 3; }; exit_code")
+        assert result.stdout == b"out\n"
+        assert result.stderr == b"err\n"
+        assert result.returncode == 3
+
+    def test_state_carries_over(self, session, tmp_path):
+        (tmp_path / "sub").mkdir()
+        session.run("cd sub; export GREETING=hello")
+        result = session.run('pwd; echo "$GREETING"')
+        assert result.stdout.decode().splitlines() == [str(tmp_path / "sub"), "hello"]
+
+    def test_reuses_one_process(self, session):
+        session.run("true")
+        pid = session._process.pid
+        session.run("true")
+        assert session._process.pid == pid
+
+    def test_output_without_trailing_newline(self, session):
+        assert session.run("printf 'abc'").stdout == b"abc"
+
+    def test_syntax_error_keeps_session(self, session):
+        session.run("export KEEP=1")
+        result = session.run("if then")
+        assert result.returncode != 0
+        assert session.run('echo "$KEEP"').stdout == b"1\n"
+
+    def test_timeout_kills_and_restarts(self, session):
+        start = time.monotonic()
+        result = session.run("echo partial; sleep 30", timeout=0.5)
+        assert time.monotonic() - start < 5
+        assert result.timed_out
+        assert result.stdout == b"partial\n"
+        assert not session.alive
+
+        result = session.run("echo again")
+        assert result.stdout == b"again\n"
+        assert result.restarted
+
+    def test_exit_ends_session(self, session):
+        result = session.run("exit 4")
+        assert result.returncode == 4
+        assert not result.timed_out
+        assert session.run("echo back").restarted
+
+    def test_output_limit(self, session):
+        result = session.run("head -c 5000 /dev/zero | tr '\\0' a", limit=1000)
+        assert len(result.stdout) == 1000
+        assert result.stdout_dropped == 4000
+
+
+class TestShellSessionExecutor:
+    def test_formats_result(self, tmp_path):
+        (tmp_path / "sandbox.toml").write_text('backend = "session"\n')
+
+        async def main():
+            await execute_prepared_command_async("export NAME=nlcmd", cwd=str(tmp_path), timeout=10)
+            return await execute_prepared_command_async('echo "$NAME"', cwd=str(tmp_path), timeout=10)
+
+        result = asyncio.run(main())
+        assert result.executor == "session"
+        assert result.stdout == "nlcmd\n"
+
+    def test_python_snippet_runs_in_session(self, tmp_path):
+        (tmp_path / "sub").mkdir()
+        (tmp_path / "sandbox.toml").write_text('backend = "session"\n')
+        snippet = """python -c "import os; print(os.getcwd(), os.environ.get('FOO'))\""""
+
+        async def main():
+            await execute_prepared_command_async("cd sub && export FOO=bar", cwd=str(tmp_path), timeout=10)
+            return await execute_prepared_command_async(snippet, cwd=str(tmp_path), timeout=10)
+
+        result = asyncio.run(main())
+        assert result.stdout == f"{tmp_path.resolve() / 'sub'} bar\n"
+
+    def test_cancel_closes_session(self, tmp_path):
+        executor = ShellSessionExecutor(SandboxConfig(backend="session"))
+
+        async def main():
+            task = asyncio.create_task(executor.run("sleep 30", str(tmp_path), timeout=60))
+            await asyncio.sleep(0.3)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        start = time.monotonic()
+        asyncio.run(main())
+        assert time.monotonic() - start < 5
@@ -0,0 +1,192 @@
+import asyncio
+import os
+
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from nlcmd import skills
+from nlcmd.memory import get_indexer
+from nlcmd.skills import CachedSkillsToolset, SkillSelector, chunk_text, fingerprint, load_skills
+
+
+def _write_skill(root, name, description="Does things", body="Use it."):
+    folder = root / name
+    (folder / "scripts").mkdir(parents=True, exist_ok=True)
+    (folder / "SKILL.md").write_text(f"---\nname: {name}\ndescription: {description}\n---\n{body}\n", encoding="utf-8")
+    (folder / "scripts" / "run.py").write_text("print('hi')\n", encoding="utf-8")
+    (folder / "reference.md").write_text("# Reference\n", encoding="utf-8")
+    return folder
+
+
+def _touch(path, seconds):
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + seconds * 10**9))
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    skills._loaded.clear()
+    yield
+    skills._loaded.clear()
+
+
+class TestSkillsManifest:
+    def test_manifest_round_trip(self, tmp_path):
+        root = tmp_path / "skills"
+        _write_skill(root, "alpha")
+        manifest = tmp_path / "skills.json"
+
+        scanned, source = load_skills([root], manifest)
+        assert source == "scan"
+        assert manifest.exists()
+
+        skills._loaded.clear()
+        cached, source = load_skills([root], manifest)
+        assert source == "manifest"
+        (skill,) = cached
+        assert skill.name == "alpha"
+        assert skill.content == scanned[0].content
+        assert [r.name for r in skill.resources] == ["reference.md"]
+        assert [s.name for s in skill.scripts] == ["scripts/run.py"]
+
+        assert load_skills([root], manifest)[1] == "memory"
+
+    def test_changes_invalidate(self, tmp_path):
+        root = tmp_path / "skills"
+        folder = _write_skill(root, "alpha")
+        manifest = tmp_path / "skills.json"
+        before = fingerprint([root])
+        load_skills([root], manifest)
+
+        (folder / "SKILL.md").write_text("---\nname: alpha\ndescription: Changed\n---\nNew body\n", encoding="utf-8")
+        _touch(folder / "SKILL.md", 5)
+        assert fingerprint([root]) != before
+        (skill,), source = load_skills([root], manifest)
+        assert source == "scan"
+        assert skill.description == "Changed"
+
+        _write_skill(root, "beta")
+        loaded, source = load_skills([root], manifest)
+        assert source == "scan"
+        assert sorted(s.name for s in loaded) == ["alpha", "beta"]
+
+    def test_later_directory_wins(self, tmp_path):
+        _write_skill(tmp_path / "bundled", "alpha", description="Bundled")
+        _write_skill(tmp_path / "user", "alpha", description="User")
+        loaded, _ = load_skills([tmp_path / "bundled", tmp_path / "user", tmp_path / "missing"])
+        assert [s.description for s in loaded] == ["User"]
+
+    def test_instructions_are_built_once(self, tmp_path):
+        _write_skill(tmp_path / "skills", "alpha")
+        toolset = CachedSkillsToolset([tmp_path / "skills"])
+        first = asyncio.run(toolset.get_instructions(None))
+        assert "<name>alpha</name>" in first
+        assert asyncio.run(toolset.get_instructions(None)) is first
+
+        @toolset.skill(name="beta", description="Programmatic")
+        def beta() -> str:
+            return "Beta instructions"
+
+        assert "<name>beta</name>" in asyncio.run(toolset.get_instructions(None))
+
+    def test_empty_catalog(self, tmp_path):
+        toolset = CachedSkillsToolset([tmp_path / "missing"])
+        assert asyncio.run(toolset.get_instructions(None)) is None
+
+
+class _Ctx:
+    def __init__(self, prompt):
+        self.prompt = prompt
+
+
+def _catalog(tmp_path, count=6):
+    root = tmp_path / "skills"
+    for i in range(count):
+        _write_skill(root, f"skill-{i}", description=f"Handles topic{i} documents")
+    folder = _write_skill(root, "sysinfo", description="Shows computer information")
+    (folder / "SKILL.md").write_text(
+        "---\nname: sysinfo\ndescription: Shows computer information\ntriggers:\n- 电脑信息\n---\nRun it.\n",
+        encoding="utf-8",
+    )
+    return root
+
+
+def _encoder(texts):
+    # One dimension per topic word, so "topic3" queries are closest to skill-3
+    return np.array([[float(f"topic{i}" in text) for i in range(6)] + [0.1] for text in texts])
+
+
+class TestSkillSelection:
+    def test_embedding_top_k(self, tmp_path):
+        toolset = CachedSkillsToolset([_catalog(tmp_path)], top_k=2, encoder=_encoder)
+        text = asyncio.run(toolset.get_instructions(_Ctx("convert the topic3 report")))
+        assert "<name>skill-3</name>" in text
+        assert text.count("<skill>") == 2
+        assert "`list_skills` shows all 7" in text
+
+    def test_trigger_always_selected(self, tmp_path):
+        selector = SkillSelector(list(load_skills([_catalog(tmp_path)])[0]), top_k=1, encoder=_encoder)
+        assert [skill.name for skill in selector.select("看看电脑信息 topic3")] == ["sysinfo"]
+
+    def test_keyword_fallback(self, tmp_path):
+        selector = SkillSelector(list(load_skills([_catalog(tmp_path)])[0]), top_k=1)
+        assert [skill.name for skill in selector.select("show computer information")] == ["sysinfo"]
+
+    def test_failed_encoder_is_not_retried(self, tmp_path):
+        calls = []
+
+        def broken(texts):
+            calls.append(texts)
+            raise RuntimeError("model unavailable")
+
+        selector = SkillSelector(list(load_skills([_catalog(tmp_path)])[0]), top_k=1, encoder=broken)
+        for _ in range(3):
+            assert [skill.name for skill in selector.select("show computer information")] == ["sysinfo"]
+        assert len(calls) == 1
+
+    def test_memory_encoder_uses_the_shared_indexer(self, tmp_path):
+        index_path = tmp_path / "memory" / "index"
+        get_indexer(index_path)._ensure_model = lambda: "test_model"
+        with patch("nlcmd.memory.indexer.Embeddings") as embeddings_class:
+            embeddings_class.return_value.batchtransform.side_effect = lambda texts: [[1.0, 0.0]] * len(texts)
+            encode = skills.memory_encoder(index_path)
+            assert encode(["a", "b"]).shape == (2, 2)
+            encode(["c"])
+            assert get_indexer(index_path).embeddings is embeddings_class.return_value
+        assert embeddings_class.call_count == 1
+
+    def test_small_catalog_is_not_filtered(self, tmp_path):
+        toolset = CachedSkillsToolset([_catalog(tmp_path, count=2)], top_k=5, encoder=_encoder)
+        text = asyncio.run(toolset.get_instructions(_Ctx("anything")))
+        assert text.count("<skill>") == 3
+        assert "most relevant" not in text
+
+
+class TestResourceChunks:
+    def test_chunk_text(self):
+        text = "# Intro\n" + "a\n" * 30 + "```\n# not a heading\n```\n## Part two\n" + "b\n" * 30
+        chunks = chunk_text(text, 50)
+        assert "".join(chunk for _, chunk in chunks) == text
+        assert all(len(chunk) <= 50 for _, chunk in chunks)
+        titles = [title for title, _ in chunks]
+        assert titles[0] == "Intro"
+        assert "Intro (continued)" in titles
+        assert "Part two" in titles
+        assert "not a heading" not in titles
+
+    def test_read_resource_by_chunk(self, tmp_path):
+        folder = _write_skill(tmp_path / "skills", "alpha")
+        (folder / "reference.md").write_text("# One\n" + "x" * 80 + "\n# Two\n" + "y" * 80 + "\n", encoding="utf-8")
+        toolset = CachedSkillsToolset([tmp_path / "skills"], chunk_chars=100)
+        read = toolset.tools["read_skill_resource"].function
+
+        first = asyncio.run(read(None, "alpha", "reference.md"))
+        assert first.startswith("[reference.md: chunk 1 of 2. Chunks:\n1. One\n2. Two]")
+        assert "x" * 80 in first and "y" not in first
+        assert "y" * 80 in asyncio.run(read(None, "alpha", "reference.md", chunk=2))
+        assert asyncio.run(read(None, "alpha", "reference.md", chunk=3)).startswith("Error:")
+
+        toolset.chunk_chars = 0
+        assert asyncio.run(read(None, "alpha", "reference.md")).startswith("# One")
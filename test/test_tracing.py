@@ -0,0 +1,131 @@
+import json
+import subprocess
+import sys
+
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from typer.testing import CliRunner
+
+from nlcmd.stats import stats_app
+from nlcmd.tracing import (
+    TRACE_FILE, JsonlSpanExporter, WorkspaceSpanProcessor, read_spans, span_key, summarize, trace_workspace,
+    turn_breakdowns,
+)
+
+
+def _tracer(exporter):
+    provider = TracerProvider()
+    provider.add_span_processor(WorkspaceSpanProcessor())
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    return provider.get_tracer("test")
+
+
+def _record(name, span_id, parent_id=None, duration=1.0, start=0.0, trace_id="t1", **attributes):
+    return {"trace_id": trace_id, "span_id": span_id, "parent_id": parent_id, "name": name,
+            "start": start, "duration": duration, "status": "unset", "attributes": attributes}
+
+
+TURN = [
+    _record("agent_execution", "a", duration=10.0, route="fast", history_messages=2),
+    _record("model stream", "m1", "a", duration=3.0, ttft=0.4),
+    _record("chat gpt-test", "c1", "m1", duration=2.9, **{"gen_ai.request.model": "gpt-test"}),
+    _record("running tool", "t1", "a", duration=5.0, **{"gen_ai.tool.name": "run_shell_command"}),
+    _record("confirmation wait", "w1", "t1", duration=4.0),
+    _record("command", "x1", "t1", duration=0.8),
+    _record("model stream", "m2", "a", duration=1.5, ttft=0.2),
+]
+
+
+class TestExporter:
+    def test_writes_spans_without_content(self, tmp_path):
+        exporter = JsonlSpanExporter(tmp_path / "trace.jsonl")
+        with _tracer(exporter).start_as_current_span("outer", attributes={"route": "fast", "gen_ai.input.messages": "[]"}):
+            with _tracer(exporter).start_as_current_span("inner", attributes={"long": "x" * 1000, "returncode": 0}):
+                pass
+
+        inner, outer = list(read_spans(tmp_path / "trace.jsonl"))
+        assert inner["parent_id"] == outer["span_id"]
+        assert inner["trace_id"] == outer["trace_id"]
+        assert inner["attributes"] == {"returncode": 0}
+        assert outer["attributes"] == {"route": "fast"}
+        assert outer["duration"] >= 0
+
+    def test_rotates(self, tmp_path):
+        exporter = JsonlSpanExporter(tmp_path / "trace.jsonl", max_bytes=500)
+        tracer = _tracer(exporter)
+        for i in range(20):
+            with tracer.start_as_current_span(f"span {i}"):
+                pass
+
+        assert (tmp_path / "trace.1.jsonl").exists()
+        names = [record["name"] for record in read_spans(tmp_path / "trace.jsonl")]
+        assert names[-1] == "span 19"
+        assert names == sorted(names, key=lambda name: int(name.split()[1]))
+
+
+    def test_spans_go_to_their_turns_workspace(self, tmp_path):
+        tracer = _tracer(JsonlSpanExporter())
+        first, second = tmp_path / "first", tmp_path / "second"
+        for workspace in (first, second):
+            token = trace_workspace.set(str(workspace))
+            try:
+                with tracer.start_as_current_span(f"turn in {workspace.name}"):
+                    pass
+            finally:
+                trace_workspace.reset(token)
+        with tracer.start_as_current_span("outside a turn"):
+            pass
+
+        assert [r["name"] for r in read_spans(first / TRACE_FILE)] == ["turn in first"]
+        assert [r["name"] for r in read_spans(second / TRACE_FILE)] == ["turn in second"]
+        assert list(read_spans(first / TRACE_FILE))[0]["attributes"] == {}
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["first", "second"]
+
+    def test_import_does_not_configure(self):
+        code = "import nlcmd.llm, nlcmd.tracing as t; assert not t._configured"
+        assert subprocess.run([sys.executable, "-c", code], capture_output=True).returncode == 0
+
+
+class TestSummaries:
+    def test_span_key(self):
+        assert span_key(TURN[2]) == "model gpt-test"
+        assert span_key(TURN[3]) == "tool run_shell_command"
+        assert span_key(TURN[4]) == "confirmation wait"
+
+    def test_summarize(self):
+        rows = {row["span"]: row for row in summarize(TURN)}
+        assert rows["model stream"]["count"] == 2
+        assert rows["model stream"]["total"] == 4.5
+        assert rows["model stream"]["max"] == 3.0
+        assert next(iter(rows)) == "agent_execution"
+
+    def test_turn_breakdown_counts_nested_spans_once(self):
+        other = [_record("agent_execution", "b", duration=1.0, start=5.0, trace_id="t2")]
+        (turn,) = turn_breakdowns(TURN + other, last=2)[:1]
+        assert turn["total"] == 10.0
+        assert turn["model"] == 4.5
+        assert turn["first token"] == 0.4
+        assert turn["tool"] == 5.0
+        assert turn["confirmation"] == 4.0
+        assert turn["command"] == 0.8
+        assert turn["route"] == "fast"
+        assert turn["history_messages"] == 2
+        assert len(turn_breakdowns(TURN + other, last=1)) == 1
+
+
+class TestStatsCommand:
+    def test_json_output(self, tmp_path, monkeypatch):
+        monkeypatch.setattr("nlcmd.config.WORKSPACE", tmp_path)
+        path = tmp_path / TRACE_FILE
+        path.parent.mkdir(parents=True)
+        path.write_text("".join(json.dumps(record) + "\n" for record in TURN), encoding="utf-8")
+
+        result = CliRunner().invoke(stats_app, ["--json"])
+        assert result.exit_code == 0
+        rows = [json.loads(line) for line in result.output.splitlines()]
+        assert [row["type"] for row in rows].count("turn") == 1
+        assert {row["span"] for row in rows if row["type"] == "span"} >= {"model gpt-test", "command"}
+
+    def test_table_output(self, tmp_path, monkeypatch):
+        monkeypatch.setattr("nlcmd.config.WORKSPACE", tmp_path)
+        assert "No traces recorded" in CliRunner().invoke(stats_app, []).output
@@ -0,0 +1,92 @@
+import asyncio
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from nlcmd.ui import PromptQueue
+
+
+class TestPromptQueue:
+    def test_prompts_run_on_one_reader_thread_in_order(self):
+        queue = PromptQueue()
+        answered = []
+        
+        def fake_prompt(name):
+            answered.append((name, threading.current_thread().name))
+            time.sleep(0.01)
+            return name
+        
+        async def main():
+            return await asyncio.gather(*(queue.ask(fake_prompt, n) for n in ["a", "b", "c"]))
+        
+        assert asyncio.run(main()) == ["a", "b", "c"]
+        assert [name for name, _ in answered] == ["a", "b", "c"]
+        assert len({thread for _, thread in answered}) == 1
+        assert answered[0][1].startswith("nlcmd-input")
+
+    def test_event_loop_keeps_running_while_prompt_waits(self):
+        queue = PromptQueue()
+        ticks = []
+        
+        async def ticker():
+            for _ in range(5):
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+        
+        async def main():
+            background = asyncio.create_task(ticker())
+            answer = await queue.ask(lambda: time.sleep(0.1) or "y")
+            await background
+            return answer
+        
+        assert asyncio.run(main()) == "y"
+        assert len(ticks) == 5
+
+    def test_turn_lock_is_per_event_loop(self):
+        queue = PromptQueue()
+        
+        async def get_lock():
+            async with queue.turn():
+                return queue.turn()
+        
+        first = asyncio.run(get_lock())
+        second = asyncio.run(get_lock())
+        
+        assert first is not second
+
+    def test_confirm_reprompts_until_answered(self):
+        queue = PromptQueue()
+        answers = iter(["maybe", "y"])
+        
+        with patch("nlcmd.ui.console.input", side_effect=lambda prompt, password=False: next(answers)) as read:
+            assert asyncio.run(queue.confirm("Run it?")) is True
+        
+        assert read.call_count == 2
+
+    def test_cancelled_prompt_leaves_next_line_to_next_reader(self):
+        queue = PromptQueue()
+        asked = threading.Event()
+        typed = threading.Event()
+        
+        def terminal(prompt, password=False):
+            asked.set()
+            typed.wait(5)
+            return "ls -la"
+        
+        async def cancelled_confirm():
+            task = asyncio.create_task(queue.confirm("Do you want to execute this command?"))
+            await asyncio.to_thread(asked.wait, 5)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        
+        with patch("nlcmd.ui.console.input", side_effect=terminal) as read:
+            asyncio.run(cancelled_confirm())
+            # The user types their next REPL line into the still blocked read
+            typed.set()
+            line = queue.read_line_blocking("nlcmd > ")
+        
+        assert line == "ls -la"
+        assert read.call_count == 1
@@ -0,0 +1,359 @@
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import time
+
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from nlcmd import utils
+from nlcmd.session import close_sessions
+from nlcmd.utils import (
+    READ_ONLY_COMMANDS,
+    SPECULATION_ENV,
+    SPILL_DIR,
+    BubblewrapExecutor,
+    CommandResult,
+    Executor,
+    RlimitExecutor,
+    SandboxConfig,
+    WorkspaceError,
+    _speculate,
+    execute_prepared_command_async,
+    forget_workspace,
+    get_executor,
+    is_read_only,
+    load_sandbox_config,
+    parse_python_c,
+    prepare_shell_command,
+    resolve_timeout,
+    resolve_workspace,
+    run_shell_command_with_confirmation_async,
+)
+
+pytestmark = pytest.mark.skipif(platform.system() == "Windows", reason="uses POSIX shell commands")
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    # A killed child that has not been reaped yet is a zombie
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().split()[2] != "Z"
+    except FileNotFoundError:
+        return True
+
+
+class TestResolveTimeout:
+    def test_default_and_cap(self):
+        with patch.object(utils.config, "COMMAND_TIMEOUT", 120), patch.object(utils.config, "COMMAND_TIMEOUT_MAX", 600):
+            assert resolve_timeout() == 120
+            assert resolve_timeout(5) == 5
+            assert resolve_timeout(3600) == 600
+            assert resolve_timeout(0) == 600
+
+    def test_disabled(self):
+        with patch.object(utils.config, "COMMAND_TIMEOUT", 0), patch.object(utils.config, "COMMAND_TIMEOUT_MAX", 0):
+            assert resolve_timeout() is None
+
+
+class TestCommandTimeout:
+    def test_completes_within_timeout(self, tmp_path):
+        result = asyncio.run(execute_prepared_command_async("echo hello", cwd=str(tmp_path), timeout=10))
+        assert result.status == "ok"
+        assert result.exit_code == 0
+        assert result.stdout == "hello\n"
+        assert result.stdout_bytes == 6
+
+    def test_timeout_returns_partial_output(self, tmp_path):
+        start = time.monotonic()
+        result = asyncio.run(execute_prepared_command_async("echo started; sleep 30", cwd=str(tmp_path), timeout=0.5))
+        assert time.monotonic() - start < 5
+        assert result.status == "timed_out"
+        assert result.stdout == "started\n"
+        assert result.render().startswith("Timed out after 0.5s")
+
+    def test_timeout_kills_process_group(self, tmp_path):
+        pid_file = tmp_path / "child.pid"
+        cmd = f"sleep 30 & echo $! > {pid_file}; wait"
+        asyncio.run(execute_prepared_command_async(cmd, cwd=str(tmp_path), timeout=0.5))
+        child = int(pid_file.read_text())
+        time.sleep(0.1)
+        assert not _alive(child)
+
+    def test_cancel_kills_process_group(self, tmp_path):
+        pid_file = tmp_path / "child.pid"
+        cmd = f"sleep 30 & echo $! > {pid_file}; wait"
+
+        async def main():
+            task = asyncio.create_task(execute_prepared_command_async(cmd, cwd=str(tmp_path), timeout=60))
+            await asyncio.sleep(0.5)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(main())
+        child = int(pid_file.read_text())
+        time.sleep(0.1)
+        assert not _alive(child)
+
+    def test_removes_cleanup_file(self, tmp_path):
+        script = tmp_path / "script.py"
+        script.write_text("print('hi')")
+        asyncio.run(execute_prepared_command_async("sleep 30", cleanup_path=str(script), cwd=str(tmp_path), timeout=0.2))
+        assert not script.exists()
+
+
+class TestWorkspace:
+    def test_resolved_once(self, tmp_path):
+        target = tmp_path / "ws"
+        workspace = resolve_workspace(str(target))
+        assert workspace.path == target.resolve()
+        assert target.is_dir()
+        with patch.object(utils.Path, "resolve", side_effect=AssertionError("resolved again")):
+            assert resolve_workspace(str(target)) is workspace
+            assert resolve_workspace(str(workspace)) is workspace
+
+    def test_not_a_directory(self, tmp_path):
+        (tmp_path / "file").write_text("x")
+        with pytest.raises(WorkspaceError):
+            resolve_workspace(str(tmp_path / "file"))
+
+    def test_contains(self, tmp_path):
+        workspace = resolve_workspace(str(tmp_path / "ws"))
+        assert workspace.contains(workspace.path / "a" / "b.txt")
+        assert workspace.contains(workspace.path)
+        # A sibling sharing the prefix is outside; str.startswith got this wrong
+        assert not workspace.contains(tmp_path / "ws-other" / "x")
+        assert not workspace.contains(tmp_path)
+
+    def test_deleted_workspace_is_recreated_after_failure(self, tmp_path):
+        target = tmp_path / "ws"
+        work_dir = str(resolve_workspace(str(target)))
+        target.rmdir()
+        result = asyncio.run(execute_prepared_command_async("echo hi", cwd=work_dir))
+        assert result.status == "error"
+        result = asyncio.run(execute_prepared_command_async("echo hi", cwd=work_dir))
+        assert result.stdout == "hi\n"
+
+    def test_forget(self, tmp_path):
+        workspace = resolve_workspace(str(tmp_path))
+        forget_workspace(str(workspace))
+        assert resolve_workspace(str(tmp_path)) is not workspace
+
+
+class TestSandbox:
+    def test_default_backend_without_file(self, tmp_path):
+        with patch.object(utils.config, "SANDBOX_BACKEND", "subprocess"):
+            sandbox = load_sandbox_config(str(tmp_path))
+        assert sandbox.backend == "subprocess"
+        assert type(get_executor(str(tmp_path))) is Executor
+
+    def test_workspace_file_overrides_default(self, tmp_path):
+        (tmp_path / "sandbox.toml").write_text('backend = "rlimit"\ncpu_seconds = 5\nmemory_mb = 512\n')
+        sandbox = load_sandbox_config(str(tmp_path))
+        assert sandbox.backend == "rlimit"
+        assert sandbox.cpu_seconds == 5
+        assert isinstance(get_executor(str(tmp_path)), RlimitExecutor)
+
+    def test_invalid_file_raises(self, tmp_path):
+        (tmp_path / "sandbox.toml").write_text('backend = "docker"\n')
+        with pytest.raises(WorkspaceError):
+            load_sandbox_config(str(tmp_path))
+
+    def test_bwrap_falls_back_when_unavailable(self, tmp_path):
+        (tmp_path / "sandbox.toml").write_text('backend = "bwrap"\n')
+        with patch.object(BubblewrapExecutor, "available", return_value=False):
+            assert type(get_executor(str(tmp_path))) is RlimitExecutor
+
+    def test_bwrap_command(self, tmp_path):
+        executor = BubblewrapExecutor(SandboxConfig(backend="bwrap", network=False))
+        cmd = executor.command("echo 'hi'", str(tmp_path), ro_paths=["/tmp/script.py"])
+        assert cmd.startswith("bwrap --ro-bind / /")
+        assert f"--bind {tmp_path} {tmp_path}" in cmd
+        assert "--ro-bind /tmp/script.py /tmp/script.py" in cmd
+        assert "--share-net" not in cmd
+        assert cmd.endswith("/bin/sh -c 'echo '\"'\"'hi'\"'\"''")
+
+    def test_cpu_limit_kills_busy_loop(self, tmp_path):
+        (tmp_path / "sandbox.toml").write_text('backend = "rlimit"\ncpu_seconds = 1\n')
+        start = time.monotonic()
+        result = asyncio.run(execute_prepared_command_async("while :; do :; done", cwd=str(tmp_path), timeout=30))
+        assert time.monotonic() - start < 10
+        assert result.status == "failed"
+
+    def test_file_size_limit(self, tmp_path):
+        (tmp_path / "sandbox.toml").write_text('backend = "rlimit"\nfile_size_mb = 1\n')
+        result = asyncio.run(execute_prepared_command_async("head -c 2000000 /dev/zero > big.bin", cwd=str(tmp_path), timeout=30))
+        assert result.status == "failed"
+        assert (tmp_path / "big.bin").stat().st_size <= 1024 * 1024
+
+    def test_output_is_capped(self, tmp_path):
+        (tmp_path / "sandbox.toml").write_text("max_output_mb = 0.01\n")
+        result = asyncio.run(execute_prepared_command_async("yes | head -c 100000", cwd=str(tmp_path), timeout=30))
+        assert result.stdout_truncated
+        assert result.stdout_bytes == 100000
+        assert len(result.stdout) == int(0.01 * 1024 * 1024)
+        assert "capture limit reached" in result.render()
+
+
+class TestPythonSnippets:
+    def test_parse_plain_snippet(self):
+        assert parse_python_c('python -c "print(1)"') == ("print(1)", [])
+        assert parse_python_c("python3 -c 'import sys; print(sys.argv)' a b") == ("import sys; print(sys.argv)", ["a", "b"])
+
+    def test_parse_rejects_shell_features(self):
+        assert parse_python_c("python -c 'print(1)' | grep 1") is None
+        assert parse_python_c("python -c 'print(1)' > out.txt") is None
+        assert parse_python_c('python -c "print(\'$HOME\')"') is None
+        assert parse_python_c("python script.py") is None
+
+    def test_prepare_does_not_write_temp_files(self):
+        display_cmd, exec_cmd, cleanup = prepare_shell_command("python -c 'print(1)'")
+        assert display_cmd == exec_cmd == "python -c 'print(1)'"
+        assert cleanup is None
+
+
+class TestCommandResult:
+    def test_render_compact(self):
+        result = CommandResult(command="ls", status="failed", exit_code=2, duration=0.25, stderr="no such file\n")
+        assert result.render() == "Exit code: 2 (0.25s)\nStderr:\nno such file\n"
+
+    def test_render_special_statuses(self):
+        assert CommandResult(command="rm x", status="dry_run").render() == "Dry run: Command not executed"
+        assert CommandResult(command="rm x", status="declined").render() == "Execution cancelled by user"
+        assert CommandResult(command="rm x", status="error", error="boom").render() == "Error: boom"
+
+    def test_long_output_is_spilled_and_clipped(self, tmp_path):
+        text = "".join(f"line {i}\n" for i in range(1000))
+        result = CommandResult(command="seq", stdout=text, stdout_bytes=len(text), exit_code=0)
+        result.spill(tmp_path, max_chars=100)
+
+        assert result.stdout_path is not None
+        assert open(result.stdout_path, encoding="utf-8").read() == text
+        rendered = result.render(max_chars=100)
+        assert "line 0\n" in rendered
+        assert "line 999\n" in rendered
+        assert "line 500\n" not in rendered
+        assert result.stdout_path in rendered
+
+    def test_short_output_is_not_spilled(self, tmp_path):
+        result = CommandResult(command="echo", stdout="hi\n", exit_code=0)
+        result.spill(tmp_path, max_chars=100)
+        assert result.stdout_path is None
+        assert not any(tmp_path.iterdir())
+
+    def test_json(self, tmp_path):
+        result = asyncio.run(execute_prepared_command_async("echo out; echo err >&2; exit 1", cwd=str(tmp_path), timeout=10))
+        data = json.loads(result.to_json())
+        assert data["status"] == "failed"
+        assert data["exit_code"] == 1
+        assert data["stdout"] == "out\n"
+        assert data["stderr_bytes"] == 4
+        assert data["duration"] > 0
+        assert "stdout" not in json.loads(result.to_json(include_output=False))
+
+
+class TestSpeculativeExecution:
+    def test_read_only_classifier(self):
+        for cmd in ("ls -la", "du -sh * 2>/dev/null", "git status", "cat a.txt | grep x | wc -l", "find . -name '*.py'", "Get-ChildItem"):
+            assert is_read_only(cmd), cmd
+        for cmd in ("rm -rf x", "ls > out.txt", "ls; rm x", "cat $HOME/x", "git push", "find . -delete",
+                    "tail -f log", "ls\nrm x", "./ls", "FOO=1 ls", "sleep 10 &", "env rm x", "sort -o x y",
+                    "sleep 10", "git diff", "git log -p", "git show HEAD", "git blame a.txt", "git status -v"):
+            assert not is_read_only(cmd), cmd
+
+    def test_runs_while_confirming(self, tmp_path, monkeypatch):
+        # sleep is not speculated; allow it here to make the overlap measurable
+        monkeypatch.setattr("nlcmd.utils.READ_ONLY_COMMANDS", READ_ONLY_COMMANDS | {"sleep"})
+
+        async def slow_yes(*args, **kwargs):
+            await asyncio.sleep(0.5)
+            return True
+
+        (tmp_path / "sandbox.toml").write_text('backend = "rlimit"\n')
+        with patch("nlcmd.utils.prompts.confirm", new=slow_yes):
+            start = time.monotonic()
+            result = asyncio.run(run_shell_command_with_confirmation_async("sleep 0.4 && pwd", cwd=str(tmp_path)))
+        # The command overlapped the prompt instead of starting after it
+        assert time.monotonic() - start < 0.85
+        assert result.ok
+        assert result.stdout.strip() == str(tmp_path.resolve())
+
+    def test_declined_speculation_is_discarded(self, tmp_path):
+        from nlcmd.journal import get_journal
+
+        async def slow_no(*args, **kwargs):
+            await asyncio.sleep(0.3)
+            return False
+
+        (tmp_path / "sandbox.toml").write_text('backend = "rlimit"\n')
+        with patch("nlcmd.utils.prompts.confirm", new=slow_no):
+            result = asyncio.run(run_shell_command_with_confirmation_async("ls", cwd=str(tmp_path)))
+        assert result.status == "declined"
+        get_journal(str(tmp_path.resolve())).flush()
+        assert get_journal(str(tmp_path.resolve())).query() == []
+
+    def test_only_sandboxed_backends_speculate(self, tmp_path):
+        assert _speculate("ls", None, str(tmp_path)) is None
+        (tmp_path / "sandbox.toml").write_text('backend = "session"\n')
+        assert _speculate("ls", None, str(tmp_path)) is None
+
+    def test_speculation_takes_no_git_locks(self, tmp_path):
+        (tmp_path / "sandbox.toml").write_text('backend = "rlimit"\n')
+
+        async def run():
+            speculation = _speculate("printenv GIT_OPTIONAL_LOCKS", None, str(tmp_path))
+            return await speculation.task
+
+        assert asyncio.run(run()).stdout.strip() == "0"
+
+    def test_speculation_disables_git_fsmonitor(self, tmp_path):
+        (tmp_path / "sandbox.toml").write_text('backend = "rlimit"\n')
+        subprocess.run(["git", "init", "-q", str(tmp_path)], check=True)
+        subprocess.run(["git", "-C", str(tmp_path), "config", "core.fsmonitor", "true"], check=True)
+        # `git config` is not speculated; read the value the way a speculated git command sees it
+        value = subprocess.run(["git", "-C", str(tmp_path), "config", "core.fsmonitor"], env={**os.environ, **SPECULATION_ENV},
+                               capture_output=True, text=True)
+        assert value.stdout.strip() == "false"
+
+    def test_declined_speculation_writes_no_spill_files(self, tmp_path, monkeypatch):
+        monkeypatch.setattr("nlcmd.config.COMMAND_OUTPUT_CHARS", 10)
+        (tmp_path / "sandbox.toml").write_text('backend = "rlimit"\n')
+        (tmp_path / "big.txt").write_text("x" * 1000)
+
+        def slow(answer):
+            async def confirm(*args, **kwargs):
+                await asyncio.sleep(0.3)
+                return answer
+            return confirm
+
+        with patch("nlcmd.utils.prompts.confirm", new=slow(False)):
+            asyncio.run(run_shell_command_with_confirmation_async("cat big.txt", cwd=str(tmp_path)))
+        assert not (tmp_path / SPILL_DIR).exists()
+
+        with patch("nlcmd.utils.prompts.confirm", new=slow(True)):
+            result = asyncio.run(run_shell_command_with_confirmation_async("cat big.txt", cwd=str(tmp_path)))
+        assert result.stdout_path and (tmp_path / SPILL_DIR).exists()
+
+    def test_session_backend_runs_confirmed_command_in_session(self, tmp_path):
+        (tmp_path / "sub").mkdir()
+        (tmp_path / "sandbox.toml").write_text('backend = "session"\n')
+        work_dir = str(tmp_path.resolve())
+        try:
+            with patch("nlcmd.utils.prompts.confirm", new=AsyncMock(return_value=True)):
+                asyncio.run(run_shell_command_with_confirmation_async("cd sub", cwd=work_dir))
+                result = asyncio.run(run_shell_command_with_confirmation_async("pwd", cwd=work_dir))
+        finally:
+            close_sessions()
+        assert result.stdout.strip() == str(tmp_path.resolve() / "sub")
+
+    def test_writing_command_waits_for_confirmation(self, tmp_path):
+        with patch("nlcmd.utils.prompts.confirm", new=AsyncMock(return_value=False)):
+            asyncio.run(run_shell_command_with_confirmation_async("touch created.txt", cwd=str(tmp_path)))
+        assert not (tmp_path / "created.txt").exists()